@@ -0,0 +1,40 @@
+""" ASYNC VIEWS """
+
+from django.http import JsonResponse
+from rest_framework.exceptions import ParseError
+
+from tickets.async_views import async_safe_methods_only
+from tickets.conditional import ticket_etag, not_modified, set_validators
+from tickets.loaders import aget_ticket
+from tickets.sparse import get_sparse_fields
+from users.authentication import async_token_required
+from .models import Comment
+from .django_rest_views import comment_values_serializer
+from .serializers import CommentSerializer
+
+
+@async_safe_methods_only
+@async_token_required
+async def comment_list_async_view(request, id):
+    """
+    EXMP GET /comments/7/async/ (same as /comments/7/rest/, see tickets/async_views.py)
+    """
+    try:
+        serializer = comment_values_serializer(get_sparse_fields(request.GET, CommentSerializer))
+    except ParseError as error:
+        return JsonResponse({'detail': error.detail}, status=400)
+
+    ticket = await aget_ticket(request, id)
+    if ticket is None:
+        return JsonResponse({'message': 'Ticket does no exist.'}, status=404)
+    if not request.user.is_staff and request.user != ticket.ticket_user:
+        return JsonResponse({'message': 'You cannot check comments for this ticket.'}, status=403)
+
+    etag = ticket_etag(ticket.pk, ticket.version, kind='comments')
+    response = not_modified(request, etag, ticket.updated_at)
+    if response is not None:
+        return response
+
+    rows = [row async for row in Comment.objects.filter(ticket_id=ticket.pk).order_by('created_date', 'id')
+            .values(*serializer.columns())]
+    return set_validators(JsonResponse(serializer.many(rows), safe=False), etag, ticket.updated_at)
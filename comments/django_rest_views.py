@@ -4,50 +4,101 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .serializers import CommentSerializer
 from .models import Comment
-from tickets.models import Ticket
+from tickets.concurrency import if_match_version, save_comment_edit
+from tickets.conditional import ticket_etag, not_modified, set_validators
+from tickets.loaders import get_ticket
+from tickets.sparse import get_sparse_fields, ValuesSerializer
 from .permissions import HelpdeskPermissions
 
 
+def comment_values_serializer(fields=None):
+    """
+    CommentSerializer for lists (tickets/sparse.py): 'comment_user' is the username, read with a join.
+    """
+    return ValuesSerializer(CommentSerializer, fields, sources={'comment_user': 'comment_user__username'})
+
+
 class CommentsViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [HelpdeskPermissions]
+    read_from_replica = True
 
-    def list(self, request, *args, **kwargs):
-        pk = kwargs.get('id')
-        try:
-            ticket = Ticket.objects.get(pk=pk)
-        except Ticket.DoesNotExist:
+    def check_ticket_access(self, request, pk):
+        """
+        Returns an error response if ticket 'pk' does not exist or the user cannot see its comments.
+        """
+        ticket = get_ticket(request, pk)
+        if ticket is None:
             return Response({'message': 'Ticket does no exist.'}, status=status.HTTP_404_NOT_FOUND)
 
         if (not request.user.is_staff) and request.user != ticket.ticket_user:
             return Response({'message': 'You cannot check comments for this ticket.'}, status=status.HTTP_403_FORBIDDEN)
-        return super().list(request, *args, **kwargs)
+        return None
+
+    @property
+    def sparse_fields(self):
+        """
+        The ?fields= of the list and retrieve actions (tickets/sparse.py), None for every field.
+        EXMP /comments/7/rest/?fields=id,text
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None
+        return get_sparse_fields(self.request.query_params, CommentSerializer)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.sparse_fields
+        return context
+
+    def list(self, request, *args, **kwargs):
+        error = self.check_ticket_access(request, kwargs.get('id'))
+        if error is not None:
+            return error
+
+        # Comment changes make a new version of their ticket, so the (already loaded) ticket validates the list.
+        ticket = get_ticket(request, kwargs.get('id'))
+        serializer = comment_values_serializer(self.sparse_fields)
+        etag = ticket_etag(ticket.pk, ticket.version, kind='comments')
+        response = not_modified(request, etag, ticket.updated_at)
+        if response is not None:
+            return response
+        rows = Comment.objects.filter(ticket_id=ticket.pk).order_by('created_date', 'id').values(*serializer.columns())
+        return set_validators(Response(serializer.many(rows)), etag, ticket.updated_at)
 
     def retrieve(self, request, *args, **kwargs):
-        pk = kwargs.get('id')
-        try:
-            ticket = Ticket.objects.get(pk=pk)
-        except Ticket.DoesNotExist:
-            return Response({'message': 'Ticket does no exist.'}, status=status.HTTP_404_NOT_FOUND)
+        error = self.check_ticket_access(request, kwargs.get('id'))
+        if error is not None:
+            return error
 
-        if (not request.user.is_staff) and request.user != ticket.ticket_user:
-            return Response({'message': 'You cannot check comments for this ticket.'}, status=status.HTTP_403_FORBIDDEN)
-        return super().retrieve(request, *args, **kwargs)
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, ticket_etag(response.data['id'], response.data['version'], kind='comment'))
 
-    def get_queryset(self):
-        pk = self.kwargs.get('id')
-        try:
-            ticket = Ticket.objects.get(pk=pk)
-        except Ticket.DoesNotExist:
-            return Response({'message': 'Ticket does no exist.'}, status=status.HTTP_404_NOT_FOUND)
+    def update(self, request, *args, **kwargs):
+        """
+        EXMP PATCH /comments/7/rest/12/ with 'If-Match: "comment-12-v2"' -> 412 if the comment changed since.
+        """
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
 
-        queryset = ticket.comments.all()
-        return queryset
+        version = if_match_version(request, 'comment', instance.pk)
+        if not save_comment_edit(instance, instance.version if version is None else version,
+                                 **serializer.validated_data):
+            return Response({'message': 'The comment was changed by someone else, reload it and try again.'},
+                            status=status.HTTP_409_CONFLICT if version is None else status.HTTP_412_PRECONDITION_FAILED)
+
+        response = Response(self.get_serializer(instance).data)
+        return set_validators(response, ticket_etag(instance.pk, instance.version, kind='comment'))
+
+    def get_queryset(self):
+        # 'ticket' is joined for the permission checks on 'obj.ticket.status', 'comment_user' for the serializer.
+        return Comment.objects.filter(ticket_id=self.kwargs.get('id')).select_related('comment_user', 'ticket')
 
     def create(self, request, *args, **kwargs):
-        ticket_id = kwargs.get('id')
-        ticket = Ticket.objects.get(pk=ticket_id)
+        ticket = get_ticket(request, kwargs.get('id'))
+        if ticket is None:
+            return Response({'message': 'Ticket does no exist.'}, status=status.HTTP_404_NOT_FOUND)
         if ticket.status != 'InProcess':
             return Response({'detail': 'You cannot add comments to a request that is not in "InProcess" status.'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,6 @@
 """ DJANGO VIEWS """
 
 from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy, reverse
 from tickets.django_views import LoginRequiredMixin
 from django.views.generic import CreateView, UpdateView, DeleteView, ListView
@@ -9,26 +8,28 @@ from django.views.generic import CreateView, UpdateView, DeleteView, ListView
 from .exceptions import TicketNotInProcessException
 from .forms import CommentCreateForm, CommentUpdateForm
 from .models import Comment
-from tickets.models import Ticket
+from tickets.concurrency import save_comment_edit
+from tickets.loaders import get_ticket_or_404
 
 
 class CommentsListView(LoginRequiredMixin, ListView):
     model = Comment
     template_name = 'comments_list_view.html'
     context_object_name = 'comments'
+    read_from_replica = True
 
+    # The ticket comes from the request-scoped loader: dispatch, get_queryset and get_context_data share one fetch.
     def get_queryset(self):
-        ticket_id = self.kwargs['pk']
-        ticket = Ticket.objects.get(pk=ticket_id)
-        return Comment.objects.filter(ticket=ticket).order_by('-created_date')
+        ticket = get_ticket_or_404(self.request, self.kwargs['pk'])
+        return Comment.objects.filter(ticket=ticket).select_related('comment_user', 'ticket').order_by('-created_date')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['ticket'] = Ticket.objects.get(pk=self.kwargs['pk'])
+        context['ticket'] = get_ticket_or_404(self.request, self.kwargs['pk'])
         return context
 
     def dispatch(self, request, *args, **kwargs):
-        ticket = Ticket.objects.get(pk=self.kwargs['pk'])
+        ticket = get_ticket_or_404(request, self.kwargs['pk'])
 
         if not request.user.is_superuser:
             if ticket.ticket_user != request.user:
@@ -45,12 +46,12 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['ticket'] = get_object_or_404(Ticket, pk=self.kwargs['pk'])
+        context['ticket'] = get_ticket_or_404(self.request, self.kwargs['pk'])
         return context
 
     def form_valid(self, form):
         user = self.request.user
-        ticket = get_object_or_404(Ticket, pk=self.kwargs['pk'])
+        ticket = get_ticket_or_404(self.request, self.kwargs['pk'])
 
         if ticket.status == 'InProcess':
             if user.is_superuser or user == ticket.ticket_user:
@@ -84,6 +85,16 @@ class CommentUpdateView(LoginRequiredMixin, UpdateView):
             url = reverse('main_view')
             return HttpResponseRedirect(url)
 
+    def get_initial(self):
+        return {'version': self.object.version}
+
+    def form_valid(self, form):
+        # The write only succeeds if nobody changed the comment since the form was rendered.
+        if not save_comment_edit(self.object, form.cleaned_data['version'], text=form.cleaned_data['text']):
+            form.add_error(None, 'The comment was changed in the meantime. Reload the page and try again.')
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self):
         return reverse_lazy('comments_list_view', kwargs={'pk': self.object.ticket.pk})
 
@@ -20,6 +20,8 @@ class CommentUpdateForm(forms.ModelForm):
             'placeholder': 'Please enter text',
         }
     ))
+    # Version of the comment the form was rendered from, see tickets/concurrency.py.
+    version = forms.IntegerField(widget=forms.HiddenInput)
 
 
 class CommentCreateForm(forms.ModelForm):
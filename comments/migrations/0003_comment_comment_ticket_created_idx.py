@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_alter_comment_ticket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['ticket', '-created_date'], name='comment_ticket_created_idx'),
+        ),
+    ]
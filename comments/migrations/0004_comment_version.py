@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_comment_comment_ticket_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0024_archivedticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('comments', '0004_comment_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('created_date', models.DateTimeField()),
+                ('version', models.PositiveIntegerField()),
+                ('comment_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='tickets.archivedticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticket', '-created_date'], name='archived_comment_ticket_idx')],
+            },
+        ),
+    ]
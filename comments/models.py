@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import UM
-from tickets.models import Ticket
+from tickets.models import Ticket, ArchivedTicket
 
 
 class Comment(models.Model):
@@ -8,6 +8,42 @@ class Comment(models.Model):
     comment_user = models.ForeignKey(UM, on_delete=models.CASCADE)
     text = models.TextField(blank=False, null=False)
     created_date = models.DateTimeField(auto_now_add=True)  # storing the time the comment was created.
+    version = models.PositiveIntegerField(default=1, editable=False)  # +1 on every edit, see tickets/concurrency.py
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticket', '-created_date'], name='comment_ticket_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+
+        # The post_save receivers (comments/signals.py) bump the ticket and write its event in the same transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Comment by {self.comment_user.username} on {self.ticket.topic}"
+
+
+class ArchivedComment(models.Model):
+    """
+    A comment of an ArchivedTicket, moved together with it by tickets/archive.py. It keeps its id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE, related_name='comments')
+    comment_user = models.ForeignKey(UM, on_delete=models.CASCADE, related_name='+')
+    text = models.TextField()
+    created_date = models.DateTimeField()
+    version = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticket', '-created_date'], name='archived_comment_ticket_idx'),
+        ]
 
     def __str__(self):
-        return f"Comment by {self.comment_user.username} on {self.ticket.topic}"
\ No newline at end of file
+        return f"Comment by {self.comment_user.username} on {self.ticket.topic}"
@@ -1,10 +1,11 @@
 from rest_framework import serializers
+from tickets.sparse import SparseFieldsMixin
 from .models import Comment
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     comment_user = serializers.CharField(read_only=True)
 
     class Meta:
         model = Comment
-        fields = ['id', 'comment_user', 'text']
+        fields = ['id', 'comment_user', 'text', 'version']
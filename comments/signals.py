@@ -0,0 +1,32 @@
+"""
+Changing a comment makes a new version of its ticket (Ticket.version) and leaves the cached lists behind
+(tickets/caching.py), a new comment is also an event of the ticket (tickets/events.py).
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from tickets.caching import tickets_changed, ticket_owners
+from tickets.events import record_comment_event
+from tickets.models import Ticket
+from .models import Comment
+
+
+@receiver(post_save, sender=Comment)
+def bump_ticket_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    Ticket.objects.filter(pk=instance.ticket_id).bump()
+    if created:
+        # The views create comments with their ticket loaded, otherwise this loads it.
+        record_comment_event(instance, instance.ticket.ticket_user_id)
+    tickets_changed(*ticket_owners(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def bump_ticket_on_delete(sender, instance, origin=None, **kwargs):
+    # Comments deleted together with their ticket leave nothing to bump.
+    if isinstance(origin, Ticket) or getattr(origin, 'model', None) is Ticket:
+        return
+    Ticket.objects.filter(pk=instance.ticket_id).bump()
+    tickets_changed(*ticket_owners(instance))
@@ -1,3 +1,111 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from tickets.models import Ticket
+from users.models import UM
+from .models import Comment
+
+
+class CommentQueryCountTests(TestCase):
+    """
+    Every page runs the same number of queries whatever the number of comments:
+    the ticket is loaded once per request and comments come with their users.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True, is_superuser=True)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Topic', description='Description',
+                                           status='InProcess')
+
+    def add_comments(self, count):
+        authors = [self.user, self.staff]
+        for i in range(count):
+            Comment.objects.create(ticket=self.ticket, comment_user=authors[i % 2], text=f'Comment {i}')
+
+    def count_queries(self, client, url, comments):
+        Comment.objects.all().delete()
+        self.add_comments(comments)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertFixedQueries(self, client, url, expected):
+        self.assertEqual([self.count_queries(client, url, n) for n in (1, 10)], [expected, expected])
+
+    def test_comments_list_view(self):
+        self.client.force_login(self.user)
+        # session, user, ticket (with its user), comments (with their users and ticket)
+        self.assertFixedQueries(self.client, f'/comments/{self.ticket.pk}/', 4)
+
+    def test_ticket_detail_view(self):
+        self.client.force_login(self.staff)
+        # session, user, ticket (with its user)
+        self.assertFixedQueries(self.client, f'/tickets/ticket/{self.ticket.pk}/', 3)
+
+    def test_rest_list_and_retrieve(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # ticket (with its user), comments (with their users and ticket)
+        self.assertFixedQueries(client, f'/comments/{self.ticket.pk}/rest/', 2)
+
+        comment = Comment.objects.first()
+        with self.assertNumQueries(2):
+            response = client.get(f'/comments/{self.ticket.pk}/rest/{comment.pk}/')
+        self.assertEqual(response.data['comment_user'], comment.comment_user.username)
+
+    def test_missing_ticket_and_foreign_ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/comments/999/rest/').status_code, 404)
+        self.assertEqual(client.post('/comments/999/rest/', {'text': 'Text'}, format='json').status_code, 404)
+
+        other = UM.objects.create_user(username='other', password='password')
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/comments/{self.ticket.pk}/rest/').status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/comments/999/').status_code, 404)
+
+
+class CommentOptimisticConcurrencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Topic', description='Description',
+                                           status='InProcess')
+
+    def setUp(self):
+        self.comment = Comment.objects.create(ticket=self.ticket, comment_user=self.user, text='Text')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/comments/{self.ticket.pk}/rest/{self.comment.pk}/'
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(etag, f'"comment-{self.comment.pk}-v1"')
+        ticket_version = Ticket.objects.get(pk=self.ticket.pk).version
+
+        response = self.client.patch(self.url, {'text': 'Edited'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).version, ticket_version + 1)
+
+        response = self.client.patch(self.url, {'text': 'Lost'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.text, 'Edited')
+
+    def test_html_form_rejects_stale_version(self):
+        self.client.force_login(self.user)
+        url = f'/comments/update-comment/{self.comment.pk}/'
+        self.assertContains(self.client.get(url), 'name="version" value="1"')
+
+        self.assertEqual(self.client.post(url, {'text': 'First', 'version': 1}).status_code, 302)
+        response = self.client.post(url, {'text': 'Second', 'version': 1})
+        self.assertContains(response, 'changed in the meantime')
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.text, self.comment.version), ('First', 2))
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from .django_views import *
 from .django_rest_views import CommentsViewSet
+from .async_views import comment_list_async_view
 from rest_framework import routers
 
 router = routers.SimpleRouter()
@@ -8,7 +9,8 @@ router.register('rest', CommentsViewSet)
 
 
 django_rest_urlpatterns = [
-    path('<int:id>/', include(router.urls))
+    path('<int:id>/', include(router.urls)),
+    path('<int:id>/async/', comment_list_async_view, name='comment_list_async'),
 ]
 
 django_urlpatterns = [
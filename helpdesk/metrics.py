@@ -0,0 +1,322 @@
+"""
+Per-route request metrics in the Prometheus text format: latency, SQL queries, response size and status code,
+and the hits and misses of named caches. With HELPDESK_METRICS_DIR the endpoint adds up every worker process.
+
+EXMP GET /metrics/ (staff only)
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+METRICS_FLUSH_INTERVAL = 1
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# The route of requests that match no URL pattern, so scanners cannot create a label per path.
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def new_route_metrics():
+    return {
+        'statuses': {},
+        'duration': [0] * (len(DURATION_BUCKETS) + 1),
+        'duration_sum': 0.0,
+        'queries': [0] * (len(QUERY_BUCKETS) + 1),
+        'queries_sum': 0,
+        'sql_seconds': 0.0,
+        'size': [0] * (len(SIZE_BUCKETS) + 1),
+        'size_sum': 0,
+    }
+
+
+def merge_route_metrics(total, metrics):
+    for code, count in metrics['statuses'].items():
+        total['statuses'][code] = total['statuses'].get(code, 0) + count
+    for name in ['duration', 'queries', 'size']:
+        total[name] = [a + b for a, b in zip(total[name], metrics[name])]
+    for name in ['duration_sum', 'queries_sum', 'sql_seconds', 'size_sum']:
+        total[name] += metrics[name]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # (route, method) -> new_route_metrics()
+        self.routes = {}
+        # cache name -> {'hit': count, 'miss': count}
+        self.caches = {}
+        self.flushed_at = 0
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.caches = {}
+
+    def observe(self, route, method, code, duration, queries, sql_seconds, size):
+        with self.lock:
+            metrics = self.routes.get((route, method))
+            if metrics is None:
+                metrics = self.routes[(route, method)] = new_route_metrics()
+            code = str(code)
+            metrics['statuses'][code] = metrics['statuses'].get(code, 0) + 1
+            metrics['duration'][bisect_left(DURATION_BUCKETS, duration)] += 1
+            metrics['duration_sum'] += duration
+            metrics['queries'][bisect_left(QUERY_BUCKETS, queries)] += 1
+            metrics['queries_sum'] += queries
+            metrics['sql_seconds'] += sql_seconds
+            if size is not None:
+                metrics['size'][bisect_left(SIZE_BUCKETS, size)] += 1
+                metrics['size_sum'] += size
+
+    def observe_cache(self, name, hit, count=1):
+        with self.lock:
+            counts = self.caches.setdefault(name, {'hit': 0, 'miss': 0})
+            counts['hit' if hit else 'miss'] += count
+
+    def snapshot(self):
+        """
+        A JSON-serializable copy: [[route, method, metrics], ...].
+        """
+        with self.lock:
+            return [[route, method, json.loads(json.dumps(metrics))]
+                    for (route, method), metrics in self.routes.items()]
+
+    def cache_snapshot(self):
+        """
+        A copy of the cache counters: {name: {'hit': count, 'miss': count}}.
+        """
+        with self.lock:
+            return {name: dict(counts) for name, counts in self.caches.items()}
+
+    def maybe_flush(self, force=False):
+        """
+        Writes the snapshot of this process to HELPDESK_METRICS_DIR if the last one is old enough.
+        """
+        directory = getattr(settings, 'HELPDESK_METRICS_DIR', None)
+        if not directory:
+            return
+        interval = getattr(settings, 'HELPDESK_METRICS_FLUSH_INTERVAL', METRICS_FLUSH_INTERVAL)
+        if not force and time.monotonic() - self.flushed_at < interval:
+            return
+        # One thread writes, the others do not wait for it.
+        if not self.flush_lock.acquire(blocking=force):
+            return
+        try:
+            self.flushed_at = time.monotonic()
+            descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump({'routes': self.snapshot(), 'caches': self.cache_snapshot()}, file)
+            # Readers never see a half-written snapshot.
+            os.replace(path, os.path.join(directory, f'metrics-{os.getpid()}.json'))
+        finally:
+            self.flush_lock.release()
+
+
+registry = MetricsRegistry()
+
+
+def collect():
+    """
+    ({(route, method): metrics}, {cache name: counts}) of this process, or of all processes with
+    HELPDESK_METRICS_DIR.
+    """
+    directory = getattr(settings, 'HELPDESK_METRICS_DIR', None)
+    if not directory:
+        snapshots = [{'routes': registry.snapshot(), 'caches': registry.cache_snapshot()}]
+    else:
+        registry.maybe_flush(force=True)
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except FileNotFoundError:
+                pass
+
+    routes = {}
+    caches = {}
+    for snapshot in snapshots:
+        for route, method, metrics in snapshot['routes']:
+            merge_route_metrics(routes.setdefault((route, method), new_route_metrics()), metrics)
+        for name, counts in snapshot.get('caches', {}).items():
+            total = caches.setdefault(name, {'hit': 0, 'miss': 0})
+            for result, count in counts.items():
+                total[result] = total.get(result, 0) + count
+    return routes, caches
+
+
+def _labels(**labels):
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _histogram(lines, name, buckets, counts, total, route, method):
+    cumulative = 0
+    for bound, count in zip(buckets + ('+Inf',), counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(route=route, method=method)} {total}')
+    lines.append(f'{name}_count{_labels(route=route, method=method)} {cumulative}')
+
+
+def render(routes, caches=None):
+    """
+    The Prometheus text exposition of 'routes' and of the cache counters 'caches'.
+    """
+    routes = sorted(routes.items())
+    lines = [
+        '# HELP helpdesk_http_requests_total Requests by route, method and status code.',
+        '# TYPE helpdesk_http_requests_total counter',
+    ]
+    for (route, method), metrics in routes:
+        for code, count in sorted(metrics['statuses'].items()):
+            lines.append(f'helpdesk_http_requests_total{_labels(route=route, method=method, status=code)} {count}')
+
+    lines += [
+        '# HELP helpdesk_http_request_duration_seconds Time until the response was returned.',
+        '# TYPE helpdesk_http_request_duration_seconds histogram',
+    ]
+    for (route, method), metrics in routes:
+        _histogram(lines, 'helpdesk_http_request_duration_seconds', DURATION_BUCKETS, metrics['duration'],
+                   metrics['duration_sum'], route, method)
+
+    lines += [
+        '# HELP helpdesk_db_queries_per_request SQL queries per request.',
+        '# TYPE helpdesk_db_queries_per_request histogram',
+    ]
+    for (route, method), metrics in routes:
+        _histogram(lines, 'helpdesk_db_queries_per_request', QUERY_BUCKETS, metrics['queries'],
+                   metrics['queries_sum'], route, method)
+
+    lines += [
+        '# HELP helpdesk_db_query_seconds_total Time spent in SQL queries.',
+        '# TYPE helpdesk_db_query_seconds_total counter',
+    ]
+    for (route, method), metrics in routes:
+        lines.append(f'helpdesk_db_query_seconds_total{_labels(route=route, method=method)} {metrics["sql_seconds"]}')
+
+    lines += [
+        '# HELP helpdesk_http_response_size_bytes Size of the response bodies (streamed responses are not counted).',
+        '# TYPE helpdesk_http_response_size_bytes histogram',
+    ]
+    for (route, method), metrics in routes:
+        _histogram(lines, 'helpdesk_http_response_size_bytes', SIZE_BUCKETS, metrics['size'], metrics['size_sum'],
+                   route, method)
+
+    lines += [
+        '# HELP helpdesk_cache_requests_total Cache lookups by cache and result (hit or miss).',
+        '# TYPE helpdesk_cache_requests_total counter',
+    ]
+    for name, counts in sorted((caches or {}).items()):
+        for result, count in sorted(counts.items()):
+            lines.append(f'helpdesk_cache_requests_total{_labels(cache=name, result=result)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """
+    execute_wrapper that counts the queries of a request and the time spent in them.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+# The QueryTimer of the current request. A context variable, not the connection: the async views run their
+# queries in a worker thread with its own connection, the context goes along.
+query_timer = ContextVar('query_timer', default=None)
+
+
+def time_queries(execute, sql, params, many, context):
+    timer = query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts its queries. Sync and async: under ASGI the async views keep the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = QueryTimer()
+        token = query_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            query_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = query_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_timer.reset(token)
+        self.observe(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def observe(self, request, response, duration, timer):
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None else UNMATCHED_ROUTE
+        size = None if response.streaming else len(response.content)
+        registry.observe(route, request.method, response.status_code, duration, timer.queries, timer.seconds, size)
+        registry.maybe_flush()
+
+
+@api_view(['GET'])
+def metrics_view(request):
+    """
+    EXMP GET /metrics/ -> helpdesk_http_requests_total{route="ticket-list",method="GET",status="200"} 42 ...
+    """
+    if not request.user.is_staff:
+        return Response({"message": "You don't have access to the metrics."}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(render(*collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,203 @@
+"""
+Reads from read replicas. Safe-method requests to the views with 'read_from_replica = True' read from a replica
+that keeps up, everything else goes to 'default'. A write pins its client to the primary for a while, so it reads
+its own writes.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+REPLICA_PIN = 5
+REPLICA_MAX_LAG = 3
+REPLICA_CHECK_INTERVAL = 2
+
+# The apps whose models may be read from a replica.
+REPLICA_APPS = {'tickets', 'comments'}
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# The replica the current request reads from, None -> the primary.
+read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaHealth:
+    """
+    Which replicas are in rotation, checked at most once per interval per process (by one thread at a time;
+    the other threads keep using the previous result meanwhile).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.healthy = []
+        self.lags = {}
+        self.checked_at = None
+
+    def reset(self):
+        with self.lock:
+            self.healthy, self.lags, self.checked_at = [], {}, None
+
+    def is_due(self):
+        interval = getattr(settings, 'HELPDESK_REPLICA_CHECK_INTERVAL', REPLICA_CHECK_INTERVAL)
+        return self.checked_at is None or time.monotonic() - self.checked_at >= interval
+
+    def get_healthy(self):
+        if self.is_due():
+            if self.lock.acquire(blocking=self.checked_at is None):
+                try:
+                    self.check()
+                finally:
+                    self.lock.release()
+        return self.healthy
+
+    def check(self):
+        from tickets.models import ReplicaHeartbeat
+
+        replicas = getattr(settings, 'HELPDESK_READ_REPLICAS', [])
+        max_lag = getattr(settings, 'HELPDESK_REPLICA_MAX_LAG', REPLICA_MAX_LAG)
+        # Only reads: the beat is written by 'manage.py replica_heartbeat' (write_heartbeat()), so the lag is
+        # measured against the latest beat and its resolution is the interval of that command.
+        previous = ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).filter(pk=1).values_list('beat', flat=True).first()
+
+        lags = {}
+        for alias in replicas:
+            try:
+                beat = ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('beat', flat=True).first()
+            except DatabaseError:
+                beat = None
+            # No heartbeat -> the replica is unreachable or not set up, its lag is unknown.
+            lags[alias] = None if beat is None or previous is None else max((previous - beat).total_seconds(), 0)
+
+        self.lags = lags
+        self.healthy = [alias for alias, lag in lags.items() if lag is not None and lag <= max_lag]
+        self.checked_at = time.monotonic()
+
+
+replica_health = ReplicaHealth()
+
+
+def write_heartbeat():
+    """
+    Writes the time to the ReplicaHeartbeat row on the primary, the replicas' copies of it show their lag.
+    """
+    from tickets.models import ReplicaHeartbeat
+
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).filter(pk=1).update(beat=timezone.now())
+
+
+class ReplicaRouter:
+    """
+    Sends reads of REPLICA_APPS to the replica chosen for the current request (ReplicaMiddleware).
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            return read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        return True
+
+
+def pin_key(request):
+    """
+    Cache key of the client of 'request', None for a client without session or token.
+    """
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not identity:
+        return None
+    return f'replica-pin:{hashlib.sha1(identity.encode()).hexdigest()}'
+
+
+def reads_from_replica(view_func):
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    return getattr(view_class, 'read_from_replica', False)
+
+
+class ReplicaMiddleware:
+    """
+    Chooses the database the request reads from and pins writing clients to the primary.
+    Sync and async: under ASGI 'read_alias' is set in the context of the request, not in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # The handler calls 'process_view' as it is: a coroutine here, so it runs in the request's context.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset_read_alias(request)
+
+        if request.method not in SAFE_METHODS:
+            key = pin_key(request)
+            if key is not None:
+                cache.set(key, True, getattr(settings, 'HELPDESK_REPLICA_PIN', REPLICA_PIN))
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset_read_alias(request)
+
+        if request.method not in SAFE_METHODS:
+            key = pin_key(request)
+            if key is not None:
+                await cache.aset(key, True, getattr(settings, 'HELPDESK_REPLICA_PIN', REPLICA_PIN))
+        return response
+
+    def reset_read_alias(self, request):
+        token = request.__dict__.pop('_read_alias_token', None)
+        if token is not None:
+            read_alias.reset(token)
+
+    def wants_replica(self, request, view_func):
+        return (request.method in SAFE_METHODS and reads_from_replica(view_func)
+                and getattr(settings, 'HELPDESK_READ_REPLICAS', []))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.wants_replica(request, view_func):
+            return None
+
+        key = pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        healthy = replica_health.get_healthy()
+        if healthy:
+            request._read_alias_token = read_alias.set(random.choice(healthy))
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not self.wants_replica(request, view_func):
+            return None
+
+        key = pin_key(request)
+        if key is not None and await cache.aget(key):
+            return None
+        # Only a due health check queries the databases, in a thread.
+        healthy = replica_health.healthy if not replica_health.is_due() else \
+            await sync_to_async(replica_health.get_healthy)()
+        if healthy:
+            request._read_alias_token = read_alias.set(random.choice(healthy))
+        return None
@@ -53,6 +53,8 @@ DRF_APPS = [
 INSTALLED_APPS = LOCAL_APPS + DJANGO_APPS + DRF_APPS
 
 MIDDLEWARE = [
+    # First, so it times everything below it.
+    'helpdesk.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'helpdesk.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'helpdesk.urls'
@@ -71,6 +74,7 @@ TEMPLATES = [
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
+        # Without DEBUG Django wraps the loaders in the cached loader, templates are compiled once per process.
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -113,6 +117,56 @@ TEST = {
     'NAME': 'helpdesk_test_db',
 }
 
+# HELPDESK_DB=sqlite -> run without a PostgreSQL server (e.g. the test suite on a laptop or in CI).
+# Full-text search then uses SQLite FTS5 instead of a tsvector column (tickets/search.py).
+if os.environ.get('HELPDESK_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # A file rather than an in-memory database, so threaded tests get real concurrent connections.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        },
+        'test': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db_test.sqlite3',
+            'TEST': {'NAME': BASE_DIR / 'test_db_test.sqlite3'},
+        },
+        # Stands in for a read replica in the tests of helpdesk/replicas.py (it does not replicate anything).
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db_replica.sqlite3',
+            'TEST': {'NAME': BASE_DIR / 'test_db_replica.sqlite3'},
+        },
+    }
+
+# The replica pins (helpdesk/replicas.py), the token revocations (users/authentication.py), the ticket cache
+# (tickets/caching.py) and the ticket cards (tickets/cards.py) use the default cache. A staff list alone holds a
+# card per ticket, hence the room for entries (Django keeps 300 by default). The local-memory cache belongs to
+# one process:
+# HELPDESK_CACHE_DIR -> a file cache shared by the workers of a host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+if os.environ.get('HELPDESK_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['HELPDESK_CACHE_DIR'],
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+
+# Read replicas (helpdesk/replicas.py): aliases of DATABASES, e.g. ['replica'] with
+# 'replica': {..., 'HOST': 'replica.db.internal'}. Empty -> every query goes to 'default'.
+# The lag is measured with the heartbeat written by 'manage.py replica_heartbeat', run it next to the servers.
+DATABASE_ROUTERS = ['helpdesk.replicas.ReplicaRouter']
+HELPDESK_READ_REPLICAS = []
+HELPDESK_REPLICA_PIN = 5
+HELPDESK_REPLICA_MAX_LAG = 3
+HELPDESK_REPLICA_CHECK_INTERVAL = 2
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -150,6 +204,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# 'manage.py collectstatic' copies the static files to STATIC_ROOT with a hash of their content in their names
+# (tickets/tickets.css -> tickets/tickets.3c5b0e1f52a4.css), so they can be cached by browsers for good and a
+# change gets a new URL. Without DEBUG '{% static %}' links those names; under DEBUG the sources are served.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -167,7 +235,51 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
 
+    # The same JSON as the standard renderer, written by orjson (helpdesk/renderers.py). Both answer
+    # 'application/json', the first one wins.
     'DEFAULT_RENDERER_CLASSES': (
+        'helpdesk.renderers.FastJSONRenderer',
         'rest_framework.renderers.JSONRenderer',
     ),
 }
+
+# Token authentication (users/authentication.py), in seconds.
+HELPDESK_TOKEN_INACTIVITY = 60
+HELPDESK_TOKEN_TOUCH_GRANULARITY = 10
+HELPDESK_TOKEN_CACHE_SIZE = 1024
+HELPDESK_TOKEN_CACHE_TTL = 5
+
+# Event stream of ticket changes (tickets/events.py), in seconds, the retention in days.
+HELPDESK_EVENTS_POLL_INTERVAL = 1
+HELPDESK_EVENTS_HEARTBEAT = 15
+HELPDESK_EVENTS_STREAM_TIMEOUT = 300
+HELPDESK_EVENTS_RETENTION = 7
+
+# Archive of finished tickets (tickets/archive.py): days without changes, tickets moved per transaction.
+HELPDESK_ARCHIVE_AFTER_DAYS = 180
+HELPDESK_ARCHIVE_BATCH_SIZE = 500
+
+# Fast deletes of tickets and users (tickets/deletion.py): rows deleted per statement and transaction.
+HELPDESK_DELETE_CHUNK_SIZE = 1000
+
+# Versioned cache of the ticket lists and tickets (tickets/caching.py): alias of CACHES (None -> off), seconds.
+HELPDESK_TICKET_CACHE = 'default'
+HELPDESK_TICKET_CACHE_TIMEOUT = 300
+# Cached ticket cards of the list pages (tickets/cards.py), in seconds.
+HELPDESK_TICKET_CARD_TIMEOUT = 24 * 60 * 60
+
+# Work queue of the open tickets (tickets/queue.py): seconds a staff member holds a claimed ticket.
+HELPDESK_TICKET_CLAIM_LEASE = 15 * 60
+
+# Webhooks of ticket changes (tickets/webhooks.py), an endpoint may set 'concurrency' (requests in flight), e.g.
+# {'crm': {'url': 'https://crm.example.com/hooks/helpdesk', 'secret': os.environ['CRM_WEBHOOK_SECRET']}}.
+HELPDESK_WEBHOOKS = {}
+HELPDESK_WEBHOOK_TIMEOUT = 5
+HELPDESK_WEBHOOK_MAX_ATTEMPTS = 8
+HELPDESK_WEBHOOK_RETRY_BASE = 30
+HELPDESK_WEBHOOK_RETRY_MAX = 60 * 60
+
+# Request metrics (helpdesk/metrics.py). Set the directory (writable by every worker, emptied on deploy) to
+# add up the metrics of all gunicorn worker processes.
+HELPDESK_METRICS_DIR = os.environ.get('HELPDESK_METRICS_DIR')
+HELPDESK_METRICS_FLUSH_INTERVAL = 1
@@ -18,6 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken import views
 
+from .metrics import metrics_view
+
 
 urlpatterns = [
     path('api-token-auth/', views.obtain_auth_token),
@@ -25,4 +27,5 @@ urlpatterns = [
     path('tickets/', include('tickets.urls')),
     path('comments/', include('comments.urls')),
     path('users/', include('users.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -4,3 +4,7 @@ class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Connects the query timer of helpdesk/metrics.py to every database connection.
+        from helpdesk import metrics  # noqa: F401
@@ -0,0 +1,85 @@
+"""
+Archive tier: finished tickets that have not changed for a while are moved, with their comments, to ArchivedTicket
+and ArchivedComment ('manage.py archive_tickets'). They keep their ids and are read-only.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from comments.models import ArchivedComment, Comment
+from .caching import tickets_changed
+from .deletion import raw_delete
+from .models import ArchivedTicket, Ticket, TicketEvent, TERMINAL_STATUSES
+from .search import forget_sqlite_search_documents
+
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_BATCH_SIZE = 500
+
+TICKET_FIELDS = ['id', 'ticket_user_id', 'priority', 'topic', 'description', 'status', 'created_date',
+                 'decline_reason', 'restore_request', 'version']
+COMMENT_FIELDS = ['id', 'ticket_id', 'comment_user_id', 'text', 'created_date', 'version']
+
+INCLUDE_ARCHIVED_PARAM = 'include_archived'
+
+
+def include_archived(params):
+    """
+    True for '?include_archived=true' (or 1, yes) in the query parameters 'params'.
+    """
+    return params.get(INCLUDE_ARCHIVED_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def archivable(now=None, days=None):
+    """
+    The live tickets that are due for the archive.
+    """
+    if days is None:
+        days = getattr(settings, 'HELPDESK_ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS)
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Ticket.objects.filter(status__in=TERMINAL_STATUSES, updated_at__lt=cutoff)
+
+
+def archive_batch(queryset, batch_size):
+    """
+    Moves up to 'batch_size' tickets of 'queryset' and their comments to the archive. Returns how many moved.
+    """
+    with transaction.atomic():
+        ids = list(queryset.order_by('id').select_for_update(skip_locked=True).values_list('id', flat=True)
+                   [:batch_size])
+        if not ids:
+            return 0
+
+        now = timezone.now()
+        ArchivedTicket.objects.bulk_create([
+            ArchivedTicket(**{**row, 'version': row['version'] + 1}, updated_at=now, archived_at=now)
+            for row in Ticket.objects.filter(pk__in=ids).values(*TICKET_FIELDS)
+        ])
+        comments = Comment.objects.filter(ticket_id__in=ids)
+        ArchivedComment.objects.bulk_create(ArchivedComment(**row) for row in comments.values(*COMMENT_FIELDS))
+
+        # Plain DELETEs (tickets/deletion.py): post_delete would take the tickets out of the counters and bump
+        # the tickets of the deleted comments. The batch may hold tickets of any user, every cached list goes.
+        forget_sqlite_search_documents(connections[queryset.db], ids)
+        raw_delete(TicketEvent.objects.filter(ticket_id__in=ids))
+        raw_delete(comments)
+        raw_delete(Ticket.objects.filter(pk__in=ids))
+        tickets_changed()
+    return len(ids)
+
+
+def archive_tickets(days=None, batch_size=None, now=None):
+    """
+    Archives every due ticket, one batch per transaction. Returns how many were archived.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'HELPDESK_ARCHIVE_BATCH_SIZE', ARCHIVE_BATCH_SIZE)
+    queryset = archivable(now, days)
+    total = 0
+    while True:
+        moved = archive_batch(queryset, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
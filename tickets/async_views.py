@@ -0,0 +1,151 @@
+""" ASYNC VIEWS """
+
+from collections import OrderedDict
+from functools import wraps
+
+from django.db.models import BooleanField, Value
+from django.http import JsonResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.request import Request
+
+from users.authentication import async_token_required, async_login_required
+from .archive import include_archived
+from .conditional import ticket_etag, page_etag, is_conditional, not_modified, set_validators
+from .events import EventStream
+from .models import ArchivedTicket, Ticket
+from .pagination import TicketCursorPagination, apaginate_keyset, KEYSET_FIELDS
+from .search import search_tickets
+from .serializers import ArchivedTicketSerializer, TicketSerializer, TicketSearchSerializer
+from .sparse import get_sparse_fields, only_fields, ValuesSerializer
+
+
+def async_safe_methods_only(view):
+    """
+    'require_safe' for async views (the decorators of django.views.decorators.http are sync-only in Django 4.2).
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+@async_safe_methods_only
+@async_token_required
+async def ticket_list_async_view(request):
+    """
+    EXMP GET /tickets/async/?priority=High&page_size=50 (same parameters as /tickets/rest/, ?include_archived= too)
+    """
+    filters = {'priority': request.GET.get('priority'), 'status': request.GET.get('status')}
+    queryset = Ticket.objects.visible_to(request.user).filtered(**filters)
+    archived = None
+    if include_archived(request.GET):
+        archived = ArchivedTicket.objects.visible_to(request.user).filtered(**filters)
+    paginator = TicketCursorPagination()
+    page_size = paginator.get_page_size(Request(request))
+    try:
+        fields = get_sparse_fields(request.GET, TicketSearchSerializer, ArchivedTicketSerializer)
+    except ParseError as error:
+        return JsonResponse({'detail': error.detail}, status=400)
+
+    query = request.GET.get(paginator.search_param, '').strip()
+    if query:
+        queryset = only_fields(queryset, TicketSerializer, fields, 'id')
+        rows = [ticket async for ticket in search_tickets(queryset, query)[:page_size]]
+        return JsonResponse(OrderedDict([
+            ('next', None),
+            ('previous', None),
+            ('results', TicketSearchSerializer(rows, many=True, context={'fields': fields}).data),
+        ]))
+
+    try:
+        cursor = paginator.get_cursor(Request(request))
+    except NotFound as error:
+        return JsonResponse({'detail': error.detail}, status=404)
+
+    if 'HTTP_IF_NONE_MATCH' in request.META:
+        validators = await apaginate_keyset(
+            queryset.values(*KEYSET_FIELDS), cursor, page_size,
+            archived=archived.values(*KEYSET_FIELDS) if archived is not None else None)
+        response = not_modified(request, page_etag(validators))
+        if response is not None:
+            return response
+
+    serializer = ValuesSerializer(TicketSerializer, fields)
+    archived_serializer = ValuesSerializer(ArchivedTicketSerializer, fields)
+    if archived is not None:
+        archived = archived.annotate(archived=Value(True, output_field=BooleanField())).values(
+            *archived_serializer.columns(*KEYSET_FIELDS, 'archived'))
+    paginator.base_url = request.build_absolute_uri()
+    paginator.page = await apaginate_keyset(queryset.values(*serializer.columns(*KEYSET_FIELDS)), cursor, page_size,
+                                            archived=archived)
+    response = JsonResponse(OrderedDict([
+        ('next', paginator.get_next_link()),
+        ('previous', paginator.get_previous_link()),
+        ('results', [(archived_serializer if row.get('archived') else serializer).to_representation(row)
+                     for row in paginator.page.rows]),
+    ]))
+    return set_validators(response, page_etag(paginator.page))
+
+
+@async_safe_methods_only
+@async_token_required
+async def ticket_detail_async_view(request, pk):
+    """
+    EXMP GET /tickets/async/7/ (same as /tickets/rest/7/, the archived copy once the ticket was archived)
+    """
+    try:
+        fields = get_sparse_fields(request.GET, TicketSerializer, ArchivedTicketSerializer)
+    except ParseError as error:
+        return JsonResponse({'detail': error.detail}, status=400)
+    queryset = Ticket.objects.visible_to(request.user).filter(pk=pk)
+    # Archived tickets are only looked up after the ticket table misses, they are the rare case.
+    archived = ArchivedTicket.objects.visible_to(request.user).filter(pk=pk)
+
+    if is_conditional(request):
+        validators = await queryset.values_list('version', 'updated_at').afirst() or \
+            await archived.values_list('version', 'updated_at').afirst()
+        if validators is None:
+            return not_found()
+        response = not_modified(request, ticket_etag(pk, validators[0]), validators[1])
+        if response is not None:
+            return response
+
+    serializer_class = TicketSerializer
+    ticket = await only_fields(queryset, TicketSerializer, fields, 'id', 'version', 'updated_at').afirst()
+    if ticket is None:
+        serializer_class = ArchivedTicketSerializer
+        ticket = await only_fields(archived, ArchivedTicketSerializer, fields, 'id', 'version', 'updated_at').afirst()
+    if ticket is None:
+        return not_found()
+    return set_validators(JsonResponse(serializer_class(ticket, context={'fields': fields}).data),
+                          ticket_etag(ticket.pk, ticket.version), ticket.updated_at)
+
+
+@async_safe_methods_only
+@async_login_required
+async def ticket_events_view(request):
+    """
+    EXMP GET /tickets/events/ (text/event-stream, session or token authentication)
+    -> "event: status", "data: {"ticket": 7, "status": "Approved"}" and "event: comment", "data: {"ticket": 7,
+    "comment": 12}" for the tickets the user can see. A reconnecting EventSource sends Last-Event-ID and gets
+    what it missed, ?last_event_id= does the same for the first connection. ASGI only: under WSGI the stream
+    would hold a worker thread for its whole life.
+    """
+    last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return JsonResponse({'message': 'Last-Event-ID must be an event id.'}, status=400)
+
+    response = StreamingHttpResponse(EventStream(request.user, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
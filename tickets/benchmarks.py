@@ -0,0 +1,303 @@
+"""
+Benchmarks of every REST and HTML endpoint through the test client, with a query and a latency budget per view.
+Not covered: /tickets/events/ (a stream that stays open) and the Django admin.
+"""
+
+import itertools
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from comments.models import Comment
+from helpdesk.metrics import QueryTimer
+from users.authentication import token_cache
+from users.models import UM
+from .models import Ticket
+from .seeding import seed
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Budgets for views without their own. The latencies are for the seeded volume of 'manage.py benchmark_endpoints'
+# on a developer machine, the query counts do not depend on the volume. The REST budgets leave room for the
+# two token queries (users/authentication.py) that a request makes when its token is not cached or is touched.
+MAX_QUERIES = 10
+MAX_P95_MS = 150
+
+# Hashing a password (PBKDF2) takes most of the time of the views that check or set one.
+PASSWORD_P95_MS = 1500
+
+
+class Endpoint:
+    """
+    'path' and 'data' are formatted with 'obj', the target of the request:
+    target=None -> the benchmark ticket (InProcess, with comments), target='<status>' -> a new ticket of the
+    benchmark user in that status, target='comment' -> a new comment of the benchmark user on the benchmark ticket.
+    'client' -> 'user', 'staff' or 'anonymous'; fresh_client -> a new client for every request (login, logout).
+    """
+
+    def __init__(self, name, path, method='get', client='user', target=None, data=None, format=None, status=200,
+                 fresh_client=False, max_queries=MAX_QUERIES, max_p95_ms=MAX_P95_MS):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.client = client
+        self.target = target
+        self.data = data
+        self.format = format
+        self.status = status
+        self.fresh_client = fresh_client
+        self.max_queries = max_queries
+        self.max_p95_ms = max_p95_ms
+
+
+unique = itertools.count()
+
+ENDPOINTS = [
+    # users
+    Endpoint('login_view GET', '/users/login/', client='anonymous', max_queries=0),
+    Endpoint('login_view POST', '/users/login/', 'post', client='anonymous', fresh_client=True,
+             data=lambda obj: {'username': 'benchmark-user', 'password': BENCHMARK_PASSWORD},
+             max_queries=10, max_p95_ms=PASSWORD_P95_MS),
+    Endpoint('register_view GET', '/users/register/', client='anonymous', max_queries=0),
+    Endpoint('register_view POST', '/users/register/', 'post', client='anonymous', status=302,
+             data=lambda obj: {'username': f'benchmark-new-{next(unique)}', 'first_name': 'First',
+                               'last_name': 'Last', 'password': BENCHMARK_PASSWORD,
+                               'confirm_password': BENCHMARK_PASSWORD},
+             max_queries=2, max_p95_ms=PASSWORD_P95_MS),
+    Endpoint('logout_view GET', '/users/logout/', fresh_client=True, status=302, max_queries=4),
+    Endpoint('api-token-auth POST', '/api-token-auth/', 'post', client='anonymous', format='json',
+             data=lambda obj: {'username': 'benchmark-user', 'password': BENCHMARK_PASSWORD},
+             max_queries=2, max_p95_ms=PASSWORD_P95_MS),
+
+    # tickets, HTML
+    Endpoint('main_view GET', '/tickets/main/', max_queries=4),
+    Endpoint('main_view GET staff', '/tickets/main/', client='staff', max_queries=3),
+    Endpoint('main_view GET search', '/tickets/main/?search=Issue', max_queries=3),
+    Endpoint('restore_tickets_view GET', '/tickets/restore-tickets/', client='staff', max_queries=3),
+    Endpoint('active_tickets_view GET', '/tickets/active-tickets/', client='staff', max_queries=3),
+    Endpoint('ticket_detail_view GET', '/tickets/ticket/{obj.pk}/', max_queries=3),
+    Endpoint('ticket_create_view GET', '/tickets/create-ticket/', max_queries=2),
+    Endpoint('ticket_create_view POST', '/tickets/create-ticket/', 'post', status=302,
+             data=lambda obj: {'priority': 'Low', 'topic': 'Benchmark', 'description': 'Benchmark ticket'},
+             max_queries=7),
+    Endpoint('ticket_user_update_view GET', '/tickets/user-update-ticket/{obj.pk}/', target='Active',
+             max_queries=3),
+    Endpoint('ticket_user_update_view POST', '/tickets/user-update-ticket/{obj.pk}/', 'post', target='Active',
+             data=lambda obj: {'description': 'Edited', 'priority': 'High', 'version': obj.version}, status=302,
+             max_queries=8),
+    Endpoint('ticket_admin_delete_view GET', '/tickets/admin-delete-ticket/{obj.pk}/', client='staff',
+             target='Active', max_queries=3),
+    Endpoint('ticket_admin_delete_view POST', '/tickets/admin-delete-ticket/{obj.pk}/', 'post', client='staff',
+             target='Active', status=302, max_queries=11),
+    Endpoint('ticket_approve_view GET', '/tickets/approve-ticket/{obj.pk}/', client='staff', target='Active',
+             status=302, max_queries=9),
+    Endpoint('ticket_decline_view GET', '/tickets/decline-ticket/{obj.pk}/', client='staff', target='Active',
+             max_queries=3),
+    Endpoint('ticket_decline_view POST', '/tickets/decline-ticket/{obj.pk}/', 'post', client='staff',
+             target='Active', data=lambda obj: {'decline_reason': 'Benchmark'}, status=302, max_queries=9),
+    Endpoint('ticket_restore_view GET', '/tickets/restore-ticket/{obj.pk}/', target='Declined', status=302,
+             max_queries=9),
+    Endpoint('ticket_in_process_view GET', '/tickets/in-process-ticket/{obj.pk}/', client='staff',
+             target='Approved', status=302, max_queries=9),
+    Endpoint('ticket_done_view GET', '/tickets/done-ticket/{obj.pk}/', client='staff', target='InProcess',
+             status=302, max_queries=9),
+    Endpoint('tickets_bulk_action_view POST', '/tickets/bulk-action-tickets/', 'post', client='staff',
+             target='Active', data=lambda obj: {'ids': [obj.pk], 'action': 'approve'}, status=302,
+             max_queries=9),
+    Endpoint('ticket_claim_next_view POST', '/tickets/claim-next-ticket/', 'post', client='staff', target='Active',
+             status=302, max_queries=9),
+
+    # comments, HTML
+    Endpoint('comments_list_view GET', '/comments/{obj.pk}/', max_queries=4),
+    Endpoint('comment_create_view GET', '/comments/create-comment/{obj.pk}/', max_queries=3),
+    Endpoint('comment_create_view POST', '/comments/create-comment/{obj.pk}/', 'post',
+             data=lambda obj: {'text': 'Benchmark comment'}, status=302, max_queries=12),
+    Endpoint('comment_update_view GET', '/comments/update-comment/{obj.pk}/', target='comment', max_queries=5),
+    Endpoint('comment_update_view POST', '/comments/update-comment/{obj.pk}/', 'post', target='comment',
+             data=lambda obj: {'text': 'Edited', 'version': obj.version}, status=302, max_queries=9),
+    Endpoint('comment_delete_view GET', '/comments/delete-comment/{obj.pk}/', target='comment', max_queries=5),
+    Endpoint('comment_delete_view POST', '/comments/delete-comment/{obj.pk}/', 'post', target='comment',
+             status=302, max_queries=7),
+
+    # tickets, REST
+    Endpoint('ticket-list GET', '/tickets/rest/', max_queries=3),
+    Endpoint('ticket-list GET staff', '/tickets/rest/', client='staff', max_queries=3),
+    Endpoint('ticket-list GET status', '/tickets/rest/?status=Active', client='staff', max_queries=3),
+    Endpoint('ticket-list GET search', '/tickets/rest/?search=Issue', max_queries=3),
+    Endpoint('ticket-list GET archived', '/tickets/rest/?include_archived=true', max_queries=4),
+    Endpoint('ticket-list GET fields', '/tickets/rest/?fields=id,topic,status&page_size=100', client='staff',
+             max_queries=3),
+    Endpoint('ticket-list POST', '/tickets/rest/', 'post', format='json', status=201,
+             data=lambda obj: {'topic': 'Benchmark', 'description': 'Benchmark ticket', 'priority': 'Low'},
+             max_queries=8),
+    Endpoint('ticket-detail GET', '/tickets/rest/{obj.pk}/', max_queries=4),
+    Endpoint('ticket-detail PATCH', '/tickets/rest/{obj.pk}/', 'patch', target='Active', format='json',
+             data=lambda obj: {'description': 'Edited'}, max_queries=7),
+    Endpoint('ticket-detail DELETE', '/tickets/rest/{obj.pk}/', 'delete', client='staff', target='Active',
+             status=204, max_queries=11),
+    Endpoint('ticket-export GET', '/tickets/rest/export/', max_queries=4),
+    Endpoint('ticket-bulk POST', '/tickets/rest/bulk/', 'post', format='json', status=201,
+             data=lambda obj: [{'topic': f'Benchmark {i}', 'description': 'Benchmark ticket', 'priority': 'Low'}
+                               for i in range(20)],
+             max_queries=7),
+    Endpoint('ticket_decline_api GET', '/tickets/api/decline-ticket/{obj.pk}/', client='staff', target='Active',
+             max_queries=3),
+    Endpoint('ticket_decline_api POST', '/tickets/api/decline-ticket/{obj.pk}/', 'post', client='staff',
+             target='Active', format='json', data=lambda obj: {'decline_reason': 'Benchmark'}, max_queries=9),
+    Endpoint('ticket_approve_api GET', '/tickets/api/approve-ticket/{obj.pk}/', client='staff', target='Active',
+             max_queries=10),
+    Endpoint('ticket_restore_api GET', '/tickets/api/restore-ticket/{obj.pk}/', target='Declined',
+             max_queries=10),
+    Endpoint('ticket_in_process_api GET', '/tickets/api/in-process-ticket/{obj.pk}/', client='staff',
+             target='Approved', max_queries=10),
+    Endpoint('ticket_done_api POST', '/tickets/api/done-ticket/{obj.pk}/', 'post', client='staff',
+             target='InProcess', max_queries=10),
+    Endpoint('tickets_bulk_approve_api POST', '/tickets/api/bulk-approve-tickets/', 'post', client='staff',
+             target='Active', format='json', data=lambda obj: {'ids': [obj.pk]}, max_queries=9),
+    Endpoint('ticket_claim_next_api POST', '/tickets/api/claim-next-ticket/', 'post', client='staff',
+             target='Active', max_queries=7),
+    Endpoint('ticket_counters_api GET', '/tickets/api/ticket-counters/', client='staff', max_queries=3),
+    Endpoint('ticket_list_async GET', '/tickets/async/', max_queries=3),
+    Endpoint('ticket_detail_async GET', '/tickets/async/{obj.pk}/', max_queries=3),
+
+    # comments, REST
+    Endpoint('comment-list GET', '/comments/{obj.pk}/rest/', max_queries=4),
+    Endpoint('comment-list GET fields', '/comments/{obj.pk}/rest/?fields=id,text', max_queries=4),
+    Endpoint('comment-list POST', '/comments/{obj.pk}/rest/', 'post', format='json',
+             data=lambda obj: {'text': 'Benchmark comment'}, status=201, max_queries=8),
+    Endpoint('comment-detail GET', '/comments/{obj.ticket_id}/rest/{obj.pk}/', target='comment', max_queries=4),
+    Endpoint('comment-detail PATCH', '/comments/{obj.ticket_id}/rest/{obj.pk}/', 'patch', target='comment',
+             format='json', data=lambda obj: {'text': 'Edited'}, max_queries=7),
+    Endpoint('comment-detail DELETE', '/comments/{obj.ticket_id}/rest/{obj.pk}/', 'delete', target='comment',
+             status=204, max_queries=5),
+    Endpoint('comment_list_async GET', '/comments/{obj.pk}/async/', max_queries=4),
+
+    Endpoint('metrics GET', '/metrics/', client='staff', max_queries=2),
+]
+
+
+class BenchmarkResult:
+    def __init__(self, endpoint, latencies, queries, peak_memory):
+        self.endpoint = endpoint
+        latencies = sorted(latencies)
+        self.p50_ms = latencies[len(latencies) // 2] * 1000
+        self.p95_ms = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000
+        self.queries = queries
+        self.peak_memory = peak_memory
+
+    def violations(self, check_latency=True):
+        violations = []
+        if self.queries > self.endpoint.max_queries:
+            violations.append(f'{self.queries} queries, the budget is {self.endpoint.max_queries}')
+        if check_latency and self.p95_ms > self.endpoint.max_p95_ms:
+            violations.append(f'p95 {self.p95_ms:.1f} ms, the budget is {self.endpoint.max_p95_ms} ms')
+        return violations
+
+
+class BenchmarkFixtures:
+    """
+    The benchmark users (with a password, for the login views, and a token, for the REST views) and the
+    benchmark ticket, on top of the seeded volume.
+    """
+
+    def __init__(self, host=None):
+        self.host = host
+        self.user = UM.objects.create_user(username='benchmark-user', password=BENCHMARK_PASSWORD)
+        self.staff = UM.objects.create_user(username='benchmark-staff', password=BENCHMARK_PASSWORD, is_staff=True)
+        self.ticket = self.new_ticket('InProcess')
+        Comment.objects.bulk_create(Comment(ticket=self.ticket, comment_user=self.user if i % 2 else self.staff,
+                                            text=f'Benchmark comment {i}') for i in range(10))
+        self.clients = {kind: self.new_client(kind) for kind in ['user', 'staff', 'anonymous']}
+
+    def new_client(self, kind):
+        client = APIClient(HTTP_HOST=self.host) if self.host else APIClient()
+        if kind != 'anonymous':
+            user = self.user if kind == 'user' else self.staff
+            client.force_login(user)
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def new_ticket(self, status):
+        return Ticket.objects.create(
+            ticket_user=self.user, status=status, priority='Medium', topic='Benchmark', description='Benchmark ticket',
+            decline_reason='Benchmark' if status in ('Declined', 'InRestoration') else '',
+            restore_request=status == 'InRestoration',
+        )
+
+    def get_target(self, target):
+        if target is None:
+            return self.ticket
+        if target == 'comment':
+            return Comment.objects.create(ticket=self.ticket, comment_user=self.user, text='Benchmark comment')
+        return self.new_ticket(target)
+
+
+def request(fixtures, endpoint):
+    """
+    Prepares and sends one request to 'endpoint'. Returns (seconds, queries); preparing it is not measured.
+    """
+    client = fixtures.new_client(endpoint.client) if endpoint.fresh_client else fixtures.clients[endpoint.client]
+    obj = fixtures.get_target(endpoint.target)
+    path = endpoint.path.format(obj=obj)
+    kwargs = {}
+    if endpoint.data is not None:
+        kwargs['data'] = endpoint.data(obj)
+    if endpoint.format is not None:
+        kwargs['format'] = endpoint.format
+
+    # Counted like MetricsMiddleware counts them, CaptureQueriesContext stops counting once the query log is full.
+    timer = QueryTimer()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(timer))
+        start = time.perf_counter()
+        response = getattr(client, endpoint.method)(path, **kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        seconds = time.perf_counter() - start
+
+    if response.status_code != endpoint.status:
+        raise AssertionError(f'{endpoint.name} {path} answered {response.status_code}, '
+                             f'expected {endpoint.status}.')
+    return seconds, timer.queries
+
+
+def run_endpoint(fixtures, endpoint, repeat):
+    request(fixtures, endpoint)  # warm-up: caches, lazy imports, compiled templates
+    latencies, queries = [], 0
+    for _ in range(repeat):
+        seconds, count = request(fixtures, endpoint)
+        latencies.append(seconds)
+        queries = max(queries, count)
+
+    tracemalloc.start()
+    try:
+        request(fixtures, endpoint)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(endpoint, latencies, queries, peak_memory)
+
+
+def run_benchmarks(users=50, tickets=5000, comments=3, repeat=20, endpoints=None, host=None):
+    """
+    Seeds the volume, benchmarks 'endpoints' (all of ENDPOINTS by default) and returns their BenchmarkResults.
+    The rows are written in the caller's transaction.
+    """
+    seed(users=users, tickets=tickets, comments=comments)
+    fixtures = BenchmarkFixtures(host=host)
+    try:
+        # A whole run takes longer than the token inactivity timeout, the tokens must not expire halfway.
+        with override_settings(HELPDESK_TOKEN_INACTIVITY=24 * 60 * 60):
+            return [run_endpoint(fixtures, endpoint, repeat) for endpoint in endpoints or ENDPOINTS]
+    finally:
+        # The cached tokens would outlive a rollback of the rows.
+        token_cache.clear()
+
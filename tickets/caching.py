@@ -0,0 +1,133 @@
+"""
+Versioned cache of the ticket lists and of single tickets. Entries are keyed on the generations of the reader's
+scope, every write of a ticket or a comment moves them ('tickets_changed'): older entries are never read again.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from helpdesk.metrics import registry
+from helpdesk.replicas import read_alias, REPLICA_MAX_LAG
+
+TICKET_CACHE = 'default'
+TICKET_CACHE_TIMEOUT = 300
+
+ALL_SCOPE = 'all'
+STAFF_SCOPE = 'staff'
+
+
+def get_ticket_cache():
+    """
+    The cache of HELPDESK_TICKET_CACHE, None when it is turned off.
+    """
+    alias = getattr(settings, 'HELPDESK_TICKET_CACHE', TICKET_CACHE)
+    return caches[alias] if alias is not None else None
+
+
+def user_scope(user_id):
+    return f'user-{user_id}'
+
+
+def scope_of(user):
+    """
+    The scope of the tickets 'user' sees (Ticket.objects.visible_to).
+    """
+    return STAFF_SCOPE if user.is_staff else user_scope(user.pk)
+
+
+def _generation_key(scope):
+    return f'tickets:generation:{scope}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _move_generations(cache, scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    now = _now_ms()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
+
+
+def tickets_changed(*owner_ids):
+    """
+    Leaves the cached entries that show tickets of the users 'owner_ids' behind, every entry without 'owner_ids'.
+    Called by every write of a ticket or a comment, in its transaction.
+    """
+    cache = get_ticket_cache()
+    if cache is None:
+        return
+    scopes = [STAFF_SCOPE, *{user_scope(pk) for pk in owner_ids}] if owner_ids else [ALL_SCOPE]
+    _move_generations(cache, scopes)
+    transaction.on_commit(lambda: _move_generations(cache, scopes))
+
+
+def ticket_owners(comment):
+    """
+    (id of the owner of the comment's ticket,) for 'tickets_changed' when the ticket is loaded, () otherwise.
+    """
+    if type(comment)._meta.get_field('ticket').is_cached(comment):
+        return (comment.ticket.ticket_user_id,)
+    return ()
+
+
+class TicketCacheEntry:
+    """
+    The entry of view 'name' for the request of 'user' to 'url'.
+    EXMP TicketCacheEntry('ticket-list', request.user, request.build_absolute_uri()).get()
+    """
+    missing = object()
+
+    def __init__(self, name, user, url):
+        self.name = name
+        self.cache = get_ticket_cache()
+        if self.cache is None:
+            return
+
+        keys = [_generation_key(ALL_SCOPE), _generation_key(scope_of(user))]
+        generations = self.cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # 'add', not 'set': a writer that got there first wins.
+                self.cache.add(key, _now_ms(), timeout=None)
+                generations[key] = self.cache.get(key, 0)
+        self.changed_at = max(generations.values())
+
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        self.key = f'tickets:{name}:{scope_of(user)}:{":".join(str(generations[key]) for key in keys)}:{digest}'
+
+    def get(self):
+        """
+        The cached value, None on a miss.
+        """
+        if self.cache is None:
+            return None
+        value = self.cache.get(self.key, self.missing)
+        registry.observe_cache(self.name, value is not self.missing)
+        return None if value is self.missing else value
+
+    def set(self, value):
+        if self.cache is None:
+            return
+        max_lag = getattr(settings, 'HELPDESK_REPLICA_MAX_LAG', REPLICA_MAX_LAG)
+        if read_alias.get() is not None and _now_ms() - self.changed_at <= max_lag * 1000:
+            return
+        self.cache.set(self.key, value, getattr(settings, 'HELPDESK_TICKET_CACHE_TIMEOUT', TICKET_CACHE_TIMEOUT))
+
+
+def cached_ticket_page(name, request, read_page):
+    """
+    read_page() (a page of tickets, e.g. tickets/pagination.py KeysetPage) from the entry of view 'name' for
+    'request'. Nothing is read from the database on a hit.
+    """
+    entry = TicketCacheEntry(name, request.user, request.build_absolute_uri())
+    cached = entry.get()
+    if cached is None:
+        cached = read_page()
+        entry.set(cached)
+    return cached
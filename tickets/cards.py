@@ -0,0 +1,80 @@
+"""
+The ticket cards of the list pages (index.html), cached one by one under the ticket's id and version.
+
+EXMP {% load ticket_cards %} ... {% ticket_cards tickets %}
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from helpdesk.metrics import registry
+from .caching import get_ticket_cache
+
+TICKET_CARD_TIMEOUT = 24 * 60 * 60
+CARD_TEMPLATE = 'ticket_card.html'
+
+# The columns a card and its cache key read; the list views load only these ('.only()').
+CARD_FIELDS = ['id', 'ticket_user', 'priority', 'topic', 'status', 'created_date', 'version']
+
+# Reversed in place of a ticket id to get the URL of every card from one 'reverse'.
+PK_PLACEHOLDER = 918273645
+
+
+def card_url(name):
+    """
+    The URL of view 'name' of a ticket as a format string, EXMP '/tickets/ticket/{}/'.
+    """
+    return reverse(name, kwargs={'pk': PK_PLACEHOLDER}).replace(str(PK_PLACEHOLDER), '{}')
+
+
+def viewer_role(ticket, user):
+    if user.is_staff:
+        return 'staff'
+    return 'owner' if ticket.ticket_user_id == user.pk else 'other'
+
+
+def render_ticket_cards(tickets, user, bulk=False):
+    """
+    The HTML of the cards of 'tickets' as seen by 'user'; bulk=True -> with the bulk action checkboxes.
+    """
+    template = get_template(CARD_TEMPLATE)
+    cache = get_ticket_cache()
+    timeout = getattr(settings, 'HELPDESK_TICKET_CARD_TIMEOUT', TICKET_CARD_TIMEOUT)
+    digest = hashlib.sha1(template.template.source.encode()).hexdigest()[:12]
+
+    cards = []
+    for ticket in tickets:
+        role = viewer_role(ticket, user)
+        key = None
+        if cache is not None and not getattr(ticket, 'search_snippet', None):
+            kind = 'archived' if ticket.archived else 'ticket'
+            key = f'tickets:card:{digest}:{kind}-{ticket.pk}-v{ticket.version}:{role}:{int(bulk)}'
+        cards.append((ticket, role, key))
+
+    cached = cache.get_many([key for _, _, key in cards if key is not None]) if cache is not None else {}
+    # One context and one 'reverse' per URL for all the cards, each card pushes its ticket.
+    detail_url, delete_url = card_url('ticket_detail_view'), card_url('ticket_admin_delete_view')
+    context = Context({'bulk': bulk})
+    html = []
+    missed = {}
+    for ticket, role, key in cards:
+        card = cached.get(key)
+        if card is None:
+            with context.push(ticket=ticket, role=role, detail_url=detail_url.format(ticket.pk),
+                              delete_url=delete_url.format(ticket.pk)):
+                card = template.template.render(context)
+            if key is not None:
+                missed[key] = card
+        html.append(card)
+
+    if missed:
+        cache.set_many(missed, timeout)
+    if cache is not None:
+        registry.observe_cache('ticket_card', True, len(cached))
+        registry.observe_cache('ticket_card', False, len(missed))
+    return mark_safe(''.join(html))
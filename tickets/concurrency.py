@@ -0,0 +1,87 @@
+"""
+Optimistic concurrency control for edits of tickets and comments: an edit is written with
+"UPDATE ... WHERE id = %s AND version = %s" and rejected when anyone saved in between.
+"""
+
+import re
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+from .caching import tickets_changed, ticket_owners
+from .counters import move_counters
+from .events import record_status_events
+from .models import Ticket
+
+# Versions start at 1, so an edit against this one never matches.
+UNMATCHABLE_VERSION = 0
+
+
+def if_match_version(request, kind, pk):
+    """
+    The version named by the If-Match header of 'request' for resource 'kind' 'pk', e.g. 3 for "ticket-7-v3".
+    None without the header or for 'If-Match: *', UNMATCHABLE_VERSION if no ETag in it belongs to the resource.
+    """
+    header = request.META.get('HTTP_IF_MATCH')
+    if not header:
+        return None
+
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return None
+    for etag in etags:
+        match = re.fullmatch(rf'"{kind}-{pk}-v(\d+)"', etag)
+        if match:
+            return int(match.group(1))
+    return UNMATCHABLE_VERSION
+
+
+def save_ticket_edit(ticket, version, **values):
+    """
+    Writes 'values' to 'ticket' if it is still at 'version' and returns True, otherwise returns False.
+    'ticket' must be the ticket as loaded from the database (its fields may already hold the edited values).
+    On success it holds the written values and its new version.
+    """
+    if version != ticket.version:
+        return False
+    old = getattr(ticket, '_counted_as', (None, None))
+    if None in old:
+        old = (ticket.status, ticket.priority)
+
+    values['updated_at'] = timezone.now()
+    with transaction.atomic():
+        if not Ticket.objects.filter(pk=ticket.pk, version=version).bump(**values):
+            return False
+        # The row was still at the version it was loaded with, so 'old' is what the counters hold for it.
+        new = (values.get('status', old[0]), values.get('priority', old[1]))
+        move_counters(old, new)
+        if new[0] != old[0]:
+            record_status_events([(ticket.pk, ticket.ticket_user_id, new[0])])
+        tickets_changed(ticket.ticket_user_id)
+
+    for field, value in values.items():
+        setattr(ticket, field, value)
+    ticket.version = version + 1
+    ticket._counted_as = new
+    return True
+
+
+def save_comment_edit(comment, version, **values):
+    """
+    'save_ticket_edit' for comments. A successful edit also makes a new version of the comment's ticket.
+    """
+    if version != comment.version:
+        return False
+
+    with transaction.atomic():
+        if not type(comment).objects.filter(pk=comment.pk, version=version).update(version=F('version') + 1, **values):
+            return False
+        Ticket.objects.filter(pk=comment.ticket_id).bump()
+        tickets_changed(*ticket_owners(comment))
+
+    for field, value in values.items():
+        setattr(comment, field, value)
+    comment.version = version + 1
+    return True
@@ -0,0 +1,56 @@
+"""
+Conditional GET of tickets and comments, validated by Ticket.version and Ticket.updated_at.
+"""
+
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def ticket_etag(pk, version, kind='ticket'):
+    """
+    Strong ETag of a single ticket ('ticket'), of its comment list ('comments') or of a comment ('comment').
+    """
+    return quote_etag(f'{kind}-{pk}-v{version}')
+
+
+def page_etag(page, kind='tickets'):
+    """
+    Strong ETag of one page of a keyset-paginated list (a KeysetPage of tickets or of dicts with 'id' and
+    'version'): the ids and versions of its rows and the cursors to its neighbours determine its content.
+    """
+    versions = [(row['id'], row['version']) if isinstance(row, dict) else (row.id, row.version) for row in page.rows]
+    digest = hashlib.sha1(repr((versions, page.next_cursor, page.previous_cursor)).encode()).hexdigest()
+    return quote_etag(f'{kind}-{digest}')
+
+
+def _timestamp(value):
+    return timegm(value.utctimetuple()) if value is not None else None
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    # Responses depend on the user, so shared caches may not store them, and clients have to revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def is_conditional(request):
+    return any(header in request.META for header in
+               ['HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE'])
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Returns 304 Not Modified (412 for a failed If-Match) if the request's conditional headers allow it,
+    or None if the full response has to be built.
+    """
+    response = get_conditional_response(getattr(request, '_request', request), etag=etag,
+                                        last_modified=_timestamp(last_modified))
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,88 @@
+"""
+Live ticket counts per (status, priority) in TicketCounter, changed in the transaction that writes the tickets.
+'manage.py reconcile_ticket_counters' rebuilds them from the ticket table.
+"""
+
+from collections import Counter, OrderedDict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import ArchivedTicket, Ticket, TicketCounter
+
+STATUSES = [status for status, _ in Ticket.STATUS_CHOICES]
+PRIORITIES = [priority for priority, _ in Ticket.PRIORITY_CHOICES]
+
+
+def change_counters(deltas):
+    """
+    'deltas' maps (status, priority) -> change of the count, e.g. {('Active', 'Low'): -1, ('Approved', 'Low'): 1}.
+    """
+    with transaction.atomic(savepoint=False):
+        for (status, priority), delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            counter = TicketCounter.objects.filter(status=status, priority=priority)
+            if not counter.update(count=F('count') + delta):
+                # The migration creates every row, a missing one only appears after a manual cleanup.
+                TicketCounter.objects.get_or_create(status=status, priority=priority)
+                counter.update(count=F('count') + delta)
+
+
+def move_counters(old, new, amount=1):
+    """
+    Moves 'amount' tickets from (status, priority) 'old' to 'new'.
+    """
+    if old != new:
+        change_counters({old: -amount, new: amount})
+
+
+def get_counters():
+    """
+    Returns {status: {priority: count, ..., 'total': count}, ..., 'total': count} from the 18 counter rows.
+    """
+    counts = dict(((status, priority), count) for status, priority, count in
+                  TicketCounter.objects.values_list('status', 'priority', 'count'))
+
+    result = OrderedDict()
+    for status in STATUSES:
+        by_priority = OrderedDict((priority, counts.get((status, priority), 0)) for priority in PRIORITIES)
+        by_priority['total'] = sum(by_priority.values())
+        result[status] = by_priority
+    result['total'] = sum(by_priority['total'] for by_priority in result.values())
+    return result
+
+
+def count_tickets():
+    """
+    The real counts, from one "SELECT status, priority, COUNT(*) ... GROUP BY status, priority" over the ticket
+    table and one over the archive.
+    """
+    counts = Counter()
+    for model in [Ticket, ArchivedTicket]:
+        rows = model.objects.order_by().values('status', 'priority').annotate(count=Count('id'))
+        counts.update({(row['status'], row['priority']): row['count'] for row in rows})
+    return counts
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Compares the counters with the ticket table and, unless 'dry_run', overwrites the ones that drifted.
+    Returns [(status, priority, stored count, real count), ...] for every counter that drifted.
+    """
+    with transaction.atomic():
+        # Locking the counters first makes concurrent ticket writes wait until the rebuilt counts are committed,
+        # their own increments then apply on top of them instead of being overwritten.
+        stored = Counter({(status, priority): count for status, priority, count in
+                          TicketCounter.objects.select_for_update().values_list('status', 'priority', 'count')})
+        actual = count_tickets()
+
+        drift = []
+        for key in sorted(set(stored) | set(actual) | {(s, p) for s in STATUSES for p in PRIORITIES}):
+            if stored[key] != actual[key]:
+                drift.append((*key, stored[key], actual[key]))
+
+        if not dry_run:
+            for status, priority, _, count in drift:
+                TicketCounter.objects.update_or_create(status=status, priority=priority, defaults={'count': count})
+    return drift
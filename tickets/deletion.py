@@ -0,0 +1,145 @@
+"""
+Fast deletes of tickets and users: the related rows go in chunks, one transaction per chunk, without loading
+them into Python or sending their signals.
+
+EXMP manage.py purge_user alice
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from comments.models import ArchivedComment, Comment
+from .caching import tickets_changed
+from .counters import change_counters
+from .models import ArchivedTicket, Ticket, TicketEvent
+from .search import forget_sqlite_search_documents
+
+DELETE_CHUNK_SIZE = 1000
+
+
+def get_chunk_size(chunk_size=None):
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'HELPDESK_DELETE_CHUNK_SIZE', DELETE_CHUNK_SIZE)
+    return chunk_size
+
+
+def raw_delete(queryset):
+    """
+    One plain DELETE of 'queryset': no signals, no cascade collection. Returns the number of deleted rows.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_chunk(queryset, chunk_size):
+    """
+    Deletes up to 'chunk_size' rows of 'queryset' in one statement: "DELETE ... WHERE id IN (SELECT id ... LIMIT n)".
+    Returns the number of deleted rows.
+    """
+    return raw_delete(queryset.model._base_manager.using(queryset.db).filter(
+        pk__in=queryset.order_by().values('pk')[:chunk_size]))
+
+
+def delete_in_chunks(queryset, chunk_size=None):
+    """
+    Deletes 'queryset', at most 'chunk_size' rows per statement and transaction. Returns the number of deleted rows.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    total = 0
+    while True:
+        deleted = delete_chunk(queryset, chunk_size)
+        total += deleted
+        if deleted < chunk_size:
+            return total
+
+
+def _delete_counted(queryset, deleted, related=()):
+    """
+    Deletes the ArchivedTickets of 'queryset' and takes them out of TicketCounter, in the caller's transaction.
+    The tickets are locked first, then the 'related' querysets are deleted.
+    """
+    rows = Counter(queryset.select_for_update().values_list('status', 'priority'))
+    for related_queryset in related:
+        deleted[related_queryset.model._meta.label] += raw_delete(related_queryset)
+    deleted[queryset.model._meta.label] += raw_delete(queryset)
+    change_counters({key: -count for key, count in rows.items()})
+
+
+def _delete_ticket_batch(ids, chunk_size, deleted):
+    using = router.db_for_write(Ticket)
+    forget_sqlite_search_documents(connections[using], ids)
+    tickets = Ticket.objects.filter(pk__in=ids)
+    related = [Comment.objects.filter(ticket_id__in=ids), TicketEvent.objects.filter(ticket_id__in=ids)]
+    while True:
+        # One transaction per chunk. Locking the tickets keeps new comments and events out (their foreign key
+        # checks wait for the lock), so once a chunk comes back short the tickets go in the same transaction.
+        with transaction.atomic(using=using):
+            rows = list(tickets.select_for_update().values_list('status', 'priority', 'ticket_user_id'))
+            done = True
+            for queryset in related:
+                count = delete_chunk(queryset, chunk_size)
+                deleted[queryset.model._meta.label] += count
+                done = done and count < chunk_size
+            if done:
+                deleted[Ticket._meta.label] += raw_delete(tickets)
+                counted = Counter((status, priority) for status, priority, _ in rows)
+                change_counters({key: -count for key, count in counted.items()})
+                if rows:
+                    tickets_changed(*{owner_id for _, _, owner_id in rows})
+                return
+
+
+def delete_tickets(ids, chunk_size=None):
+    """
+    Deletes the tickets 'ids' with their comments and events. Returns {model label: deleted rows},
+    like 'QuerySet.delete()'.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    ids = list(ids)
+    deleted = Counter()
+    for start in range(0, len(ids), chunk_size):
+        _delete_ticket_batch(ids[start:start + chunk_size], chunk_size, deleted)
+    return dict(deleted)
+
+
+def delete_user(user, chunk_size=None):
+    """
+    Deletes 'user' with their tickets, comments and archived tickets. Returns {model label: deleted rows}.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    deleted = Counter()
+
+    tickets = Ticket.objects.filter(ticket_user=user).order_by('pk').values_list('pk', flat=True)
+    while ids := list(tickets[:chunk_size]):
+        _delete_ticket_batch(ids, chunk_size, deleted)
+
+    # Their comments on the tickets of other users: each chunk gives those tickets a new version.
+    comments = Comment.objects.filter(comment_user=user).order_by()
+    while True:
+        with transaction.atomic():
+            rows = list(comments.values_list('pk', 'ticket_id')[:chunk_size])
+            if rows:
+                deleted[Comment._meta.label] += raw_delete(Comment.objects.filter(pk__in=[pk for pk, _ in rows]))
+                Ticket.objects.filter(pk__in={ticket_id for _, ticket_id in rows}).bump()
+                tickets_changed()
+        if len(rows) < chunk_size:
+            break
+    deleted[TicketEvent._meta.label] += delete_in_chunks(TicketEvent.objects.filter(ticket_user=user), chunk_size)
+
+    # Archived tickets are read-only, their comments go without a new version.
+    deleted[ArchivedComment._meta.label] += delete_in_chunks(
+        ArchivedComment.objects.filter(ticket__ticket_user=user), chunk_size)
+    deleted[ArchivedComment._meta.label] += delete_in_chunks(
+        ArchivedComment.objects.filter(comment_user=user), chunk_size)
+    archived = ArchivedTicket.objects.filter(ticket_user=user).order_by('pk').values_list('pk', flat=True)
+    while ids := list(archived[:chunk_size]):
+        with transaction.atomic():
+            _delete_counted(ArchivedTicket.objects.filter(pk__in=ids), deleted,
+                            related=[ArchivedComment.objects.filter(ticket_id__in=ids)])
+            tickets_changed(user.pk)
+
+    # What is left (the token, group and permission links, admin log entries) is small: the collector takes it.
+    _, rest = user.delete()
+    deleted.update(rest)
+    return dict(deleted)
@@ -1,34 +1,198 @@
 """ DJANGO REST VIEWS """
 
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from tickets.serializers import TicketSerializer
-from .models import Ticket
+from tickets.serializers import TicketSerializer, TicketSearchSerializer, TicketDeclineSerializer, \
+    TicketBulkTransitionSerializer, ArchivedTicketSerializer
+from .caching import tickets_changed, TicketCacheEntry
+from .concurrency import if_match_version, save_ticket_edit
+from .conditional import ticket_etag, page_etag, is_conditional, not_modified, set_validators
+from .counters import change_counters, get_counters
+from .deletion import delete_tickets
+from .events import record_status_events
+from .export import iter_export, EXPORT_FORMATS, CONTENT_TYPES
+from .archive import include_archived
+from .models import ArchivedTicket, Ticket
+from .pagination import TicketCursorPagination, KEYSET_FIELDS
+from .parsers import NDJSONParser
 from .permissions import HelpdeskPermissions
+from .queue import claim_next_ticket, release_ticket
+from .search import TicketFullTextSearchFilter
+from .sparse import get_sparse_fields, only_fields, ValuesSerializer
+from .validators import validate_ticket_row, BULK_CREATE_LIMIT, BULK_CREATE_BATCH_SIZE
+from .transitions import apply_transition, apply_bulk_transition, TRANSITIONS, BULK_TRANSITION_LIMIT, \
+    APPLIED, NOT_FOUND, NOT_OWNER, WRONG_STATUS
 
 
 class TicketViewSet(viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = [HelpdeskPermissions]
+    pagination_class = TicketCursorPagination  # ordered by (created_date, id), newest first
+    filter_backends = [TicketFullTextSearchFilter]  # EXMP /?search=printer -> best matches first
+    read_from_replica = True  # GET/HEAD/OPTIONS, see helpdesk/replicas.py
 
     def get_queryset(self):
-        if self.request.user.is_staff:
-            queryset = Ticket.objects.all()
-        else:
-            queryset = Ticket.objects.filter(ticket_user=self.request.user)
+        queryset = Ticket.objects.visible_to(self.request.user).filtered(
+            priority=self.request.query_params.get('priority'),  # EXMP /?priority=Low
+            status=self.request.query_params.get('status'),  # EXMP /?status=InRestoration
+        )
+        if self.action == 'retrieve':
+            # The permission check needs the owner, the validators the version.
+            return only_fields(queryset, TicketSerializer, self.sparse_fields, 'id', 'ticket_user', 'version',
+                               'updated_at')
+        if self.action == 'list' and TicketFullTextSearchFilter().get_search_terms(self.request):
+            return only_fields(queryset, TicketSerializer, self.sparse_fields, 'id')
+        return queryset
 
-        priority = self.request.query_params.get('priority')  # EXMP /?priority=Low
-        status = self.request.query_params.get('status')  # EXMP /?status=InRestoration
+    @property
+    def sparse_fields(self):
+        """
+        The ?fields= of the list and retrieve actions (tickets/sparse.py), None for every field.
+        EXMP /?fields=id,topic,status
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = get_sparse_fields(self.request.query_params, TicketSearchSerializer,
+                                                    ArchivedTicketSerializer)
+        return self._sparse_fields
 
-        if priority:
-            queryset = queryset.filter(priority=priority).distinct()
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.sparse_fields
+        return context
 
-        if status:
-            queryset = queryset.filter(status=status).distinct()
+    def get_archived_queryset(self):
+        """
+        The archived tickets merged into the list with ?include_archived=true (tickets/archive.py), None otherwise.
+        """
+        if self.action != 'list' or not include_archived(self.request.query_params):
+            return None
+        return ArchivedTicket.objects.visible_to(self.request.user).filtered(
+            priority=self.request.query_params.get('priority'),
+            status=self.request.query_params.get('status'),
+        )
 
-        return queryset
+    def get_archived_object(self, pk):
+        try:
+            return ArchivedTicket.objects.visible_to(self.request.user).filter(pk=pk).first()
+        except (TypeError, ValueError):
+            return None
+
+    def get_serializer_class(self):
+        if self.action == 'list' and TicketFullTextSearchFilter().get_search_terms(self.request):
+            return TicketSearchSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        # Search results are ranked, not keyset-paginated, and are neither validated nor cached.
+        if TicketFullTextSearchFilter().get_search_terms(request):
+            return super().list(request, *args, **kwargs)
+
+        # The page of this user (or of any staff member) and URL, as long as no ticket of theirs changed
+        # (tickets/caching.py).
+        entry = TicketCacheEntry('ticket-list', request.user, request.build_absolute_uri())
+        cached = entry.get()
+        if cached is None:
+            if 'HTTP_IF_NONE_MATCH' in request.META:
+                validators = self.paginator.paginate_validators(self.get_queryset(), request, view=self)
+                response = not_modified(request, page_etag(validators))
+                if response is not None:
+                    return response
+            cached = self.get_page(request)
+            entry.set(cached)
+
+        data, etag = cached
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        return set_validators(Response(data), etag)
+
+    def get_page(self, request):
+        """
+        (response data, ETag) of the requested page of the list.
+        """
+        # The rows go from '.values()' straight to dicts, without TicketSerializer (tickets/sparse.py).
+        serializer = ValuesSerializer(TicketSerializer, self.sparse_fields)
+        archived_serializer = ValuesSerializer(ArchivedTicketSerializer, self.sparse_fields)
+        archived = self.get_archived_queryset()
+        if archived is not None:
+            archived = archived.annotate(archived=Value(True, output_field=BooleanField())).values(
+                *archived_serializer.columns(*KEYSET_FIELDS, 'archived'))
+
+        rows = self.paginator.paginate_values(self.get_queryset().values(*serializer.columns(*KEYSET_FIELDS)),
+                                              request, archived=archived)
+        data = [(archived_serializer if row.get('archived') else serializer).to_representation(row) for row in rows]
+        return self.paginator.get_paginated_response(data).data, page_etag(self.paginator.page)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        EXMP GET /tickets/rest/7/ -> the archived copy of ticket 7 (with "archived": true) once it was archived.
+        """
+        # Like the list: cached per user or staff until one of their tickets changes (tickets/caching.py).
+        entry = TicketCacheEntry('ticket-detail', request.user, request.build_absolute_uri())
+        cached = entry.get()
+        if cached is None:
+            if is_conditional(request):
+                try:
+                    validators = self.get_queryset().filter(pk=kwargs['pk']).values_list('version', 'updated_at') \
+                        .first()
+                except (TypeError, ValueError):
+                    validators = None  # not an id, get_object answers with 404
+                if validators is not None:
+                    response = not_modified(request, ticket_etag(kwargs['pk'], validators[0]), validators[1])
+                    if response is not None:
+                        return response
+            cached = self.get_ticket(kwargs['pk'])
+            entry.set(cached)
+
+        data, etag, updated_at = cached
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+        return set_validators(Response(data), etag, updated_at)
+
+    def get_ticket(self, pk):
+        """
+        (response data, ETag, updated_at) of ticket 'pk' or of its archived copy.
+        """
+        try:
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+        except Http404:
+            # Archived tickets are not looked up before the ticket table misses, they are the rare case.
+            instance = self.get_archived_object(pk)
+            if instance is None:
+                raise
+            serializer = ArchivedTicketSerializer(instance, context=self.get_serializer_context())
+        return serializer.data, ticket_etag(instance.pk, instance.version), instance.updated_at
+
+    def update(self, request, *args, **kwargs):
+        """
+        EXMP PATCH /tickets/rest/7/ with 'If-Match: "ticket-7-v3"' (the ETag of the ticket) -> 412 if it changed since.
+        Without If-Match the edit is checked against the version read at the start of this request, and 409
+        answers a change that landed in between.
+        """
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+
+        version = if_match_version(request, 'ticket', instance.pk)
+        if not save_ticket_edit(instance, instance.version if version is None else version,
+                                **serializer.validated_data):
+            return Response({"message": "The ticket was changed by someone else, reload it and try again."},
+                            status=status.HTTP_409_CONFLICT if version is None else status.HTTP_412_PRECONDITION_FAILED)
+
+        return set_validators(Response(self.get_serializer(instance).data), ticket_etag(instance.pk, instance.version),
+                              instance.updated_at)
 
     def create(self, request, *args, **kwargs):
         request.data['ticket_user'] = request.user.id
@@ -37,16 +201,92 @@ class TicketViewSet(viewsets.ModelViewSet):
         serializer.save(status='Active')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def perform_destroy(self, instance):
+        # Comments and events go in bounded chunks instead of through the deletion collector (tickets/deletion.py).
+        delete_tickets([instance.pk])
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Streams every visible ticket (with the same ?priority= and ?status= filters as the list) and its comments.
+        EXMP /tickets/rest/export/?type=csv (default: ?type=ndjson)
+        """
+        export_format = request.query_params.get('type', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"message": f"Unknown export type, expected one of: {', '.join(EXPORT_FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(iter_export(self.get_queryset(), export_format),
+                                         content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="tickets.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Creates many tickets in one request, for automated reporters.
+        EXMP POST /tickets/rest/bulk/ [{"topic": "Disk full", "description": "...", "priority": "High"}, ...]
+        The same rows can be sent one per line with 'Content-Type: application/x-ndjson'.
+        Invalid rows are reported by their index and do not prevent the valid ones from being created.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"message": "Expected a non-empty list of tickets."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > BULK_CREATE_LIMIT:
+            return Response({"message": f"At most {BULK_CREATE_LIMIT} tickets can be created at once."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        tickets = []
+        errors = []
+        for index, row in enumerate(rows):
+            cleaned_data, row_errors = validate_ticket_row(row)
+            if row_errors:
+                errors.append({"row": index, "errors": row_errors})
+            else:
+                tickets.append(Ticket(ticket_user=request.user, status='Active', **cleaned_data))
+
+        with transaction.atomic():
+            tickets = Ticket.objects.bulk_create(tickets, batch_size=BULK_CREATE_BATCH_SIZE)
+            change_counters(Counter((ticket.status, ticket.priority) for ticket in tickets))
+            record_status_events([(ticket.pk, ticket.ticket_user_id, ticket.status) for ticket in tickets])
+            if tickets:
+                tickets_changed(request.user.pk)
+        return Response({
+            "created": len(tickets),
+            "ids": [ticket.pk for ticket in tickets],
+            "errors": errors,
+        }, status=status.HTTP_201_CREATED if tickets else status.HTTP_400_BAD_REQUEST)
+
+
+def transition_error_response(name, outcome):
+    if outcome == NOT_FOUND:
+        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
+    if outcome == NOT_OWNER:
+        return Response({"message": "You don't have access to restore a request."}, status=status.HTTP_403_FORBIDDEN)
+    return Response({"message": TRANSITIONS[name].message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def transition_response(request, pk, name):
+    """
+    Applies transition 'name' and answers with the updated ticket, or with the reason it was not applied.
+    """
+    outcome = apply_transition(pk, name, request.user)
+    if outcome != APPLIED:
+        return transition_error_response(name, outcome)
+
+    serializer = TicketSerializer(Ticket.objects.get(pk=pk))
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 @api_view(['GET', 'POST'])
 @permission_classes([HelpdeskPermissions])
 def ticket_decline_view(request, pk):
-    try:
-        ticket = Ticket.objects.get(pk=pk)
-    except Ticket.DoesNotExist:
-        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
-
     if request.method == 'GET':
+        try:
+            ticket = Ticket.objects.get(pk=pk)
+        except Ticket.DoesNotExist:
+            return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
+
         if ticket.status != 'Active' and ticket.status != 'InRestoration':
             return Response({"message": "You cannot decline a request in this status."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -55,19 +295,17 @@ def ticket_decline_view(request, pk):
 
     elif request.method == 'POST':
         if request.user.is_staff:
-            if ticket.status != 'Active' and ticket.status != 'InRestoration':
-                return Response({"message": "You cannot decline a request in this status."}, status=status.HTTP_400_BAD_REQUEST)
-
-            serializer = TicketSerializer(ticket, data=request.data, partial=True)
-
-            if serializer.is_valid():
-                if 'decline_reason' not in request.data:
-                    return Response({"message": "Decline reason is required."}, status=status.HTTP_400_BAD_REQUEST)
+            if 'decline_reason' not in request.data:
+                return Response({"message": "Decline reason is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-                serializer.save(status='Declined', restore_request=False)
-                return Response({"message": "Ticket declined successfully."}, status=status.HTTP_200_OK)
-            else:
+            serializer = TicketDeclineSerializer(data=request.data)
+            if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            outcome = apply_transition(pk, 'decline', **serializer.validated_data)
+            if outcome != APPLIED:
+                return transition_error_response('decline', outcome)
+            return Response({"message": "Ticket declined successfully."}, status=status.HTTP_200_OK)
         else:
             return Response({"message": "You don't have access to decline a request."}, status=status.HTTP_403_FORBIDDEN)
 
@@ -75,91 +313,118 @@ def ticket_decline_view(request, pk):
 @api_view(['GET'])
 @permission_classes([HelpdeskPermissions])
 def ticket_approve_view(request, pk):
-    try:
-        ticket = Ticket.objects.get(pk=pk)
-    except Ticket.DoesNotExist:
-        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    if request.method == 'GET':
-        if request.user.is_staff:
-            if ticket.status == 'InRestoration' or ticket.status == 'Active':
-                ticket.status = 'Approved'
-                ticket.restore_request = False
-                ticket.save()
-                serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response({"message": "You cannot approve a request in this status."},
-                                status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response({"message": "You don't have access to approve a request."}, status=status.HTTP_403_FORBIDDEN)
+    if request.user.is_staff:
+        return transition_response(request, pk, 'approve')
+    return Response({"message": "You don't have access to approve a request."}, status=status.HTTP_403_FORBIDDEN)
 
 
 @api_view(['GET'])
 @permission_classes([HelpdeskPermissions])
 def ticket_restore_view(request, pk):
-    try:
-        ticket = Ticket.objects.get(pk=pk)
-    except Ticket.DoesNotExist:
-        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    if request.method == 'GET':
-        if request.user == ticket.ticket_user:
-            if ticket.status == 'Declined':
-                ticket.status = 'InRestoration'
-                ticket.restore_request = True
-                ticket.save()
-                serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response({"message": "You cannot restore a request in this status."},
-                                status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response({"message": "You don't have access to restore a request."},
-                            status=status.HTTP_403_FORBIDDEN)
+    return transition_response(request, pk, 'restore')
 
 
 @api_view(['GET'])
 @permission_classes([HelpdeskPermissions])
 def ticket_in_process_view(request, pk):
-    try:
-        ticket = Ticket.objects.get(pk=pk)
-    except Ticket.DoesNotExist:
-        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    if request.method == 'GET':
-        if request.user.is_staff:
-            if ticket.status == 'Approved':
-                ticket.status = 'InProcess'
-                ticket.save()
-                serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response({"message": "You cannot move to InProcess a request in this status."},
-                                status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response({"message": "You don't have access to move to InProcess a request."},
-                            status=status.HTTP_403_FORBIDDEN)
+    if request.user.is_staff:
+        return transition_response(request, pk, 'in_process')
+    return Response({"message": "You don't have access to move to InProcess a request."},
+                    status=status.HTTP_403_FORBIDDEN)
 
 
 @api_view(['POST'])
 @permission_classes([HelpdeskPermissions])
 def ticket_done_view(request, pk):
-    try:
-        ticket = Ticket.objects.get(pk=pk)
-    except Ticket.DoesNotExist:
-        return Response({"message": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND)
+    if request.user.is_staff:
+        return transition_response(request, pk, 'done')
+    return Response({"message": "You don't have access to move to Done a request."},
+                    status=status.HTTP_403_FORBIDDEN)
 
-    if request.method == 'POST':
-        if request.user.is_staff:
-            if ticket.status == 'InProcess':
-                ticket.status = 'Done'
-                ticket.save()
-                serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response({"message": "You cannot move to Done a request in this status."},
-                                status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response({"message": "You don't have access to move to Done a request."},
-                            status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['POST'])
+@permission_classes([HelpdeskPermissions])
+def ticket_bulk_transition_view(request, name):
+    """
+    EXMP POST /tickets/api/bulk-approve-tickets/ {"ids": [1, 2, 3]}
+    EXMP POST /tickets/api/bulk-decline-tickets/ {"filter": {"status": "Active"}, "decline_reason": "..."}
+    """
+    if not request.user.is_staff:
+        return Response({"message": "You don't have access to change the status of requests."},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    serializer = TicketBulkTransitionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    values = {}
+    if name == 'decline':
+        decline_serializer = TicketDeclineSerializer(data=request.data)
+        if not decline_serializer.is_valid():
+            return Response(decline_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        values = decline_serializer.validated_data
+
+    ids = serializer.validated_data.get('ids')
+    if ids is not None:
+        queryset = Ticket.objects.filter(pk__in=ids)
+    else:
+        queryset = Ticket.objects.filter(**serializer.validated_data['filter']) \
+            .order_by('created_date', 'id')[:BULK_TRANSITION_LIMIT]
+
+    results = apply_bulk_transition(name, queryset, **values)
+    if ids is not None:
+        for pk in ids:
+            results.setdefault(pk, {'result': NOT_FOUND})
+
+    applied = sum(1 for result in results.values() if result['result'] == APPLIED)
+    return Response({
+        "applied": applied,
+        "skipped": len(results) - applied,
+        "results": results,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([HelpdeskPermissions])
+def ticket_counters_view(request):
+    """
+    Number of tickets per status and priority, read from the counter table instead of counting tickets.
+    EXMP GET /tickets/api/ticket-counters/
+    -> {"Active": {"Low": 3, "Medium": 1, "High": 0, "total": 4}, ..., "total": 9}
+    """
+    if not request.user.is_staff:
+        return Response({"message": "You don't have access to the ticket counters."},
+                        status=status.HTTP_403_FORBIDDEN)
+    return Response(get_counters(), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([HelpdeskPermissions])
+def ticket_claim_next_view(request):
+    """
+    Claims the next ticket of the work queue (tickets/queue.py) for the staff member and answers with it: its
+    'assignee' and 'claimed_until' say until when nobody else gets it.
+    EXMP POST /tickets/api/claim-next-ticket/
+    """
+    if not request.user.is_staff:
+        return Response({"message": "You don't have access to claim requests."}, status=status.HTTP_403_FORBIDDEN)
+
+    ticket = claim_next_ticket(request.user)
+    if ticket is None:
+        return Response({"message": "No tickets are waiting to be claimed."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(TicketSerializer(ticket).data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([HelpdeskPermissions])
+def ticket_release_view(request, pk):
+    """
+    Gives a claimed ticket back to the work queue before its claim lapses.
+    EXMP POST /tickets/api/release-ticket/12/
+    """
+    if not request.user.is_staff:
+        return Response({"message": "You don't have access to release requests."}, status=status.HTTP_403_FORBIDDEN)
+
+    if not release_ticket(pk, request.user):
+        return Response({"message": "You have not claimed this ticket."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"message": "Ticket released successfully."}, status=status.HTTP_200_OK)
@@ -1,24 +1,36 @@
 """ DJANGO VIEWS """
 
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 
-from .models import Ticket
-from .forms import TicketCreateForm, TicketUserUpdateForm, TicketDeclineForm
+from .models import ArchivedTicket, Ticket
+from .forms import TicketCreateForm, TicketUserUpdateForm, TicketDeclineForm, TicketBulkActionForm
 from .exceptions import IsNotActiveOrInRestorationTicketException, IsNotActiveTicketException, \
-    IsNotDeclinedTicketException, IsNotCreatorOfTicketException, IsNotApprovedTicketException, \
-    IsNotInProcessTicketException
-from .mixins import LoginRequiredMixin
+    IsNotCreatorOfTicketException
+from .concurrency import save_ticket_edit
+from .deletion import delete_tickets
+from .archive import include_archived
+from .cards import CARD_FIELDS
+from .loaders import get_ticket_or_404, get_ticket_or_archived_or_404
+from .mixins import KeysetListMixin, LoginRequiredMixin
+from .queue import claim_next_ticket
+from .search import search_tickets, SEARCH_RESULT_LIMIT
+from .transitions import apply_transition_or_raise, apply_bulk_transition, APPLIED
 
 
 # MAIN, IN-RESTORATION, DETAIL VIEWS
-class TicketsMainView(LoginRequiredMixin, ListView):
+class TicketsMainView(LoginRequiredMixin, KeysetListMixin, ListView):
     template_name = 'index.html'
+    # The lists may be read from a replica (helpdesk/replicas.py), and are cached (tickets/caching.py).
+    read_from_replica = True
+    cache_name = 'main_view'
     """
     context_object_name ->
     this attribute specifies the name of the variable in which the object
@@ -26,40 +38,63 @@ class TicketsMainView(LoginRequiredMixin, ListView):
     """
     context_object_name = 'tickets'
 
+    def get_tickets(self):
+        return Ticket.objects.visible_to(self.request.user).only(*CARD_FIELDS)
+
+    def get_archived_tickets(self):
+        if include_archived(self.request.GET):  # EXMP /?include_archived=true
+            return ArchivedTicket.objects.visible_to(self.request.user).only(*CARD_FIELDS)
+        return None
+
     def get_queryset(self):
-        if self.request.user.is_staff:
-            queryset = Ticket.objects.all()
-        else:
-            queryset = Ticket.objects.filter(ticket_user=self.request.user)
-        return queryset
+        search = self.request.GET.get('search', '').strip()  # EXMP /?search=printer
+        if search:
+            # The best matches only, ordered by rank: no pages.
+            return search_tickets(self.get_tickets(), search)[:SEARCH_RESULT_LIMIT]
+        return super().get_queryset()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_enabled'] = True
+        context['search'] = self.request.GET.get('search', '').strip()
+        context['include_archived'] = include_archived(self.request.GET)
+        return context
 
 
-class TicketsInRestorationListView(LoginRequiredMixin, ListView):
+class TicketsInRestorationListView(LoginRequiredMixin, KeysetListMixin, ListView):
     model = Ticket
     template_name = 'index.html'
     context_object_name = 'tickets'
+    read_from_replica = True
+    cache_name = 'restore_tickets_view'
+    tickets = Ticket.objects.filter(status='InRestoration').only(*CARD_FIELDS)
 
     @method_decorator(staff_member_required)
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
-    def get_queryset(self):
-        queryset = Ticket.objects.filter(status='InRestoration')
-        return queryset
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bulk_action_form'] = TicketBulkActionForm()
+        return context
 
 
-class TicketsActiveListView(LoginRequiredMixin, ListView):
+class TicketsActiveListView(LoginRequiredMixin, KeysetListMixin, ListView):
     model = Ticket
     template_name = 'index.html'
     context_object_name = 'tickets'
+    read_from_replica = True
+    cache_name = 'active_tickets_view'
+    tickets = Ticket.objects.filter(status='Active').only(*CARD_FIELDS)
 
     @method_decorator(staff_member_required)
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
-    def get_queryset(self):
-        queryset = Ticket.objects.filter(status='Active')
-        return queryset
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bulk_action_form'] = TicketBulkActionForm()
+        return context
 
 
 class TicketDetailView(LoginRequiredMixin, DetailView):
@@ -71,13 +106,9 @@ class TicketDetailView(LoginRequiredMixin, DetailView):
     # used to retrieve an object from a database.
     def get_object(self, queryset=None):
         # self.kwargs is a dictionary that contains the arguments passed to the URL.
-        ticket_id = self.kwargs.get('pk')
-        try:
-            ticket = self.model.objects.get(pk=ticket_id)
-        except Ticket.DoesNotExist:
-            raise Http404('The ticket you are trying to find does not exist.')
-
-        return ticket
+        # The request-scoped loader fetches the ticket (and its user) once, 'get' and 'super().get' both ask for it.
+        # An archived ticket (tickets/archive.py) is shown read-only, with its comments.
+        return get_ticket_or_archived_or_404(self.request, self.kwargs.get('pk'))
 
     # 'get' ->
     # processes an HTTP GET request and returns an HTTP response.
@@ -128,13 +159,8 @@ class TicketUserUpdateView(LoginRequiredMixin, UpdateView):
     form_class = TicketUserUpdateForm
 
     def get_object(self, queryset=None):
-        ticket_id = self.kwargs.get('pk')
-        try:
-            ticket = self.model.objects.get(pk=ticket_id)
-        except Ticket.DoesNotExist:
-            raise Http404('The ticket you are trying to find does not exist.')
-
-        return ticket
+        # The request-scoped loader fetches the ticket (and its user) once, 'get' and 'super().get' both ask for it.
+        return get_ticket_or_404(self.request, self.kwargs.get('pk'))
 
     def get(self, request, *args, **kwargs):
         ticket = self.get_object()
@@ -153,8 +179,18 @@ class TicketUserUpdateView(LoginRequiredMixin, UpdateView):
         form = super().get_form(form_class)
         form.initial['priority'] = self.object.priority
         form.initial['description'] = self.object.description
+        form.initial['version'] = self.object.version
         return form
 
+    def form_valid(self, form):
+        # Empty fields are left as they are. The write only succeeds if nobody changed the ticket
+        # since the form was rendered.
+        values = {field: form.cleaned_data[field] for field in ['description', 'priority'] if form.cleaned_data[field]}
+        if not save_ticket_edit(self.object, form.cleaned_data['version'], **values):
+            form.add_error(None, 'The request was changed in the meantime. Reload the page and try again.')
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
 
 # DELETE VIEW
 class TicketAdminDeleteView(LoginRequiredMixin, DeleteView):
@@ -174,26 +210,22 @@ class TicketAdminDeleteView(LoginRequiredMixin, DeleteView):
         except Ticket.DoesNotExist:
             raise Http404('The ticket you are trying to find does not exist.')
 
+    def form_valid(self, form):
+        # Comments and events go in bounded chunks instead of through the deletion collector (tickets/deletion.py).
+        delete_tickets([self.object.pk])
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self):
         return reverse('main_view')
 
 
 # RESTORE, APPROVE, DECLINE
+# The status changes go through 'apply_transition_or_raise' - one conditional UPDATE per transition.
 class TicketRestoreView(LoginRequiredMixin, View):
     model = Ticket
 
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
-        if request.user != ticket.ticket_user:
-            raise IsNotCreatorOfTicketException('You cannot restore request that you are not the creator of.')
-
-        if ticket.status == 'Declined':
-            ticket.status = 'InRestoration'
-            ticket.restore_request = True
-            ticket.save()
-        else:
-            raise IsNotDeclinedTicketException('You cannot restore a request in this status.')
-
+        apply_transition_or_raise(pk, 'restore', request.user)
         return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
 
 
@@ -208,22 +240,17 @@ class TicketDeclineView(LoginRequiredMixin, View):
             raise IsNotActiveOrInRestorationTicketException('You cannot decline a request in this status.')
 
         form = TicketDeclineForm()
-        return render(request, 'ticket_decline_view.html', {'form': form, 'ticket': ticket})
+        return render(request, self.template_name, {'form': form, 'ticket': ticket})
 
     @method_decorator([staff_member_required])
     def post(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
-
         form = TicketDeclineForm(request.POST)
         if form.is_valid():
-            ticket.decline_reason = form.cleaned_data['decline_reason']
-            ticket.status = 'Declined'
-            ticket.restore_request = False
-            ticket.save()
-
+            apply_transition_or_raise(pk, 'decline', decline_reason=form.cleaned_data['decline_reason'])
             return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
 
-        return render(request, 'ticket_decline_view', {'form': form, 'ticket': ticket})
+        ticket = get_object_or_404(Ticket, pk=pk)
+        return render(request, self.template_name, {'form': form, 'ticket': ticket})
 
 
 class TicketApproveView(LoginRequiredMixin, View):
@@ -231,14 +258,7 @@ class TicketApproveView(LoginRequiredMixin, View):
 
     @method_decorator([staff_member_required])
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
-        if ticket.status == 'InRestoration' or ticket.status == 'Active':
-            ticket.status = 'Approved'
-            ticket.restore_request = False
-            ticket.save()
-        else:
-            raise IsNotActiveOrInRestorationTicketException('You cannot approve a request in this status.')
-
+        apply_transition_or_raise(pk, 'approve')
         return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
 
 
@@ -248,13 +268,7 @@ class TicketInProcessView(LoginRequiredMixin, View):
 
     @method_decorator([staff_member_required])
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
-        if ticket.status == 'Approved':
-            ticket.status = 'InProcess'
-            ticket.save()
-        else:
-            raise IsNotApprovedTicketException('You cannot move to InProcess a request in this status.')
-
+        apply_transition_or_raise(pk, 'in_process')
         return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
 
 
@@ -263,11 +277,51 @@ class TicketDoneView(LoginRequiredMixin, View):
 
     @method_decorator([staff_member_required])
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
-        if ticket.status == 'InProcess':
-            ticket.status = 'Done'
-            ticket.save()
+        apply_transition_or_raise(pk, 'done')
+        return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
+
+
+# BULK APPROVE / DECLINE
+class TicketBulkActionView(LoginRequiredMixin, View):
+    """
+    Receives the checkbox form of the "Active" and "InRestoration" lists and applies the chosen
+    transition to all selected tickets with one UPDATE (the same path as the bulk REST endpoints).
+    """
+    @method_decorator([staff_member_required])
+    def post(self, request):
+        form = TicketBulkActionForm(request.POST)
+        if form.is_valid():
+            action = form.cleaned_data['action']
+            values = {'decline_reason': form.cleaned_data['decline_reason']} if action == 'decline' else {}
+            results = apply_bulk_transition(action, Ticket.objects.filter(pk__in=form.cleaned_data['ids']), **values)
+
+            applied = sum(1 for result in results.values() if result['result'] == APPLIED)
+            skipped = len(form.cleaned_data['ids']) - applied
+            messages.success(request, f'{applied} request(s) changed, {skipped} skipped because of their status.')
         else:
-            raise IsNotInProcessTicketException('You cannot move to Done a request in this status.')
+            for errors in form.errors.values():
+                for error in errors:
+                    messages.error(request, error)
 
-        return HttpResponseRedirect(reverse('ticket_detail_view', args=[pk]))
+        url = request.POST.get('next')
+        if not url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+            url = reverse('active_tickets_view')
+        return HttpResponseRedirect(url)
+
+
+class TicketClaimNextView(LoginRequiredMixin, View):
+    """
+    "Claim next request" of the staff lists: takes the next ticket of the work queue (tickets/queue.py) and opens it,
+    or goes back to the list when no ticket is waiting.
+    """
+    @method_decorator([staff_member_required])
+    def post(self, request):
+        ticket = claim_next_ticket(request.user)
+        if ticket is not None:
+            return HttpResponseRedirect(reverse('ticket_detail_view', args=[ticket.pk]))
+
+        messages.info(request, 'No requests are waiting, or other staff members are working on all of them.')
+        url = request.POST.get('next')
+        if not url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+            url = reverse('active_tickets_view')
+        return HttpResponseRedirect(url)
@@ -0,0 +1,206 @@
+"""
+Event stream of ticket changes for the Server-Sent Events endpoint (tickets/async_views.py). One EventBroadcaster
+per process polls TicketEvent and hands new events to the connected streams.
+"""
+
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import TicketEvent
+from .webhooks import queue_webhooks
+
+EVENTS_POLL_INTERVAL = 1
+EVENTS_HEARTBEAT = 15
+EVENTS_STREAM_TIMEOUT = 300
+EVENTS_RETENTION = 7
+
+# Ids become visible when their transaction commits, so a smaller id can show up after a larger one: seconds a
+# skipped id is still asked for. Events may arrive out of order, a resumed client may get one twice.
+EVENT_GAP_TIMEOUT = 10
+# Events read per poll, and events replayed to a resuming client at most (more -> 'reset', reload everything).
+EVENT_BATCH_SIZE = 500
+EVENT_REPLAY_LIMIT = 1000
+# A stream that falls this far behind is dropped, its client reconnects and replays from the table.
+EVENT_QUEUE_SIZE = 1000
+
+
+def record_status_events(rows):
+    """
+    Records that the tickets in 'rows', (ticket_id, ticket_user_id, status) tuples, were created or moved to 'status'.
+    """
+    events = TicketEvent.objects.bulk_create([
+        TicketEvent(ticket_id=ticket_id, ticket_user_id=ticket_user_id, kind=TicketEvent.STATUS, status=status)
+        for ticket_id, ticket_user_id, status in rows
+    ])
+    queue_webhooks(events)
+
+
+def record_comment_event(comment, ticket_user_id):
+    event = TicketEvent.objects.create(ticket_id=comment.ticket_id, ticket_user_id=ticket_user_id,
+                                       kind=TicketEvent.COMMENT, comment_id=comment.pk)
+    queue_webhooks([event])
+
+
+def format_event(event):
+    """
+    The Server-Sent Events message of 'event'.
+    """
+    data = {'ticket': event.ticket_id}
+    if event.kind == TicketEvent.STATUS:
+        data['status'] = event.status
+    else:
+        data['comment'] = event.comment_id
+    return f'id: {event.pk}\nevent: {event.kind}\ndata: {json.dumps(data)}\n\n'
+
+
+async def latest_event_id():
+    return await TicketEvent.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+class EventBroadcaster:
+    """
+    Fans the new TicketEvents out to the subscribed streams, one query per poll interval while any is subscribed.
+    Runs on the event loop of the ASGI server. Every subscriber gets every event and filters by visibility itself.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = 0
+        # Skipped ids that may still commit -> when to stop waiting for them (time.monotonic()).
+        self.gaps = {}
+        self.task = None
+
+    @property
+    def poll_interval(self):
+        return getattr(settings, 'HELPDESK_EVENTS_POLL_INTERVAL', EVENTS_POLL_INTERVAL)
+
+    async def subscribe(self):
+        """
+        Returns a new queue and the id after which it receives events (skipped ids may come later, see above).
+        """
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            last_id = await latest_event_id()
+            # Another stream may have started the task while this one waited for the query.
+            if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+                self.subscribers, self.last_id, self.gaps = set(), last_id, {}
+                self.task = asyncio.get_running_loop().create_task(self.poll())
+
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue, self.last_id
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            now = time.monotonic()
+            self.gaps = {pk: deadline for pk, deadline in self.gaps.items() if deadline > now}
+
+            try:
+                events = [event async for event in TicketEvent.objects.filter(
+                    Q(id__gt=self.last_id) | Q(id__in=list(self.gaps))
+                ).order_by('id')[:EVENT_BATCH_SIZE]]
+            except Exception:
+                # The streams end and their clients reconnect, the next subscriber starts a new task.
+                for queue in list(self.subscribers):
+                    self.drop(queue)
+                raise
+
+            # From here on nothing is awaited, a stream subscribing meanwhile sees 'last_id' and the queues agree.
+            for event in events:
+                if event.pk in self.gaps:
+                    del self.gaps[event.pk]
+                else:
+                    for pk in range(max(self.last_id + 1, event.pk - EVENT_BATCH_SIZE), event.pk):
+                        self.gaps[pk] = now + EVENT_GAP_TIMEOUT
+                    self.last_id = event.pk
+                self.publish(event)
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.drop(queue)
+
+    def drop(self, queue):
+        # The stream ends when it reaches the None, its client reconnects and replays from the table.
+        self.subscribers.discard(queue)
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+broadcaster = EventBroadcaster()
+
+
+class EventStream:
+    """
+    The Server-Sent Events of the tickets 'user' can see, the content of a StreamingHttpResponse. Replays the events
+    after 'last_event_id' first if it is given. Ends after HELPDESK_EVENTS_STREAM_TIMEOUT.
+    Django calls 'close' when the response is done with, so the stream unsubscribes then rather than when the
+    garbage collector finalizes the generator.
+    """
+
+    def __init__(self, user, last_event_id=None):
+        self.user = user
+        self.last_event_id = last_event_id
+        self.queue = None
+        self.loop = None
+
+    def __aiter__(self):
+        return self.stream()
+
+    def close(self):
+        # Also called from a thread (sync_to_async), the broadcaster belongs to the event loop.
+        queue, self.queue = self.queue, None
+        if queue is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(broadcaster.unsubscribe, queue)
+
+    async def stream(self):
+        heartbeat = getattr(settings, 'HELPDESK_EVENTS_HEARTBEAT', EVENTS_HEARTBEAT)
+        deadline = time.monotonic() + getattr(settings, 'HELPDESK_EVENTS_STREAM_TIMEOUT', EVENTS_STREAM_TIMEOUT)
+
+        # Subscribe before reading the table, so nothing committed in between is lost.
+        self.queue, position = await broadcaster.subscribe()
+        self.loop = asyncio.get_running_loop()
+        queue = self.queue
+        try:
+            # Reconnect quickly after the stream timeout.
+            yield 'retry: 1000\n\n'
+
+            replayed = set()
+            if self.last_event_id is not None and self.last_event_id < position:
+                events = TicketEvent.objects.visible_to(self.user).filter(id__gt=self.last_event_id, id__lte=position)
+                async for event in events.order_by('id')[:EVENT_REPLAY_LIMIT + 1]:
+                    if len(replayed) == EVENT_REPLAY_LIMIT:
+                        # Too much was missed, the client reloads the lists and starts over from here.
+                        yield f'id: {position}\nevent: reset\ndata: {{}}\n\n'
+                        break
+                    replayed.add(event.pk)
+                    yield format_event(event)
+
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(heartbeat, timeout))
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                if event.pk not in replayed and event.is_visible_to(self.user):
+                    yield format_event(event)
+        finally:
+            self.close()
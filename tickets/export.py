@@ -0,0 +1,78 @@
+"""
+Streaming export of tickets with their comment threads, one chunk of tickets and their comments at a time.
+"""
+
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from comments.models import Comment
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ['ndjson', 'csv']
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+TICKET_FIELDS = ['id', 'ticket_user_id', 'priority', 'topic', 'description', 'status', 'created_date',
+                 'decline_reason', 'restore_request']
+COMMENT_FIELDS = ['id', 'comment_user_id', 'text', 'created_date']
+
+
+def iter_tickets_with_comments(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields (ticket, comments) pairs as plain dicts, tickets ordered by id and comments by creation date.
+    """
+    tickets = queryset.order_by('id').values(*TICKET_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(tickets, chunk_size))
+        if not chunk:
+            return
+
+        comments = defaultdict(list)
+        comment_rows = Comment.objects.filter(ticket_id__in=[ticket['id'] for ticket in chunk]) \
+            .order_by('ticket_id', 'created_date', 'id').values('ticket_id', *COMMENT_FIELDS)
+        for comment in comment_rows:
+            comments[comment.pop('ticket_id')].append(comment)
+
+        for ticket in chunk:
+            yield ticket, comments.get(ticket['id'], [])
+
+
+def iter_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # One line per ticket: {...ticket fields, "comments": [...]}
+    for ticket, comments in iter_tickets_with_comments(queryset, chunk_size):
+        ticket['comments'] = comments
+        yield json.dumps(ticket, cls=DjangoJSONEncoder) + '\n'
+
+
+class Echo:
+    """
+    File-like object for 'csv.writer' that returns the line instead of buffering it.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # One line per comment, repeating the ticket columns; a ticket without comments gets one line of its own.
+    writer = csv.writer(Echo())
+    yield writer.writerow(TICKET_FIELDS + [f'comment_{field}' for field in COMMENT_FIELDS])
+
+    empty_comment = [''] * len(COMMENT_FIELDS)
+    for ticket, comments in iter_tickets_with_comments(queryset, chunk_size):
+        ticket_columns = [ticket[field] for field in TICKET_FIELDS]
+        if not comments:
+            yield writer.writerow(ticket_columns + empty_comment)
+        for comment in comments:
+            yield writer.writerow(ticket_columns + [comment[field] for field in COMMENT_FIELDS])
+
+
+def iter_export(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    if export_format == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Ticket
+from .transitions import BULK_TRANSITION_LIMIT
 # from django.contrib.auth import authenticate
 # from django.core.exceptions import ValidationError
 # from .models import UM
@@ -52,6 +53,8 @@ class TicketUserUpdateForm(forms.ModelForm):
         }
     ))
     priority = forms.ChoiceField(choices=PRIORITY_CHOICES, required=False, widget=forms.Select(attrs=FORM_CONTROL_ATTRS))
+    # Version of the ticket the form was rendered from, see tickets/concurrency.py.
+    version = forms.IntegerField(widget=forms.HiddenInput)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -75,4 +78,45 @@ class TicketDeclineForm(forms.ModelForm):
             'placeholder': 'Please enter decline reason',
             'id': 'id_decline_reason'
         }
-    ))
\ No newline at end of file
+    ))
+
+
+class TicketIdsField(forms.Field):
+    """
+    List of ticket ids from several inputs with the same name (the checkboxes of the list views).
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Invalid ticket id.')
+
+    def validate(self, value):
+        super().validate(value)
+        if len(value) > BULK_TRANSITION_LIMIT:
+            raise forms.ValidationError(f'At most {BULK_TRANSITION_LIMIT} requests can be changed at once.')
+
+
+# Staff can approve or decline several tickets from the "Active" and "InRestoration" lists.
+class TicketBulkActionForm(forms.Form):
+    ACTION_CHOICES = [
+        ('approve', 'Approve'),
+        ('decline', 'Decline'),
+    ]
+
+    ids = TicketIdsField(error_messages={'required': 'Please select at least one request.'})
+    action = forms.ChoiceField(choices=ACTION_CHOICES, widget=forms.Select(attrs=FORM_CONTROL_ATTRS))
+    decline_reason = forms.CharField(required=False, max_length=255, widget=forms.TextInput(
+        attrs={
+            'class': 'form-control',
+            'placeholder': 'Please enter decline reason',
+        }
+    ))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'decline' and not cleaned_data.get('decline_reason'):
+            self.add_error('decline_reason', 'Decline reason is required.')
+        return cleaned_data
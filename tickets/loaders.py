@@ -0,0 +1,75 @@
+"""
+Request-scoped identity map for tickets: 'get_ticket' fetches a ticket once per request.
+"""
+
+from django.db.models import Prefetch
+from django.http import Http404
+
+from comments.models import ArchivedComment
+from .models import ArchivedTicket, Ticket
+
+REQUEST_ATTRIBUTE = '_ticket_loader'
+
+
+def _tickets(request):
+    request = getattr(request, '_request', request)  # the HttpRequest behind a Django REST Request
+    return request.__dict__.setdefault(REQUEST_ATTRIBUTE, {})
+
+
+def get_ticket(request, pk):
+    """
+    Returns ticket 'pk' with its 'ticket_user' loaded, or None if it does not exist (a miss is remembered too).
+    """
+    tickets = _tickets(request)
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+
+    if pk not in tickets:
+        tickets[pk] = Ticket.objects.select_related('ticket_user').filter(pk=pk).first()
+    return tickets[pk]
+
+
+async def aget_ticket(request, pk):
+    """
+    'get_ticket' for async views.
+    """
+    tickets = _tickets(request)
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+
+    if pk not in tickets:
+        tickets[pk] = await Ticket.objects.select_related('ticket_user').filter(pk=pk).afirst()
+    return tickets[pk]
+
+
+def get_ticket_or_404(request, pk):
+    ticket = get_ticket(request, pk)
+    if ticket is None:
+        raise Http404('The ticket you are trying to find does not exist.')
+    return ticket
+
+
+def get_ticket_or_archived_or_404(request, pk):
+    """
+    The ticket 'pk' or, once it was archived (tickets/archive.py), its ArchivedTicket with the comments loaded.
+    """
+    ticket = get_ticket(request, pk)
+    if ticket is not None:
+        return ticket
+
+    tickets = _tickets(request)
+    try:
+        key = ('archived', int(pk))
+    except (TypeError, ValueError):
+        raise Http404('The ticket you are trying to find does not exist.')
+    if key not in tickets:
+        comments = ArchivedComment.objects.select_related('comment_user').order_by('created_date', 'id')
+        tickets[key] = ArchivedTicket.objects.select_related('ticket_user').prefetch_related(
+            Prefetch('comments', queryset=comments)).filter(pk=pk).first()
+    if tickets[key] is None:
+        raise Http404('The ticket you are trying to find does not exist.')
+    return tickets[key]
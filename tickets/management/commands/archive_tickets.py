@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tickets.archive import archivable, archive_tickets, ARCHIVE_AFTER_DAYS
+
+
+class Command(BaseCommand):
+    help = ('Moves Done and Declined tickets without changes for HELPDESK_ARCHIVE_AFTER_DAYS days, and their '
+            'comments, to the archive tables (tickets/archive.py), one batch per transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Age in days, HELPDESK_ARCHIVE_AFTER_DAYS by default.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Tickets per transaction, HELPDESK_ARCHIVE_BATCH_SIZE by default.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the tickets that are due.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'HELPDESK_ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS)
+
+        if options['dry_run']:
+            self.stdout.write(f'{archivable(days=days).count()} ticket(s) are due for the archive.')
+            return
+
+        archived = archive_tickets(days=days, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} ticket(s) archived.'))
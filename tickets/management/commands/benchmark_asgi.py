@@ -0,0 +1,137 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.authtoken.models import Token
+
+from helpdesk.asgi import application as asgi_application
+from helpdesk.wsgi import application as wsgi_application
+from tickets.models import Ticket
+from tickets.seeding import seed
+from users.authentication import token_cache
+from users.models import UM
+
+# 'localhost' passes the development ALLOWED_HOSTS check outside the test runner.
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Compares the read endpoints served in process by helpdesk/asgi.py (async views under /async/ and the '
+            'synchronous REST views) and by helpdesk/wsgi.py (REST views, one thread per connection): requests '
+            'per second, latency and peak Python memory at N concurrent connections. The seeded rows have to be '
+            'committed so that every connection sees them, they are deleted at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=2, help='Comments per ticket.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per deployment.')
+
+    def handle(self, *args, **options):
+        users, staff = seed(users=1, tickets=options['tickets'], comments=options['comments'])
+        try:
+            token = Token.objects.create(user=users[0])
+            ticket = Ticket.objects.filter(ticket_user=users[0]).first()
+            paths = {
+                'rest': ['/tickets/rest/?page_size=20', f'/tickets/rest/{ticket.pk}/',
+                         f'/comments/{ticket.pk}/rest/'],
+                'async': ['/tickets/async/?page_size=20', f'/tickets/async/{ticket.pk}/',
+                          f'/comments/{ticket.pk}/async/'],
+            }
+            total, concurrency = options['requests'], options['concurrency']
+            runs = [
+                ('WSGI, REST views', lambda: self.run_wsgi(paths['rest'], token.key, total, concurrency)),
+                ('ASGI, REST views', lambda: self.run_asgi(paths['rest'], token.key, total, concurrency)),
+                ('ASGI, async views', lambda: self.run_asgi(paths['async'], token.key, total, concurrency)),
+            ]
+            for name, run in runs:
+                self.report(name, *self.measure(run))
+        finally:
+            token_cache.clear()
+            UM.objects.filter(pk__in=[user.pk for user in users + staff]).delete()
+            connections.close_all()
+
+    def measure(self, run):
+        tracemalloc.start()
+        start = time.perf_counter()
+        latencies, threads = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return len(latencies) / elapsed, latencies, peak, threads
+
+    def report(self, name, throughput, latencies, peak, threads):
+        latencies = sorted(latencies)
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f'  {throughput:.0f} req/s, median {statistics.median(latencies) * 1000:.1f} ms, '
+                          f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, '
+                          f'peak memory {peak / 2 ** 20:.1f} MiB, {threads} threads')
+
+    def run_wsgi(self, paths, key, total, concurrency):
+        def call(i):
+            path, _, query = paths[i % len(paths)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'HTTP_AUTHORIZATION': f'Token {key}',
+                'wsgi.input': BytesIO(), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            start = time.perf_counter()
+            response = wsgi_application(environ, lambda status, headers: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            assert statuses[0].startswith('200'), statuses[0]
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency, initializer=self.warm_up, initargs=(call,)) as pool:
+            latencies = list(pool.map(call, range(total)))
+            threads = threading.active_count()
+        return latencies, threads
+
+    def warm_up(self, call):
+        # Each worker makes one request before the clock starts, so starting threads is not measured.
+        call(0)
+
+    def run_asgi(self, paths, key, total, concurrency):
+        async def call(i):
+            path, _, query = paths[i % len(paths)].partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'server': (HOST, 80), 'client': ('127.0.0.1', 50000),
+                'headers': [(b'host', HOST.encode()), (b'authorization', f'Token {key}'.encode())],
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            start = time.perf_counter()
+            await asgi_application(scope, receive, send)
+            assert messages[0]['status'] == 200, messages
+            return time.perf_counter() - start
+
+        async def run():
+            # Connections do not queue up behind each other: at most 'concurrency' requests are in flight.
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited(i):
+                async with semaphore:
+                    return await call(i)
+
+            await call(0)  # warm-up
+            latencies = await asyncio.gather(*(limited(i) for i in range(total)))
+            return list(latencies), threading.active_count()
+
+        return asyncio.run(run())
@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from users.models import UM
+
+
+class Command(BaseCommand):
+    help = ('Compares creating N tickets with N "POST /tickets/rest/" calls against one "POST /tickets/rest/bulk/" '
+            'call (JSON and NDJSON). Runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = [
+            {'topic': f'Alert {i}', 'description': f'Monitoring alert number {i}', 'priority': 'High'}
+            for i in range(options['rows'])
+        ]
+
+        with transaction.atomic():
+            user = UM.objects.create_user(username='benchmark-bulk-create-reporter')
+            # 'localhost' passes the development ALLOWED_HOSTS check outside the test runner.
+            client = APIClient(HTTP_HOST='localhost')
+            client.force_authenticate(user)
+
+            def single():
+                for row in rows:
+                    response = client.post('/tickets/rest/', row, format='json')
+                    assert response.status_code == 201, response.content
+
+            def bulk_json():
+                response = client.post('/tickets/rest/bulk/', rows, format='json')
+                assert response.status_code == 201, response.content
+
+            def bulk_ndjson():
+                body = '\n'.join(json.dumps(row) for row in rows)
+                response = client.post('/tickets/rest/bulk/', body, content_type='application/x-ndjson')
+                assert response.status_code == 201, response.content
+
+            for name, run in [('single create x N', single), ('bulk (JSON)', bulk_json),
+                              ('bulk (NDJSON)', bulk_ndjson)]:
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{name:<20} {elapsed:8.3f} s  {len(rows) / elapsed:10.0f} rows/s')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,84 @@
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from comments.models import Comment
+from helpdesk.metrics import QueryTimer
+from tickets.deletion import delete_tickets, delete_user
+from tickets.models import Ticket
+from tickets.search import forget_sqlite_search_documents, index_sqlite_search_documents
+from tickets.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ('Compares the deletion collector with the chunked deletes of tickets/deletion.py on a ticket with many '
+            'comments and on a user with many tickets: time, queries and peak Python memory. '
+            'Runs in a transaction that is rolled back, so the chunks are savepoints here, not commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=10000, help='Comments of the single ticket.')
+        parser.add_argument('--tickets', type=int, default=1000, help='Tickets of the user.')
+        parser.add_argument('--ticket-comments', type=int, default=10, help='Comments per ticket of the user.')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows per statement and transaction, HELPDESK_DELETE_CHUNK_SIZE by default.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        def heavy_ticket():
+            (user,), (staff,) = seed(users=1, tickets=1, staff=1)
+            ticket = Ticket.objects.get(ticket_user=user)
+            # Every inserted comment would rebuild the SQLite FTS5 row of the ticket, it is built once at the end.
+            connection = connections[ticket._state.db]
+            forget_sqlite_search_documents(connection, [ticket.pk])
+            Comment.objects.bulk_create(
+                [Comment(ticket=ticket, comment_user=staff if i % 2 else user, text=f'Benchmark comment {i}')
+                 for i in range(options['comments'])], batch_size=1000)
+            index_sqlite_search_documents(connection, [ticket.pk])
+            return ticket
+
+        def heavy_user():
+            (user,), _ = seed(users=1, tickets=options['tickets'], comments=options['ticket_comments'], staff=1)
+            return user
+
+        scenarios = [
+            (f'ticket, {options["comments"]} comments', heavy_ticket,
+             lambda ticket: ticket.delete(), lambda ticket: delete_tickets([ticket.pk], chunk_size)),
+            (f'user, {options["tickets"]}x{options["ticket_comments"]} comments', heavy_user,
+             lambda user: user.delete(), lambda user: delete_user(user, chunk_size)),
+        ]
+
+        self.stdout.write(f'{"scenario":<30} {"path":<10} {"seconds":>9} {"queries":>8} {"peak KiB":>9}')
+        with transaction.atomic():
+            for name, setup, collector, fast in scenarios:
+                for path, run in [('collector', collector), ('chunked', fast)]:
+                    elapsed, queries, peak = self.measure(setup, run)
+                    self.stdout.write(f'{name:<30} {path:<10} {elapsed:9.3f} {queries:8} {peak // 1024:9}')
+            transaction.set_rollback(True)
+
+    def measure(self, setup, run):
+        with transaction.atomic():
+            target = setup()
+            timer = QueryTimer()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timer))
+                start = time.perf_counter()
+                run(target)
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        # Tracing slows the run down, the peak memory comes from a second run that is not timed.
+        with transaction.atomic():
+            target = setup()
+            tracemalloc.start()
+            try:
+                run(target)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+        return elapsed, timer.queries, peak
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tickets.benchmarks import ENDPOINTS, run_benchmarks
+
+# 'localhost' passes the development ALLOWED_HOSTS check outside the test runner.
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Seeds users, tickets and comments, requests every REST and HTML endpoint through the test client '
+            '(tickets/benchmarks.py) and prints p50/p95 latency, queries and peak memory per endpoint. '
+            'Fails if an endpoint exceeds its query or latency budget. Everything is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--tickets', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=3, help='Comments per ticket.')
+        parser.add_argument('--repeat', type=int, default=20, help='Measured requests per endpoint.')
+        parser.add_argument('--only', default='', help='Benchmark the endpoints whose name contains this.')
+        parser.add_argument('--no-latency-budgets', action='store_true',
+                            help='Only check the query budgets (for slow or busy machines).')
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in ENDPOINTS if options['only'] in endpoint.name]
+        if not endpoints:
+            raise CommandError(f'No endpoint matches {options["only"]!r}.')
+
+        with transaction.atomic():
+            results = run_benchmarks(users=options['users'], tickets=options['tickets'],
+                                     comments=options['comments'], repeat=options['repeat'],
+                                     endpoints=endpoints, host=HOST)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"endpoint":<36} {"p50 ms":>8} {"p95 ms":>8} {"budget":>8} {"queries":>8} '
+                          f'{"budget":>7} {"peak KiB":>9}')
+        failures = []
+        for result in results:
+            endpoint = result.endpoint
+            line = (f'{endpoint.name:<36} {result.p50_ms:>8.1f} {result.p95_ms:>8.1f} {endpoint.max_p95_ms:>8} '
+                    f'{result.queries:>8} {endpoint.max_queries:>7} {result.peak_memory / 1024:>9.0f}')
+            violations = result.violations(check_latency=not options['no_latency_budgets'])
+            if violations:
+                failures.append(f'{endpoint.name}: {", ".join(violations)}')
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if failures:
+            raise CommandError('Over budget:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} endpoint(s) within their budgets.'))
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from comments.models import Comment
+from tickets.models import Ticket
+from tickets.pagination import PAGE_SIZE
+from tickets.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ('Seeds tickets and comments, then prints EXPLAIN plans and timings of the hot list queries '
+            'without and with the ticket/comment indexes. Everything runs in one transaction that is rolled back. '
+            'Dropping an index locks the table, do not run it against a production database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--tickets', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=2, help='Comments per ticket.')
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query, the median is reported.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write('Seeding...')
+            users, staff = seed(users=options['users'], tickets=options['tickets'], comments=options['comments'])
+            queries = self.get_queries(users[0], Ticket.objects.filter(ticket_user=users[0]).first())
+
+            self.analyze()
+            after = self.measure(queries, options['repeat'])
+
+            with connection.cursor() as cursor:
+                for index_name in self.get_index_names():
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index_name)}')
+            self.analyze()
+            before = self.measure(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+                self.stdout.write(f'  before: {before[name][0]:.3f} ms\n{self.indent(before[name][1])}')
+                self.stdout.write(f'  after:  {after[name][0]:.3f} ms\n{self.indent(after[name][1])}')
+
+            transaction.set_rollback(True)
+
+    def get_queries(self, user, ticket):
+        # The same querysets the views build, limited to one page.
+        return {
+            'TicketsMainView (staff)': Ticket.objects.order_by('-created_date', '-id')[:PAGE_SIZE],
+            'TicketsMainView (user)':
+                Ticket.objects.filter(ticket_user=user).order_by('-created_date', '-id')[:PAGE_SIZE],
+            'TicketsActiveListView':
+                Ticket.objects.filter(status='Active').order_by('-created_date', '-id')[:PAGE_SIZE],
+            'TicketsInRestorationListView':
+                Ticket.objects.filter(status='InRestoration').order_by('-created_date', '-id')[:PAGE_SIZE],
+            'TicketViewSet ?priority=High':
+                Ticket.objects.filter(priority='High').order_by('-created_date', '-id')[:PAGE_SIZE],
+            'CommentsListView': Comment.objects.filter(ticket=ticket).order_by('-created_date'),
+        }
+
+    def get_index_names(self):
+        return [index.name for model in (Ticket, Comment) for index in model._meta.indexes]
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (statistics.median(timings), queryset.explain())
+        return results
+
+    def indent(self, text):
+        return '\n'.join(f'    {line}' for line in text.splitlines())
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from helpdesk.renderers import FastJSONRenderer
+from tickets.models import Ticket
+from tickets.pagination import KEYSET_FIELDS
+from tickets.seeding import seed
+from tickets.serializers import TicketSerializer
+from tickets.sparse import ValuesSerializer
+
+# The fields of a ticket list screen.
+LIST_FIELDS = {'id', 'topic', 'status', 'priority', 'created_date'}
+
+
+class Command(BaseCommand):
+    help = ('Rows per second of serializing a ticket list to JSON (query, serializer, renderer): TicketSerializer '
+            'and JSONRenderer against the .values() path of tickets/sparse.py and FastJSONRenderer, with all fields '
+            'and with a ?fields= list. Runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help='The best of this many runs counts.')
+
+    def handle(self, *args, **options):
+        def serializer_path():
+            rows = list(Ticket.objects.order_by('-created_date', '-id'))
+            return JSONRenderer().render(TicketSerializer(rows, many=True).data)
+
+        def values_path(fields=None):
+            serializer = ValuesSerializer(TicketSerializer, fields)
+            rows = Ticket.objects.order_by('-created_date', '-id').values(*serializer.columns(*KEYSET_FIELDS))
+            return FastJSONRenderer().render(serializer.many(rows))
+
+        runs = [
+            ('TicketSerializer + JSONRenderer', serializer_path),
+            ('ValuesSerializer + FastJSONRenderer', values_path),
+            (f'the same, ?fields={",".join(sorted(LIST_FIELDS))}', lambda: values_path(LIST_FIELDS)),
+        ]
+
+        with transaction.atomic():
+            seed(users=10, tickets=options['tickets'])
+            count = Ticket.objects.count()
+            self.stdout.write(f'{count} tickets')
+            for name, run in runs:
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    size = len(run())
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(f'{name:<62} {best * 1000:8.1f} ms {count / best:10.0f} rows/s '
+                                  f'{size // 1024:6} KiB')
+            transaction.set_rollback(True)
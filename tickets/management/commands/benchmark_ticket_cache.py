@@ -0,0 +1,114 @@
+import random
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from helpdesk.metrics import QueryTimer, registry
+from tickets.caching import get_ticket_cache
+from tickets.concurrency import save_ticket_edit
+from tickets.models import Ticket
+from tickets.seeding import seed
+
+# 'localhost' passes the development ALLOWED_HOSTS check outside the test runner.
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Ticket list and ticket requests of many users with edits in between, without the ticket cache '
+            '(tickets/caching.py) and with it on the local-memory and on the file backend: latency, queries and '
+            'hit rate. Every run gets the same requests. Runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--tickets', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--write-ratio', type=float, default=0.05, help='Share of the requests that edit a ticket.')
+        parser.add_argument('--random-seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        directory = tempfile.TemporaryDirectory()
+        backends = [
+            ('off', None),
+            ('local memory', {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                              'LOCATION': 'benchmark-ticket-cache'}),
+            ('file', {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                      'LOCATION': directory.name}),
+        ]
+
+        with directory, transaction.atomic():
+            users, staff = seed(users=options['users'], tickets=options['tickets'], staff=2)
+            readers = users + staff
+            tickets = {}
+            for pk, ticket_user_id in Ticket.objects.values_list('pk', 'ticket_user_id'):
+                tickets.setdefault(ticket_user_id, []).append(pk)
+            workload = self.workload(random.Random(options['random_seed']), readers, tickets, options)
+
+            self.stdout.write(f'{options["requests"]} requests, {options["write_ratio"]:.0%} edits')
+            self.stdout.write(f'{"cache":<14} {"p50 ms":>8} {"p95 ms":>8} {"queries":>8} {"hit rate":>9}')
+            for name, backend in backends:
+                settings = {'HELPDESK_TICKET_CACHE': None} if backend is None else {'CACHES': {'default': backend}}
+                with override_settings(**settings):
+                    if backend is not None:
+                        get_ticket_cache().clear()
+                    latencies, queries, hits, lookups = self.run(readers, workload)
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000
+                p95 = latencies[int(len(latencies) * 0.95)] * 1000
+                hit_rate = f'{hits / lookups:.1%}' if lookups else '-'
+                self.stdout.write(f'{name:<14} {p50:8.2f} {p95:8.2f} {queries / len(latencies):8.2f} {hit_rate:>9}')
+            transaction.set_rollback(True)
+
+    def workload(self, rng, readers, tickets, options):
+        """
+        [('write', ticket id) or ('read', reader index, path), ...]: most reads are the first page of the list,
+        the others one of the reader's tickets (any ticket for staff).
+        """
+        all_tickets = [pk for pks in tickets.values() for pk in pks]
+        workload = []
+        for _ in range(options['requests']):
+            if rng.random() < options['write_ratio']:
+                workload.append(('write', rng.choice(all_tickets)))
+                continue
+            index = rng.randrange(len(readers))
+            reader = readers[index]
+            visible = all_tickets if reader.is_staff else tickets.get(reader.pk)
+            if visible and rng.random() < 0.2:
+                workload.append(('read', index, f'/tickets/rest/{rng.choice(visible)}/'))
+            else:
+                workload.append(('read', index, '/tickets/rest/'))
+        return workload
+
+    def run(self, readers, workload):
+        clients = []
+        for reader in readers:
+            client = APIClient(HTTP_HOST=HOST)
+            client.force_authenticate(reader)
+            clients.append(client)
+
+        registry.reset()
+        latencies = []
+        timer = QueryTimer()
+        for step in workload:
+            if step[0] == 'write':
+                ticket = Ticket.objects.get(pk=step[1])
+                save_ticket_edit(ticket, ticket.version, description=f'Edited {time.perf_counter()}')
+                continue
+
+            _, index, path = step
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timer))
+                start = time.perf_counter()
+                clients[index].get(path)
+                latencies.append(time.perf_counter() - start)
+
+        counts = registry.cache_snapshot()
+        hits = sum(count['hit'] for count in counts.values())
+        lookups = hits + sum(count['miss'] for count in counts.values())
+        registry.reset()
+        return latencies, timer.queries, hits, lookups
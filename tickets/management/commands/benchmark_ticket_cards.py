@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from tickets.caching import get_ticket_cache
+from tickets.models import Ticket
+from tickets.pagination import MAX_PAGE_SIZE
+from tickets.seeding import seed
+
+# 'localhost' passes the development ALLOWED_HOSTS check outside the test runner.
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Renders a page of the largest size (MAX_PAGE_SIZE cards) of the staff list (index.html) over --tickets '
+            'tickets through the test client and prints the bytes per ticket card and the milliseconds per 1,000 '
+            'cards, with the card fragments rendered every time and served from the cache (tickets/cards.py). The '
+            'page itself comes from the list cache in both runs, so the numbers are the rendering. Runs in a '
+            'transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5, help='The best of this many renders counts.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            _, (staff,) = seed(users=10, tickets=options['tickets'], staff=1)
+            count = min(Ticket.objects.count(), MAX_PAGE_SIZE)
+            path = f'/tickets/main/?page_size={MAX_PAGE_SIZE}'
+            client = Client(HTTP_HOST=HOST)
+            client.force_login(staff)
+
+            self.stdout.write(f'{count} cards')
+            self.stdout.write(f'{"cards":<12} {"bytes/card":>10} {"ms/1000 cards":>14}')
+            for name, timeout in [('rendered', 0), ('cached', None)]:
+                get_ticket_cache().clear()
+                with override_settings(HELPDESK_TICKET_CARD_TIMEOUT=timeout):
+                    client.get(path)  # warms the list cache (and the card cache)
+                    best = None
+                    for _ in range(options['repeat']):
+                        start = time.perf_counter()
+                        response = client.get(path)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                per_card = len(response.content) / count
+                self.stdout.write(f'{name:<12} {per_card:10.0f} {best * 1000 / count * 1000:14.1f}')
+            transaction.set_rollback(True)
@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from tickets.deletion import delete_user
+from tickets.models import Ticket
+from tickets.queue import claim_next_ticket, claimable, PRIORITY_ORDER, TICKET_CLAIM_LEASE
+from tickets.seeding import seed
+
+
+def pick_first_ticket(user):
+    """
+    What staff did without the queue: open the first waiting ticket of the list and take it. The read and the
+    write are not one step, two agents can take the same ticket.
+    """
+    now = timezone.now()
+    for priority in PRIORITY_ORDER:
+        pk = claimable(now).filter(priority=priority).order_by('created_date', 'id').values_list(
+            'id', flat=True).first()
+        if pk is not None:
+            Ticket.objects.filter(pk=pk).bump(assignee=user, claimed_until=now + timedelta(seconds=TICKET_CLAIM_LEASE))
+            return pk
+    return None
+
+
+class Command(BaseCommand):
+    help = ('--agents staff members claim open tickets in threads at once, each with its own database connection, '
+            'until none is left: with the work queue (tickets/queue.py, SELECT ... FOR UPDATE SKIP LOCKED on '
+            'PostgreSQL) and with "take the first ticket of the list". Prints the claims, the tickets handed out '
+            'more than once and the claim latencies. The agents need committed rows: the seeded users and tickets '
+            'are committed and deleted at the end, and the open tickets already in the database take part too, '
+            'so run it on a development database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=8)
+        parser.add_argument('--tickets', type=int, default=2000,
+                            help='Seeded tickets, about a fifth of them are open (tickets/seeding.py).')
+
+    def handle(self, *args, **options):
+        users, staff = seed(users=10, tickets=options['tickets'], staff=options['agents'])
+        try:
+            self.stdout.write(f'{options["agents"]} agents, {claimable(timezone.now()).count()} open tickets')
+            self.stdout.write(f'{"claims":<12} {"claimed":>8} {"twice":>6} {"claims/s":>9} {"p50 ms":>7} '
+                              f'{"p95 ms":>7} {"max ms":>7}')
+            for name, claim in [('queue', lambda user: getattr(claim_next_ticket(user), 'pk', None)),
+                                ('first in list', pick_first_ticket)]:
+                claimed, latencies, elapsed = self.run(staff, claim)
+                Ticket.objects.filter(assignee__in=staff).update(assignee=None, claimed_until=None)
+
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000
+                p95 = latencies[int(len(latencies) * 0.95)] * 1000
+                twice = len(claimed) - len(set(claimed))
+                self.stdout.write(f'{name:<12} {len(claimed):8} {twice:6} {len(claimed) / elapsed:9.0f} '
+                                  f'{p50:7.2f} {p95:7.2f} {latencies[-1] * 1000:7.2f}')
+        finally:
+            for user in users + staff:
+                delete_user(user)
+
+    def run(self, staff, claim):
+        """
+        ([claimed ticket id, ...], [seconds per claim, ...], seconds until the queue was empty)
+        """
+        barrier = threading.Barrier(len(staff) + 1)
+        results = [([], []) for _ in staff]
+
+        def agent(user, claimed, latencies):
+            try:
+                barrier.wait()
+                while True:
+                    start = time.perf_counter()
+                    pk = claim(user)
+                    latencies.append(time.perf_counter() - start)
+                    if pk is None:
+                        break
+                    claimed.append(pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=agent, args=(user, *result)) for user, result in zip(staff, results)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return ([pk for claimed, _ in results for pk in claimed],
+                [latency for _, latencies in results for latency in latencies], elapsed)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from tickets.models import OutboxMessage
+from tickets.webhooks import WebhookWorker
+
+
+class Command(BaseCommand):
+    help = ('Delivers the queued webhooks of ticket changes (tickets/webhooks.py) in batches, until interrupted. '
+            'Several workers can run at once on PostgreSQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at most.')
+        parser.add_argument('--idle', type=float, default=2, help='Seconds to wait when nothing is due.')
+        parser.add_argument('--once', action='store_true', help='Stop when nothing is due.')
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help='Queue the dead messages again (with fresh attempts) and stop.')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            requeued = OutboxMessage.objects.filter(status=OutboxMessage.DEAD).update(
+                status=OutboxMessage.PENDING, attempts=0, next_attempt_at=timezone.now())
+            self.stdout.write(self.style.SUCCESS(f'{requeued} message(s) queued again.'))
+            return
+
+        worker = WebhookWorker(concurrency=options['concurrency'], batch_size=options['batch_size'])
+        try:
+            while True:
+                # A long-running worker must not hold on to a broken or expired connection.
+                close_old_connections()
+                sent, failed = worker.drain_batch()
+                if sent or failed:
+                    self.stdout.write(f'{sent} sent, {failed} failed.')
+                elif options['once']:
+                    return
+                else:
+                    time.sleep(options['idle'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
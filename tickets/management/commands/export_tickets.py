@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.export import iter_export, EXPORT_FORMATS, EXPORT_CHUNK_SIZE
+from tickets.models import Ticket
+from users.models import UM
+
+
+class Command(BaseCommand):
+    help = 'Streams tickets with their comments as NDJSON or CSV, with the same visibility rules as the REST list.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--output', help='File to write to (default: stdout).')
+        parser.add_argument('--user', help='Export only what this username can see (default: every ticket).')
+        parser.add_argument('--status', choices=[value for value, _ in Ticket.STATUS_CHOICES])
+        parser.add_argument('--priority', choices=[value for value, _ in Ticket.PRIORITY_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = Ticket.objects.all()
+        if options['user']:
+            try:
+                queryset = queryset.visible_to(UM.objects.get(username=options['user']))
+            except UM.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist.')
+
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['priority']:
+            queryset = queryset.filter(priority=options['priority'])
+
+        if not options['output']:
+            # Every line already ends with a newline, so OutputWrapper does not add another one.
+            for line in iter_export(queryset, options['type'], options['chunk_size']):
+                self.stdout.write(line)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in iter_export(queryset, options['type'], options['chunk_size']):
+                output.write(line)
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets.events import EVENTS_RETENTION
+from tickets.models import TicketEvent
+
+
+class Command(BaseCommand):
+    help = ('Deletes ticket events older than HELPDESK_EVENTS_RETENTION days. A client that reconnects after '
+            'that long gets only the events still kept, it should reload the lists.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention in days, HELPDESK_EVENTS_RETENTION by default.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'HELPDESK_EVENTS_RETENTION', EVENTS_RETENTION)
+
+        deleted, _ = TicketEvent.objects.filter(created__lt=timezone.now() - timedelta(days=days)).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} event(s) deleted.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.deletion import delete_user
+from users.models import UM
+
+
+class Command(BaseCommand):
+    help = ('Deletes a user with their tickets, comments and archived tickets in bounded chunks '
+            '(tickets/deletion.py), one transaction per chunk.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows per statement and transaction, HELPDESK_DELETE_CHUNK_SIZE by default.')
+
+    def handle(self, *args, **options):
+        try:
+            user = UM.objects.get(username=options['username'])
+        except UM.DoesNotExist:
+            raise CommandError(f'There is no user "{options["username"]}".')
+
+        deleted = delete_user(user, chunk_size=options['chunk_size'])
+        for label, count in sorted(deleted.items()):
+            if count:
+                self.stdout.write(f'{label:<30} {count:>10}')
+        self.stdout.write(self.style.SUCCESS(f'User "{options["username"]}" deleted.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from tickets.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ticket counters from one GROUP BY over the tickets and reports the counters that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift, do not fix it.')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(dry_run=options['dry_run'])
+        if not drift:
+            self.stdout.write('Ticket counters are up to date.')
+            return
+
+        for status, priority, stored, actual in drift:
+            self.stdout.write(f'{status}/{priority}: counted {stored}, actual {actual} ({actual - stored:+d})')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} counter(s) drifted, nothing changed (--dry-run).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} counter(s) fixed.'))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from helpdesk.replicas import REPLICA_CHECK_INTERVAL, write_heartbeat
+
+
+class Command(BaseCommand):
+    help = ('Writes the replica heartbeat (helpdesk/replicas.py) on the primary every check interval, until '
+            'interrupted. Run one per deployment with HELPDESK_READ_REPLICAS; without it the replicas are '
+            'measured against a stale beat.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Seconds between beats, HELPDESK_REPLICA_CHECK_INTERVAL by default.')
+        parser.add_argument('--once', action='store_true', help='Write one beat and stop.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is None:
+            interval = getattr(settings, 'HELPDESK_REPLICA_CHECK_INTERVAL', REPLICA_CHECK_INTERVAL)
+        try:
+            while True:
+                write_heartbeat()
+                if options['once']:
+                    return
+                time.sleep(interval)
+                # A long-running worker must not hold on to a broken or expired connection.
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
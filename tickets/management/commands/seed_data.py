@@ -0,0 +1,29 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tickets.seeding import seed, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Creates synthetic users, tickets in every status and priority, and comments with bulk_create '
+            '(tickets/seeding.py). The users get unusable passwords.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--tickets', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=3, help='Comments per ticket.')
+        parser.add_argument('--days', type=int, default=365, help='The tickets are spread over this many days.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--random-seed', type=int, default=None, help='Generates the same data every run.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users, staff = seed(users=options['users'], tickets=options['tickets'], comments=options['comments'],
+                                staff=options['staff'], days=options['days'], batch_size=options['batch_size'],
+                                rng=random.Random(options['random_seed']))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(users)} user(s), {len(staff)} staff user(s), {options["tickets"]} ticket(s) and '
+            f'{options["tickets"] * options["comments"]} comment(s) created.'))
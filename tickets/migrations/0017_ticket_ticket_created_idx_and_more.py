@@ -0,0 +1,29 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_alter_ticket_decline_reason'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-created_date', '-id'], name='ticket_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['ticket_user', '-created_date', '-id'], name='ticket_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['priority', '-created_date', '-id'], name='ticket_priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status__in', ['Active', 'InRestoration'])), fields=['status', '-created_date', '-id'], name='ticket_open_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,151 @@
+"""
+Full-text search over the topic, description and comments of a ticket: a trigger-maintained tsvector column
+with a GIN index on PostgreSQL, the FTS5 table 'tickets_ticket_fts' on SQLite.
+"""
+
+# Generated by Django 4.2.5 on 2026-10-18 19:54
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION tickets_ticket_search_document(ticket_id bigint, topic text, description text)
+    RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('english', coalesce(topic, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(
+                (SELECT string_agg(text, ' ') FROM comments_comment WHERE comments_comment.ticket_id = $1), ''
+            )), 'C');
+    $$ LANGUAGE sql STABLE;
+    """,
+    """
+    CREATE FUNCTION tickets_ticket_search_vector_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := tickets_ticket_search_document(NEW.id, NEW.topic, NEW.description);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_search_vector_update
+    BEFORE INSERT OR UPDATE OF topic, description ON tickets_ticket
+    FOR EACH ROW EXECUTE FUNCTION tickets_ticket_search_vector_trigger();
+    """,
+    """
+    CREATE FUNCTION comments_comment_search_vector_trigger() RETURNS trigger AS $$
+    DECLARE
+        changed_ticket_id bigint;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed_ticket_id := OLD.ticket_id;
+        ELSE
+            changed_ticket_id := NEW.ticket_id;
+        END IF;
+        UPDATE tickets_ticket
+        SET search_vector = tickets_ticket_search_document(id, topic, description)
+        WHERE id = changed_ticket_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER comments_comment_search_vector_update
+    AFTER INSERT OR UPDATE OF text OR DELETE ON comments_comment
+    FOR EACH ROW EXECUTE FUNCTION comments_comment_search_vector_trigger();
+    """,
+    "UPDATE tickets_ticket SET search_vector = tickets_ticket_search_document(id, topic, description);",
+    "CREATE INDEX ticket_search_vector_idx ON tickets_ticket USING gin (search_vector);",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS ticket_search_vector_idx;",
+    "DROP TRIGGER IF EXISTS comments_comment_search_vector_update ON comments_comment;",
+    "DROP FUNCTION IF EXISTS comments_comment_search_vector_trigger();",
+    "DROP TRIGGER IF EXISTS tickets_ticket_search_vector_update ON tickets_ticket;",
+    "DROP FUNCTION IF EXISTS tickets_ticket_search_vector_trigger();",
+    "DROP FUNCTION IF EXISTS tickets_ticket_search_document(bigint, text, text);",
+]
+
+SQLITE_COMMENTS_OF = "coalesce((SELECT group_concat(text, ' ') FROM comments_comment WHERE ticket_id = {}), '')"
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE tickets_ticket_fts USING fts5(topic, description, comments, tokenize = 'porter unicode61');
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_fts_insert AFTER INSERT ON tickets_ticket BEGIN
+        INSERT INTO tickets_ticket_fts (rowid, topic, description, comments)
+        VALUES (new.id, new.topic, new.description, '');
+    END;
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_fts_update AFTER UPDATE OF topic, description ON tickets_ticket BEGIN
+        UPDATE tickets_ticket_fts SET topic = new.topic, description = new.description WHERE rowid = new.id;
+    END;
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_fts_delete AFTER DELETE ON tickets_ticket BEGIN
+        DELETE FROM tickets_ticket_fts WHERE rowid = old.id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER comments_comment_fts_insert AFTER INSERT ON comments_comment BEGIN
+        UPDATE tickets_ticket_fts SET comments = {SQLITE_COMMENTS_OF.format('new.ticket_id')}
+        WHERE rowid = new.ticket_id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER comments_comment_fts_update AFTER UPDATE OF text ON comments_comment BEGIN
+        UPDATE tickets_ticket_fts SET comments = {SQLITE_COMMENTS_OF.format('new.ticket_id')}
+        WHERE rowid = new.ticket_id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER comments_comment_fts_delete AFTER DELETE ON comments_comment BEGIN
+        UPDATE tickets_ticket_fts SET comments = {SQLITE_COMMENTS_OF.format('old.ticket_id')}
+        WHERE rowid = old.ticket_id;
+    END;
+    """,
+    f"""
+    INSERT INTO tickets_ticket_fts (rowid, topic, description, comments)
+    SELECT id, topic, description, {SQLITE_COMMENTS_OF.format('tickets_ticket.id')} FROM tickets_ticket;
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS comments_comment_fts_delete;",
+    "DROP TRIGGER IF EXISTS comments_comment_fts_update;",
+    "DROP TRIGGER IF EXISTS comments_comment_fts_insert;",
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_delete;",
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_update;",
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_insert;",
+    "DROP TABLE IF EXISTS tickets_ticket_fts;",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_ticket_ticket_created_idx_and_more'),
+        ('comments', '0003_comment_comment_ticket_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
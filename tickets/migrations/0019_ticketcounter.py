@@ -0,0 +1,46 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    """
+    One row per (status, priority), filled from the existing tickets in one GROUP BY.
+    """
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketCounter = apps.get_model('tickets', 'TicketCounter')
+    alias = schema_editor.connection.alias
+
+    rows = Ticket.objects.using(alias).values('status', 'priority').annotate(count=Count('id')).order_by()
+    counts = {(row['status'], row['priority']): row['count'] for row in rows}
+    statuses = [status for status, _ in Ticket._meta.get_field('status').choices]
+    priorities = [priority for priority, _ in Ticket._meta.get_field('priority').choices]
+    TicketCounter.objects.using(alias).bulk_create([
+        TicketCounter(status=status, priority=priority, count=counts.get((status, priority), 0))
+        for status in statuses for priority in priorities
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0018_ticket_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Active', 'Active'), ('InProcess', 'InProcess'), ('InRestoration', 'InRestoration'), ('Declined', 'Declined'), ('Approved', 'Approved'), ('Done', 'Done')], max_length=20)),
+                ('priority', models.CharField(choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], max_length=10)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketcounter',
+            constraint=models.UniqueConstraint(fields=('status', 'priority'), name='ticket_counter_status_priority_uniq'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_at_created_date(apps, schema_editor):
+    # Existing tickets have no recorded change, their creation is the last one known.
+    apps.get_model('tickets', 'Ticket').objects.using(schema_editor.connection.alias).update(
+        updated_at=F('created_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0019_ticketcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(start_at_created_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0020_ticket_updated_at_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', 'Status'), ('comment', 'Comment')], max_length=10)),
+                ('status', models.CharField(blank=True, choices=[('Active', 'Active'), ('InProcess', 'InProcess'), ('InRestoration', 'InRestoration'), ('Declined', 'Declined'), ('Approved', 'Approved'), ('Done', 'Done')], max_length=20)),
+                ('comment_id', models.BigIntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='tickets.ticket')),
+                ('ticket_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticket_user', 'id'], name='ticket_event_user_idx')],
+            },
+        ),
+    ]
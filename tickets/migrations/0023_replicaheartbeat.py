@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_heartbeat(apps, schema_editor):
+    apps.get_model('tickets', 'ReplicaHeartbeat').objects.using(schema_editor.connection.alias).create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0022_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_heartbeat, migrations.RunPython.noop),
+    ]
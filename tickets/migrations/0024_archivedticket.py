@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2026-10-18 20:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0023_replicaheartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('priority', models.CharField(choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], max_length=10)),
+                ('topic', models.CharField(max_length=18)),
+                ('description', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('Active', 'Active'), ('InProcess', 'InProcess'), ('InRestoration', 'InRestoration'), ('Declined', 'Declined'), ('Approved', 'Approved'), ('Done', 'Done')], max_length=20)),
+                ('created_date', models.DateTimeField()),
+                ('decline_reason', models.TextField(blank=True, max_length=255)),
+                ('restore_request', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+                ('version', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('ticket_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_date', '-id'], name='archived_ticket_created_idx'), models.Index(fields=['ticket_user', '-created_date', '-id'], name='archived_ticket_user_idx')],
+            },
+        ),
+    ]
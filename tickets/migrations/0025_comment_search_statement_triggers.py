@@ -0,0 +1,69 @@
+"""
+PostgreSQL: the search document of a ticket is rebuilt once per INSERT or DELETE statement on comments_comment
+instead of once per comment row.
+"""
+
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    "DROP TRIGGER IF EXISTS comments_comment_search_vector_update ON comments_comment;",
+    """
+    CREATE TRIGGER comments_comment_search_vector_update
+    AFTER UPDATE OF text ON comments_comment
+    FOR EACH ROW EXECUTE FUNCTION comments_comment_search_vector_trigger();
+    """,
+    """
+    CREATE FUNCTION comments_comment_search_vector_statement_trigger() RETURNS trigger AS $$
+    BEGIN
+        UPDATE tickets_ticket
+        SET search_vector = tickets_ticket_search_document(id, topic, description)
+        WHERE id IN (SELECT ticket_id FROM changed_comments);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER comments_comment_search_vector_insert
+    AFTER INSERT ON comments_comment REFERENCING NEW TABLE AS changed_comments
+    FOR EACH STATEMENT EXECUTE FUNCTION comments_comment_search_vector_statement_trigger();
+    """,
+    """
+    CREATE TRIGGER comments_comment_search_vector_delete
+    AFTER DELETE ON comments_comment REFERENCING OLD TABLE AS changed_comments
+    FOR EACH STATEMENT EXECUTE FUNCTION comments_comment_search_vector_statement_trigger();
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS comments_comment_search_vector_delete ON comments_comment;",
+    "DROP TRIGGER IF EXISTS comments_comment_search_vector_insert ON comments_comment;",
+    "DROP FUNCTION IF EXISTS comments_comment_search_vector_statement_trigger();",
+    "DROP TRIGGER IF EXISTS comments_comment_search_vector_update ON comments_comment;",
+    """
+    CREATE TRIGGER comments_comment_search_vector_update
+    AFTER INSERT OR UPDATE OF text OR DELETE ON comments_comment
+    FOR EACH ROW EXECUTE FUNCTION comments_comment_search_vector_trigger();
+    """,
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0024_archivedticket'),
+        ('comments', '0005_archivedcomment'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.5 on 2026-10-18 21:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0025_comment_search_statement_triggers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='assignee',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status__in', ['Active', 'InRestoration'])), fields=['priority', 'created_date', 'id'], name='ticket_open_queue_idx'),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.http import Http404
 from django.urls import reverse
+from rest_framework.utils.urls import replace_query_param
+
+from .caching import cached_ticket_page
+from .pagination import decode_cursor, get_page_size, paginate_keyset, MAX_PAGE_SIZE, PAGE_SIZE
 
 
 class LoginRequiredMixin(UserPassesTestMixin):
@@ -13,3 +18,56 @@ class LoginRequiredMixin(UserPassesTestMixin):
 
     def get_login_url(self):
         return reverse('login_view')
+
+
+class KeysetListMixin:
+    """
+    ListView of tickets in pages of 'page_size' (?page_size=, at most MAX_PAGE_SIZE), newest first, with the
+    keyset cursors of tickets/pagination.py in ?cursor= instead of 'paginate_by': Django's Paginator counts the
+    matching rows (COUNT(*)) on every page view, a cursor page costs the same at any position and any table size.
+    The pages are cached as a whole (tickets/caching.py) under 'cache_name'.
+
+    'tickets' / 'get_tickets()' -> the queryset to page through, all the rows of 'model' by default,
+    'get_archived_tickets()' -> archived tickets to merge into it (tickets/archive.py), None for none.
+    The template gets 'next_url' and 'previous_url', None at either end.
+    """
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    cursor_param = 'cursor'  # EXMP /?cursor=ZD0yMDIz...
+    cache_name = None
+    tickets = None
+    page = None
+
+    def get_tickets(self):
+        if self.tickets is not None:
+            return self.tickets.all()
+        return self.model._default_manager.all()
+
+    def get_archived_tickets(self):
+        return None
+
+    def get_cursor(self):
+        encoded = self.request.GET.get(self.cursor_param)
+        try:
+            return decode_cursor(encoded) if encoded else None
+        except ValueError:
+            raise Http404('Invalid cursor')
+
+    def get_queryset(self):
+        cursor = self.get_cursor()
+        page_size = get_page_size(self.request.GET, self.page_size, self.max_page_size)
+        self.page = cached_ticket_page(self.cache_name, self.request, lambda: paginate_keyset(
+            self.get_tickets(), cursor, page_size, archived=self.get_archived_tickets()))
+        return self.page.rows
+
+    def get_page_url(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.get_full_path(), self.cursor_param, cursor)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.page is not None:
+            context['next_url'] = self.get_page_url(self.page.next_cursor)
+            context['previous_url'] = self.get_page_url(self.page.previous_cursor)
+        return context
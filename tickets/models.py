@@ -1,8 +1,70 @@
 # from django.utils import timezone
 
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, router, transaction
+from django.db.models import F, sql
+from django.utils import timezone
 from users.models import UM
 
+# Statuses that still wait for a staff decision.
+OPEN_STATUSES = ['Active', 'InRestoration']
+# Statuses of finished tickets, which tickets/archive.py moves to ArchivedTicket once they are old enough.
+TERMINAL_STATUSES = ['Done', 'Declined']
+
+
+class TicketQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Staff see every ticket, other users only the tickets they created.
+        """
+        if user.is_staff:
+            return self
+        return self.filter(ticket_user=user)
+
+    def filtered(self, priority=None, status=None):
+        """
+        The ?priority= and ?status= filters of the ticket lists.
+        """
+        queryset = self
+        if priority:
+            queryset = queryset.filter(priority=priority)
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+
+    def locked(self):
+        """
+        'select_for_update()' of these rows, for a transaction that reads them and then writes them.
+        SQLite has no row locks: a write that matches nothing first takes the lock of the whole database, so no
+        other connection changes the rows between the read and the write.
+        """
+        if not connections[router.db_for_write(self.model)].features.has_select_for_update:
+            self.model.objects.filter(pk=-1).update(version=F('version'))
+        return self.select_for_update()
+
+    def bump(self, **values):
+        """
+        UPDATE of 'values' that also gives every ticket a new version and 'updated_at'.
+        """
+        values.setdefault('updated_at', timezone.now())
+        return self.update(version=F('version') + 1, **values)
+
+    def bump_returning(self, *fields, **values):
+        """
+        'bump' that returns the 'fields' of the changed rows, [(value, ...), ...], with "UPDATE ... RETURNING"
+        (PostgreSQL, SQLite 3.35+): the caller learns which rows it changed without reading them first.
+        """
+        values.setdefault('updated_at', timezone.now())
+        self._for_write = True
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values({'version': F('version') + 1, **values})
+        update_sql, params = query.get_compiler(self.db).as_sql()
+        connection = connections[self.db]
+        columns = ', '.join(connection.ops.quote_name(self.model._meta.get_field(name).column) for name in fields)
+        with transaction.mark_for_rollback_on_error(using=self.db), connection.cursor() as cursor:
+            cursor.execute(f'{update_sql} RETURNING {columns}', params)
+            return cursor.fetchall()
+
 
 class Ticket(models.Model):
 
@@ -40,5 +102,215 @@ class Ticket(models.Model):
     """
     restore_request = models.BooleanField(default=False)
 
+    """
+    Full-text search document (topic, description and comment texts), kept up to date by database triggers
+    on PostgreSQL. SQLite keeps the document in an FTS5 table instead and leaves this column empty.
+    See tickets/search.py.
+    """
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    """
+    Change tracking for conditional requests (tickets/conditional.py) and optimistic concurrency control
+    (tickets/concurrency.py): every change of the ticket or of one of its comments moves 'updated_at'
+    and increments 'version'.
+    """
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    """
+    The staff member working on an open ticket, taken from the work queue (tickets/queue.py). The claim lapses
+    at 'claimed_until', the ticket is then up for the next claim again.
+    """
+    assignee = models.ForeignKey(UM, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 related_name='assigned_tickets')
+    claimed_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = TicketQuerySet.as_manager()
+
+    # ArchivedTicket is True, templates and serializers tell the two apart by it.
+    archived = False
+
+    class Meta:
+        """
+        Every list orders by (created_date, id) newest first, after an equality filter on one column.
+        Closed tickets pile up over time, so the status index only covers the open ones.
+        """
+        indexes = [
+            models.Index(fields=['-created_date', '-id'], name='ticket_created_idx'),
+            models.Index(fields=['ticket_user', '-created_date', '-id'], name='ticket_user_created_idx'),
+            models.Index(fields=['priority', '-created_date', '-id'], name='ticket_priority_created_idx'),
+            models.Index(fields=['status', '-created_date', '-id'], name='ticket_open_status_created_idx',
+                         condition=models.Q(status__in=OPEN_STATUSES)),
+            # The work queue (tickets/queue.py): the oldest open ticket of a priority.
+            models.Index(fields=['priority', 'created_date', 'id'], name='ticket_open_queue_idx',
+                         condition=models.Q(status__in=OPEN_STATUSES)),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # (status, priority) the row is counted under in TicketCounter, None for deferred fields.
+        instance._counted_as = (instance.__dict__.get('status'), instance.__dict__.get('priority'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+
+        # The post_save receivers (tickets/signals.py) update TicketCounter in the same transaction as the row.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.topic}"
+
+
+class ArchivedTicket(models.Model):
+    """
+    A finished ticket moved out of the ticket table by tickets/archive.py, read-only. It keeps its id, so its
+    URLs keep working, and it is still counted in TicketCounter. Its comments are ArchivedComments.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    ticket_user = models.ForeignKey(UM, on_delete=models.CASCADE, related_name='+')
+    priority = models.CharField(max_length=10, choices=Ticket.PRIORITY_CHOICES)
+    topic = models.CharField(max_length=18)
+    description = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    created_date = models.DateTimeField()
+    decline_reason = models.TextField(max_length=255, blank=True)
+    restore_request = models.BooleanField(default=False)
+    # Archiving is a change of the ticket: it gets a new version, so cached copies are revalidated.
+    updated_at = models.DateTimeField()
+    version = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TicketQuerySet.as_manager()
+
+    archived = True
+
+    class Meta:
+        """
+        The same list orderings as the ticket table, for ?include_archived=.
+        """
+        indexes = [
+            models.Index(fields=['-created_date', '-id'], name='archived_ticket_created_idx'),
+            models.Index(fields=['ticket_user', '-created_date', '-id'], name='archived_ticket_user_idx'),
+        ]
+
     def __str__(self):
         return f"{self.topic}"
+
+
+class TicketCounter(models.Model):
+    """
+    Number of tickets per (status, priority), so dashboards never count the ticket table.
+    Kept current by tickets/counters.py, rebuilt by 'manage.py reconcile_ticket_counters'.
+    """
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    priority = models.CharField(max_length=10, choices=Ticket.PRIORITY_CHOICES)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'priority'], name='ticket_counter_status_priority_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.status}/{self.priority}: {self.count}"
+
+
+class TicketEventQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        The events of the tickets 'user' can see, the same rule as TicketQuerySet.visible_to.
+        """
+        if user.is_staff:
+            return self
+        return self.filter(ticket_user=user)
+
+
+class TicketEvent(models.Model):
+    """
+    A change pushed to the clients of the event stream (tickets/events.py): a ticket created or moved to another
+    status, or a comment added to it. The id is the event sequence, clients resume after the last id they
+    received (Last-Event-ID). Written in the transaction of the change itself.
+    """
+    STATUS = 'status'
+    COMMENT = 'comment'
+    KIND_CHOICES = [
+        (STATUS, 'Status'),
+        (COMMENT, 'Comment'),
+    ]
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='events')
+    # The owner of the ticket, so visibility is checked without loading the ticket.
+    ticket_user = models.ForeignKey(UM, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # The new status of the ticket for STATUS events.
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES, blank=True)
+    # The added comment for COMMENT events. A plain id: deleting the comment keeps the event.
+    comment_id = models.BigIntegerField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = TicketEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticket_user', 'id'], name='ticket_event_user_idx'),
+        ]
+
+    def is_visible_to(self, user):
+        return user.is_staff or self.ticket_user_id == user.pk
+
+
+class OutboxMessageQuerySet(models.QuerySet):
+    def due(self, now=None):
+        """
+        Pending messages whose next attempt is due.
+        """
+        return self.filter(status=OutboxMessage.PENDING, next_attempt_at__lte=now or timezone.now())
+
+
+class OutboxMessage(models.Model):
+    """
+    A webhook to deliver to one endpoint of HELPDESK_WEBHOOKS, written in the transaction of the ticket change
+    (tickets/events.py) and sent later by 'manage.py deliver_webhooks' (tickets/webhooks.py).
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+
+    endpoint = models.CharField(max_length=50)  # key of HELPDESK_WEBHOOKS
+    event = models.CharField(max_length=50)  # EXMP ticket.approved
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboxMessageQuerySet.as_manager()
+
+    class Meta:
+        """
+        The worker only ever looks for due pending messages, sent ones pile up.
+        """
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], name='outbox_pending_due_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
+
+class ReplicaHeartbeat(models.Model):
+    """
+    One row, written on the primary and read back from the replicas to measure their lag (helpdesk/replicas.py).
+    """
+    beat = models.DateTimeField(default=timezone.now)
@@ -0,0 +1,218 @@
+"""
+Keyset (seek) pagination over (created_date, id):
+"WHERE (created_date, id) < (%s, %s) ORDER BY created_date DESC, id DESC", no OFFSET and no COUNT(*).
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# What a page needs of its rows: the keys of the cursors and, for its ETag, the versions.
+KEYSET_FIELDS = ['id', 'created_date', 'version']
+
+# (created_date, id, reverse) - 'reverse' is True for cursors that point to the previous page.
+Cursor = namedtuple('Cursor', ['created_date', 'id', 'reverse'])
+KeysetPage = namedtuple('KeysetPage', ['rows', 'next_cursor', 'previous_cursor'])
+
+
+def encode_cursor(cursor):
+    tokens = {'d': cursor.created_date.isoformat(), 'i': cursor.id}
+    if cursor.reverse:
+        tokens['r'] = '1'
+    querystring = parse.urlencode(tokens)
+    return urlsafe_b64encode(querystring.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(encoded):
+    """
+    Raises ValueError for anything that is not a cursor produced by 'encode_cursor'.
+    """
+    try:
+        querystring = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+        tokens = parse.parse_qs(querystring, keep_blank_values=True)
+        created_date = datetime.fromisoformat(tokens['d'][0])
+        pk = int(tokens['i'][0])
+        reverse = tokens.get('r', ['0'])[0] == '1'
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+    if created_date.tzinfo is None:
+        raise ValueError('Invalid cursor')
+    return Cursor(created_date, pk, reverse)
+
+
+def _position(row):
+    if isinstance(row, dict):
+        return row['created_date'], row['id']
+    return row.created_date, row.id
+
+
+def paginate_keyset(queryset, cursor=None, page_size=PAGE_SIZE, archived=None):
+    """
+    Returns one page of 'queryset' (newest first) together with the cursors of its neighbours.
+    Rows may be model instances or dicts from '.values()', as long as they carry 'created_date' and 'id'.
+    'archived' -> a queryset of archived tickets whose rows are merged into the page.
+    """
+    rows = list(keyset_queryset(queryset, cursor, page_size))
+    if archived is not None:
+        rows.extend(keyset_queryset(archived, cursor, page_size))
+        # Both lists come in the order of the query, the merged page keeps it.
+        rows.sort(key=_position, reverse=cursor is None or not cursor.reverse)
+    return keyset_page(rows, cursor, page_size)
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=PAGE_SIZE, archived=None):
+    """
+    'paginate_keyset' for async views.
+    """
+    rows = [row async for row in keyset_queryset(queryset, cursor, page_size)]
+    if archived is not None:
+        rows.extend([row async for row in keyset_queryset(archived, cursor, page_size)])
+        rows.sort(key=_position, reverse=cursor is None or not cursor.reverse)
+    return keyset_page(rows, cursor, page_size)
+
+
+def keyset_queryset(queryset, cursor, page_size):
+    reverse = cursor is not None and cursor.reverse
+
+    if cursor is not None:
+        # 'created_date <= X' is the index range condition, the OR only resolves ties inside it.
+        if reverse:
+            queryset = queryset.filter(created_date__gte=cursor.created_date).filter(
+                Q(created_date__gt=cursor.created_date) | Q(id__gt=cursor.id))
+        else:
+            queryset = queryset.filter(created_date__lte=cursor.created_date).filter(
+                Q(created_date__lt=cursor.created_date) | Q(id__lt=cursor.id))
+
+    if reverse:
+        queryset = queryset.order_by('created_date', 'id')
+    else:
+        queryset = queryset.order_by('-created_date', '-id')
+
+    # One extra row tells whether there is anything beyond this page.
+    return queryset[:page_size + 1]
+
+
+def get_page_size(params, page_size=PAGE_SIZE, max_page_size=MAX_PAGE_SIZE, param='page_size'):
+    """
+    The page size in the query 'params' (request.GET), capped at 'max_page_size', 'page_size' without a valid one.
+    """
+    try:
+        requested = int(params[param])
+    except (KeyError, ValueError):
+        return page_size
+
+    if requested <= 0:
+        return page_size
+    return min(requested, max_page_size)
+
+
+def keyset_page(rows, cursor, page_size):
+    reverse = cursor is not None and cursor.reverse
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows, None, None)
+
+    has_next = has_more if not reverse else True
+    has_previous = has_more if reverse else cursor is not None
+
+    next_cursor = encode_cursor(Cursor(*_position(rows[-1]), False)) if has_next else None
+    previous_cursor = encode_cursor(Cursor(*_position(rows[0]), True)) if has_previous else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class TicketCursorPagination(BasePagination):
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'  # EXMP /?cursor=ZD0yMDIz...
+    page_size_query_param = 'page_size'  # EXMP /?page_size=50
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Full-text search results are ordered by rank, not by (created_date, id): only the best page is returned.
+    search_param = 'search'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+
+        if request.query_params.get(self.search_param, '').strip():
+            self.page = KeysetPage(list(queryset[:self.get_page_size(request)]), None, None)
+            return self.page.rows
+
+        self.page = paginate_keyset(queryset, self.get_cursor(request), self.get_page_size(request),
+                                    archived=self.get_archived_queryset(view))
+        return self.page.rows
+
+    def paginate_values(self, queryset, request, archived=None):
+        """
+        'paginate_queryset' for '.values()' querysets, which carry at least KEYSET_FIELDS.
+        'archived' -> the archived rows to merge into the page, also '.values()'.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page = paginate_keyset(queryset, self.get_cursor(request), self.get_page_size(request), archived=archived)
+        return self.page.rows
+
+    def paginate_validators(self, queryset, request, view=None):
+        """
+        The page 'paginate_queryset' would return, with only the KEYSET_FIELDS of its rows.
+        """
+        archived = self.get_archived_queryset(view)
+        return paginate_keyset(queryset.values(*KEYSET_FIELDS), self.get_cursor(request), self.get_page_size(request),
+                               archived=archived.values(*KEYSET_FIELDS) if archived is not None else None)
+
+    def get_archived_queryset(self, view):
+        """
+        The archived tickets to merge into the page: the view's 'get_archived_queryset()', None without one.
+        """
+        get_archived_queryset = getattr(view, 'get_archived_queryset', None)
+        return get_archived_queryset() if get_archived_queryset is not None else None
+
+    def get_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        try:
+            return decode_cursor(encoded) if encoded else None
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        return get_page_size(request.query_params, self.page_size, self.max_page_size, self.page_size_query_param)
+
+    def get_next_link(self):
+        if self.page.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.page.next_cursor)
+
+    def get_previous_link(self):
+        if self.page.previous_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,36 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class InvalidRow:
+    """
+    Placeholder for an NDJSON line that is not valid JSON, so the rest of the batch can still be processed.
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON: one object per line, blank lines are ignored.
+    Returns a list with one item per line - the decoded value or an 'InvalidRow'.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        rows = []
+        for line in codecs.getreader(encoding)(stream):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as exc:
+                rows.append(InvalidRow(f'JSON parse error - {exc}'))
+        return rows
@@ -0,0 +1,66 @@
+"""
+Work queue of the open tickets for staff: 'claim_next_ticket' hands out the oldest ticket nobody holds, the
+highest priority first.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import tickets_changed
+from .models import Ticket, OPEN_STATUSES
+
+TICKET_CLAIM_LEASE = 15 * 60
+
+# The order the queue hands out the priorities in.
+PRIORITY_ORDER = ['High', 'Medium', 'Low']
+
+
+def claimable(now):
+    """
+    The open tickets without an assignee or whose claim has lapsed at 'now'.
+    """
+    return Ticket.objects.filter(Q(assignee__isnull=True) | Q(claimed_until__lte=now), status__in=OPEN_STATUSES)
+
+
+def claim_next_ticket(user, lease=None):
+    """
+    Claims the next ticket of the queue for 'user' for 'lease' seconds (HELPDESK_TICKET_CLAIM_LEASE).
+    Returns the claimed Ticket, None when no ticket is waiting.
+    """
+    if lease is None:
+        lease = getattr(settings, 'HELPDESK_TICKET_CLAIM_LEASE', TICKET_CLAIM_LEASE)
+    skip_locked = connections[router.db_for_write(Ticket)].features.has_select_for_update_skip_locked
+    now = timezone.now()
+    with transaction.atomic():
+        # FOR UPDATE SKIP LOCKED on PostgreSQL, the write lock of the whole database on SQLite: no ticket is
+        # handed out twice.
+        queue = claimable(now).locked().select_for_update(skip_locked=skip_locked)
+        # One priority at a time: every query is a range of ticket_open_queue_idx, the oldest row first.
+        for priority in PRIORITY_ORDER:
+            candidates = queue.filter(priority=priority).order_by('created_date', 'id').values_list(
+                'id', 'ticket_user_id')
+            # A candidate whose UPDATE changes nothing (another claim took it) is not read again, the loop ends when
+            # the priority has no candidates left.
+            passed = []
+            while (candidate := candidates.exclude(pk__in=passed).first()) is not None:
+                pk, ticket_user_id = candidate
+                if claimable(now).filter(pk=pk).bump(assignee=user, claimed_until=now + timedelta(seconds=lease)):
+                    tickets_changed(ticket_user_id)
+                    return Ticket.objects.get(pk=pk)
+                passed.append(pk)
+    return None
+
+
+def release_ticket(pk, user):
+    """
+    Gives ticket 'pk' back to the queue, if 'user' holds it. Returns True if it did.
+    """
+    with transaction.atomic():
+        released = Ticket.objects.filter(pk=pk, assignee=user).bump(assignee=None, claimed_until=None)
+        if released:
+            tickets_changed(*Ticket.objects.filter(pk=pk).values_list('ticket_user_id', flat=True))
+    return bool(released)
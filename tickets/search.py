@@ -0,0 +1,201 @@
+"""
+Full-text search over tickets and their comments: a tsvector column on PostgreSQL, FTS5 on SQLite,
+'icontains' elsewhere.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, TextField, Value
+from django.db.models.functions import Concat
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_CONFIG = 'english'
+SEARCH_RESULT_LIMIT = 50
+FTS_TABLE = 'tickets_ticket_fts'
+
+# The triggers of migration 0018 on SQLite. Rebuilding a table (which Django does on SQLite for most
+# ALTER TABLEs) drops its triggers, so they are checked after every migrate, see 'restore_sqlite_search_index'.
+SQLITE_COMMENTS_OF = "coalesce((SELECT group_concat(text, ' ') FROM comments_comment WHERE ticket_id = {}), '')"
+SQLITE_TRIGGERS = {
+    'tickets_ticket_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_insert AFTER INSERT ON tickets_ticket BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, topic, description, comments)
+            VALUES (new.id, new.topic, new.description, '');
+        END;
+    """,
+    'tickets_ticket_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_update AFTER UPDATE OF topic, description ON tickets_ticket
+        BEGIN
+            UPDATE {FTS_TABLE} SET topic = new.topic, description = new.description WHERE rowid = new.id;
+        END;
+    """,
+    'tickets_ticket_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_delete AFTER DELETE ON tickets_ticket BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END;
+    """,
+    'comments_comment_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS comments_comment_fts_insert AFTER INSERT ON comments_comment BEGIN
+            UPDATE {FTS_TABLE} SET comments = {SQLITE_COMMENTS_OF.format('new.ticket_id')}
+            WHERE rowid = new.ticket_id;
+        END;
+    """,
+    'comments_comment_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS comments_comment_fts_update AFTER UPDATE OF text ON comments_comment BEGIN
+            UPDATE {FTS_TABLE} SET comments = {SQLITE_COMMENTS_OF.format('new.ticket_id')}
+            WHERE rowid = new.ticket_id;
+        END;
+    """,
+    'comments_comment_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS comments_comment_fts_delete AFTER DELETE ON comments_comment BEGIN
+            UPDATE {FTS_TABLE} SET comments = {SQLITE_COMMENTS_OF.format('old.ticket_id')}
+            WHERE rowid = old.ticket_id;
+        END;
+    """,
+}
+
+# Highlight markers: control characters that cannot come from user input, turned into <mark> after escaping.
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+
+def search_tickets(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        results = _search_postgresql(queryset, query)
+    elif vendor == 'sqlite':
+        results = _search_sqlite(queryset, query)
+    else:
+        results = _search_icontains(queryset, query)
+
+    if results is None:
+        return queryset.none()
+    return results.order_by('-search_rank', '-created_date', '-id')
+
+
+def restore_sqlite_search_index(connection):
+    """
+    Recreates the missing FTS5 triggers and, if any was missing, rebuilds the FTS5 table from the tickets,
+    since writes made in the meantime were not indexed.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in existing or set(SQLITE_TRIGGERS) <= existing:
+            return
+
+        for statement in SQLITE_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"""
+            INSERT INTO {FTS_TABLE} (rowid, topic, description, comments)
+            SELECT id, topic, description, {SQLITE_COMMENTS_OF.format('tickets_ticket.id')} FROM tickets_ticket
+        """)
+
+
+def forget_sqlite_search_documents(connection, ids):
+    """
+    Drops the FTS5 rows of the tickets 'ids' before their comments are deleted, so the comment delete trigger
+    finds no row to rebuild for every deleted comment (tickets/deletion.py). No-op on other databases.
+    """
+    if connection.vendor != 'sqlite' or not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", list(ids))
+
+
+def index_sqlite_search_documents(connection, ids):
+    """
+    Rebuilds the FTS5 rows of the tickets 'ids' in one statement, e.g. after bulk-inserting their comments
+    without them (every inserted comment would rebuild the row). No-op on other databases.
+    """
+    if connection.vendor != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(ids))
+        cursor.execute(f"""
+            INSERT INTO {FTS_TABLE} (rowid, topic, description, comments)
+            SELECT id, topic, description, {SQLITE_COMMENTS_OF.format('tickets_ticket.id')} FROM tickets_ticket
+            WHERE id IN ({placeholders})
+        """, list(ids))
+
+
+def _search_postgresql(queryset, query):
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=search_query).annotate(
+        search_rank=SearchRank(F('search_vector'), search_query),
+        search_snippet=SearchHeadline(Concat('topic', Value(': '), 'description'), search_query, config=SEARCH_CONFIG,
+                                      start_sel=START_SEL, stop_sel=STOP_SEL, max_words=20, min_words=8),
+    )
+
+
+def _fts5_query(query):
+    # Every word becomes a quoted FTS5 string, so user input cannot use (or break) the FTS5 query syntax.
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def _search_sqlite(queryset, query):
+    match = _fts5_query(query)
+    if not match:
+        return None
+
+    ticket_table = queryset.model._meta.db_table
+    per_ticket = f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{ticket_table}"."id"'
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])) \
+        .annotate(
+            # bm25() is lower for better matches; the weights favour topic over description over comments.
+            search_rank=RawSQL(f'SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) {per_ticket}', [match],
+                               output_field=FloatField()),
+            search_snippet=RawSQL(
+                f"SELECT snippet({FTS_TABLE}, -1, '{START_SEL}', '{STOP_SEL}', '...', 16) {per_ticket}", [match],
+                output_field=TextField()),
+        )
+
+
+def _search_icontains(queryset, query):
+    condition = Q()
+    for word in query.split():
+        condition &= Q(topic__icontains=word) | Q(description__icontains=word) | Q(comments__text__icontains=word)
+    matching = queryset.model.objects.filter(condition).values('pk')
+    return queryset.filter(pk__in=matching).annotate(
+        search_rank=Value(0.0, output_field=FloatField()),
+        search_snippet=F('description'),
+    )
+
+
+def highlight(snippet):
+    """
+    Escapes a search snippet and wraps the matched words in <mark>.
+    """
+    if not snippet:
+        return ''
+    return mark_safe(escape(snippet).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+class TicketFullTextSearchFilter(BaseFilterBackend):
+    """
+    EXMP /tickets/rest/?search=printer
+    """
+    search_param = 'search'
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_terms(request)
+        if not query or getattr(view, 'action', 'list') != 'list':
+            return queryset
+        return search_tickets(queryset, query)
@@ -0,0 +1,91 @@
+"""
+Synthetic data for benchmarks and load tests, written with bulk_create one batch at a time.
+"""
+
+import random
+import secrets
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+
+from comments.models import Comment
+from users.models import UM
+from .caching import tickets_changed
+from .counters import change_counters
+from .models import Ticket
+
+BATCH_SIZE = 1000
+
+# Roughly what a helpdesk that has been running for a while looks like: most tickets are finished.
+STATUS_WEIGHTS = {
+    'Active': 15,
+    'InProcess': 12,
+    'InRestoration': 5,
+    'Declined': 10,
+    'Approved': 8,
+    'Done': 50,
+}
+PRIORITY_WEIGHTS = {
+    'Low': 50,
+    'Medium': 35,
+    'High': 15,
+}
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield min(batch_size, total - start)
+
+
+def seed(users=10, tickets=1000, comments=0, staff=1, days=365, batch_size=BATCH_SIZE, rng=None):
+    """
+    Creates 'users' regular users and 'staff' staff users, 'tickets' tickets spread over the last 'days' days
+    and 'comments' comments per ticket. Returns the created users as (users, staff_users).
+    """
+    rng = rng or random.Random()
+    prefix = f'seed-{secrets.token_hex(4)}'
+    now = timezone.now()
+
+    # '!' is an unusable password hash, hashing a real password for every row would dominate the run.
+    user_objs = UM.objects.bulk_create(
+        [UM(username=f'{prefix}-user-{i}', password='!') for i in range(users)], batch_size=batch_size)
+    staff_objs = UM.objects.bulk_create(
+        [UM(username=f'{prefix}-staff-{i}', password='!', is_staff=True) for i in range(staff)],
+        batch_size=batch_size)
+
+    statuses, status_weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+    priorities, priority_weights = list(PRIORITY_WEIGHTS), list(PRIORITY_WEIGHTS.values())
+
+    for size in _batches(tickets, batch_size):
+        batch = []
+        for status, priority in zip(rng.choices(statuses, status_weights, k=size),
+                                    rng.choices(priorities, priority_weights, k=size)):
+            batch.append(Ticket(
+                ticket_user=rng.choice(user_objs),
+                priority=priority,
+                status=status,
+                topic=f'Issue {rng.randrange(10 ** 6)}',
+                description=f'Synthetic ticket {prefix}',
+                decline_reason='Synthetic decline reason' if status in ('Declined', 'InRestoration') else '',
+                restore_request=status == 'InRestoration',
+            ))
+        batch = Ticket.objects.bulk_create(batch)
+        change_counters(Counter((ticket.status, ticket.priority) for ticket in batch))
+
+        # 'auto_now_add' overwrites created_date on insert, so the spread is applied afterwards.
+        for ticket in batch:
+            ticket.created_date = now - timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+        Ticket.objects.bulk_update(batch, ['created_date'], batch_size=batch_size)
+
+        if comments:
+            comment_objs = []
+            for ticket in batch:
+                for i in range(comments):
+                    author = ticket.ticket_user if i % 2 == 0 or not staff_objs else rng.choice(staff_objs)
+                    comment_objs.append(Comment(ticket=ticket, comment_user=author,
+                                                text=f'Synthetic comment {i} on ticket {ticket.pk}'))
+            Comment.objects.bulk_create(comment_objs, batch_size=batch_size)
+
+    tickets_changed()
+    return user_objs, staff_objs
@@ -1,8 +1,69 @@
+from django.db import models
 from rest_framework import serializers
-from .models import Ticket
+from .models import ArchivedTicket, Ticket
+from .search import highlight
+from .sparse import SparseFieldsMixin
+from .transitions import BULK_TRANSITION_LIMIT
 
 
-class TicketSerializer(serializers.ModelSerializer):
+class ArchivedTicketSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    The fields of TicketSerializer, plus 'archived' (always true) and 'archived_at'.
+    """
+    archived = serializers.BooleanField(read_only=True)
+
     class Meta:
-        model = Ticket
+        model = ArchivedTicket
         fields = '__all__'
+
+
+class TicketListSerializer(serializers.ListSerializer):
+    """
+    Serializes the archived tickets of the ?include_archived=true lists with ArchivedTicketSerializer.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        archived = ArchivedTicketSerializer(context=self.context)
+        return [(archived if item.archived else self.child).to_representation(item) for item in iterable]
+
+
+class TicketSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Ticket
+        exclude = ['search_vector']
+        list_serializer_class = TicketListSerializer
+
+
+class TicketSearchSerializer(TicketSerializer):
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    snippet = serializers.SerializerMethodField()
+
+    def get_snippet(self, obj):
+        return highlight(obj.search_snippet)
+
+
+class TicketDeclineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ticket
+        fields = ['decline_reason']
+        extra_kwargs = {'decline_reason': {'required': True, 'allow_blank': False}}
+
+
+class TicketBulkFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Ticket.PRIORITY_CHOICES, required=False)
+
+
+class TicketBulkTransitionSerializer(serializers.Serializer):
+    """
+    Selects tickets either by id (EXMP {"ids": [1, 2, 3]}) or by filter (EXMP {"filter": {"status": "Active"}}).
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False,
+                                max_length=BULK_TRANSITION_LIMIT)
+    filter = TicketBulkFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either "ids" or "filter".')
+        return attrs
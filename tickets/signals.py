@@ -0,0 +1,63 @@
+"""
+TicketCounter upkeep, status events and new generations of the cached lists for single tickets saved or
+deleted through the ORM.
+"""
+
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .caching import tickets_changed
+from .counters import change_counters, move_counters
+from .events import record_status_events
+from .models import ArchivedTicket, Ticket
+from .search import restore_sqlite_search_index
+
+COUNTED_FIELDS = ['status', 'priority']
+
+
+@receiver(post_save, sender=Ticket)
+def count_saved_ticket(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+
+    old = getattr(instance, '_counted_as', (None, None))
+    new = []
+    for index, field in enumerate(COUNTED_FIELDS):
+        value = instance.__dict__.get(field)
+        written = value is not None and (update_fields is None or field in update_fields)
+        new.append(value if written else old[index])
+    new = tuple(new)
+
+    if created:
+        change_counters({new: 1})
+    elif None not in old and None not in new:
+        move_counters(old, new)
+    # Otherwise the ticket was loaded without its status or priority; reconcile_ticket_counters fixes that.
+
+    if new[0] is not None and new[0] != old[0]:
+        record_status_events([(instance.pk, instance.ticket_user_id, new[0])])
+    instance._counted_as = new
+    tickets_changed(instance.ticket_user_id)
+
+
+@receiver(post_delete, sender=Ticket)
+def count_deleted_ticket(sender, instance, **kwargs):
+    counted_as = getattr(instance, '_counted_as', (None, None))
+    if None in counted_as:
+        counted_as = (instance.status, instance.priority)
+    change_counters({counted_as: -1})
+    tickets_changed(instance.ticket_user_id)
+
+
+@receiver(post_delete, sender=ArchivedTicket)
+def count_deleted_archived_ticket(sender, instance, **kwargs):
+    # Archived tickets are counted too, they are only ever deleted by a cascade from their user.
+    change_counters({(instance.status, instance.priority): -1})
+    tickets_changed(instance.ticket_user_id)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.label == 'tickets':
+        restore_sqlite_search_index(connections[using])
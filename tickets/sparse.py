@@ -0,0 +1,123 @@
+"""
+Sparse fieldsets and a fast read path for the REST lists.
+
+EXMP GET /tickets/rest/?fields=id,topic,status
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+
+FIELDS_PARAM = 'fields'
+
+# Fields whose values come out of the database as the JSON renderer needs them.
+NATIVE_FIELDS = (serializers.BooleanField, serializers.CharField, serializers.ChoiceField, serializers.FloatField,
+                 serializers.IntegerField, serializers.PrimaryKeyRelatedField)
+
+
+@lru_cache(maxsize=None)
+def _field_specs(serializer_class):
+    """
+    ((name, column, field), ...) of the fields of 'serializer_class', in its order.
+    """
+    return tuple((name, field.source.replace('.', '__'), field) for name, field in serializer_class().fields.items())
+
+
+def _iso_datetime(field, tz):
+    """
+    DateTimeField.to_representation with the current time zone 'tz' looked up once, not for every value.
+    """
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(field, tz):
+    if isinstance(field, NATIVE_FIELDS):
+        return None
+    if (isinstance(field, serializers.DateTimeField) and tz is not None and not hasattr(field, 'timezone')
+            and (getattr(field, 'format', api_settings.DATETIME_FORMAT) or '').lower() == ISO_8601):
+        return _iso_datetime(field, tz)
+    return field.to_representation
+
+
+def get_sparse_fields(params, *serializer_classes):
+    """
+    The set of field names in '?fields=', None without the parameter. Names that none of 'serializer_classes'
+    has answer 400.
+    """
+    value = params.get(FIELDS_PARAM)
+    if value is None:
+        return None
+
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    available = {name for serializer_class in serializer_classes for name, _, _ in _field_specs(serializer_class)}
+    unknown = requested - available
+    if unknown or not requested:
+        raise ParseError(f'Unknown field(s) in ?{FIELDS_PARAM}=: {", ".join(sorted(unknown)) or "(none)"}. '
+                         f'Available: {", ".join(sorted(available))}.')
+    return requested
+
+
+def only_fields(queryset, serializer_class, fields, *required):
+    """
+    'queryset.only()' the columns of the 'fields' of 'serializer_class' and 'required', 'queryset' itself for every
+    field (fields=None).
+    """
+    if fields is None:
+        return queryset
+    names = {field.name for field in queryset.model._meta.concrete_fields}
+    columns = ValuesSerializer(serializer_class, fields).columns(*required)
+    return queryset.only(*[column for column in columns if column.split('__')[0] in names])
+
+
+class SparseFieldsMixin:
+    """
+    Serializer that only keeps the fields in context['fields'] (a set of names, every field without it).
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse = self.context.get('fields')
+        if sparse is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in sparse}
+
+
+class ValuesSerializer:
+    """
+    Read-only stand-in for 'serializer_class(many=True)' over the rows of 'queryset.values(*serializer.columns())'.
+    'fields' -> the sparse fieldset, 'sources' -> {field name: column} where the column is not the field's source,
+    e.g. {'comment_user': 'comment_user__username'} for a field that renders a related object as a string.
+    """
+
+    def __init__(self, serializer_class, fields=None, sources=None):
+        sources = sources or {}
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        self.specs = [(name, sources.get(name, column), _converter(field, tz))
+                      for name, column, field in _field_specs(serializer_class)
+                      if fields is None or name in fields]
+
+    def columns(self, *required):
+        """
+        The columns to read: 'required' (e.g. the keyset pagination keys) and those of the fields.
+        """
+        columns = list(required)
+        for _, column, _ in self.specs:
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    def to_representation(self, row):
+        return {name: row[column] if converter is None or row[column] is None else converter(row[column])
+                for name, column, converter in self.specs}
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
@@ -0,0 +1,10 @@
+from django import template
+
+from tickets.cards import render_ticket_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def ticket_cards(context, tickets):
+    return render_ticket_cards(tickets, context['request'].user, bulk=bool(context.get('bulk_action_form')))
@@ -1,3 +1,1684 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from comments.models import ArchivedComment, Comment
+from comments.serializers import CommentSerializer
+from helpdesk.metrics import registry
+from helpdesk.renderers import FastJSONRenderer
+from helpdesk.replicas import read_alias, replica_health
+from users.authentication import token_cache
+from users.models import UM
+from .archive import archive_tickets
+from .benchmarks import ENDPOINTS, run_benchmarks
+from .caching import tickets_changed, TicketCacheEntry
+from .concurrency import save_ticket_edit
+from .counters import count_tickets, get_counters, reconcile_counters
+from .deletion import delete_user
+from .export import iter_tickets_with_comments
+from .events import broadcaster
+from .exceptions import IsNotActiveOrInRestorationTicketException
+from .models import Ticket, TicketCounter, TicketEvent, OutboxMessage, ReplicaHeartbeat, ArchivedTicket
+from .pagination import Cursor, decode_cursor, encode_cursor
+from .queue import claim_next_ticket, release_ticket
+from .serializers import TicketSerializer
+from .transitions import apply_transition, apply_bulk_transition, APPLIED, NOT_FOUND, NOT_OWNER, TRANSITIONS, \
+    WRONG_STATUS
+from .webhooks import WebhookWorker
+
+
+def status_updates(queries):
+    """
+    The UPDATEs of ticket statuses among the captured 'queries' (not the claim or version writes).
+    """
+    return [q['sql'] for q in queries
+            if q['sql'].startswith('UPDATE "tickets_ticket" ') and '"status"' in q['sql'].split('WHERE')[0]]
+
+
+class TicketCursorPaginationTests(TestCase):
+    url = '/tickets/rest/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+        now = timezone.now()
+        for i in range(25):
+            Ticket.objects.create(ticket_user=cls.user, topic=f'Topic {i}', description='Description',
+                                  priority='High' if i % 2 else 'Low')
+        # Several tickets share a timestamp, so only the id can order them.
+        for i, ticket in enumerate(Ticket.objects.order_by('id')):
+            Ticket.objects.filter(pk=ticket.pk).update(created_date=now - timedelta(seconds=i // 3))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [ticket['id'] for ticket in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_ticket_once_newest_first(self):
+        ids = self.walk(f'{self.url}?page_size=4')
+        expected = list(Ticket.objects.order_by('-created_date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters_are_kept_between_pages(self):
+        ids = self.walk(f'{self.url}?page_size=4&priority=High')
+        expected = list(Ticket.objects.filter(priority='High').order_by('-created_date', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get(f'{self.url}?page_size=5').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+
+        back = self.client.get(second['previous']).data
+        self.assertEqual([t['id'] for t in back['results']], [t['id'] for t in first['results']])
+
+    def test_page_does_not_count_rows(self):
+        first = self.client.get(f'{self.url}?page_size=5').data
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.url}?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_round_trip(self):
+        cursor = Cursor(timezone.now(), 42, True)
+        self.assertEqual(decode_cursor(encode_cursor(cursor)), cursor)
+
+    def test_user_sees_only_own_tickets(self):
+        other = UM.objects.create_user(username='other', password='password')
+        Ticket.objects.create(ticket_user=other, topic='Other', description='Description')
+
+        self.client.force_authenticate(self.user)
+        ids = self.walk(f'{self.url}?page_size=10')
+        self.assertEqual(len(ids), 25)
+
+
+class TicketTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def setUp(self):
+        self.ticket = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description')
+
+    def test_transition_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            outcome = apply_transition(self.ticket.pk, 'approve')
+
+        self.assertEqual(outcome, APPLIED)
+        updates = status_updates(queries)
+        self.assertEqual(len(updates), 1)
+        set_clause = updates[0].split('WHERE')[0]
+        self.assertIn('"status"', set_clause)
+        self.assertIn('"restore_request"', set_clause)
+        self.assertNotIn('"description"', set_clause)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'Approved')
+
+    def test_failed_transition_reports_the_reason(self):
+        self.assertEqual(apply_transition(self.ticket.pk, 'done'), WRONG_STATUS)
+        self.assertEqual(apply_transition(self.ticket.pk + 100, 'approve'), NOT_FOUND)
+
+        Ticket.objects.filter(pk=self.ticket.pk).update(status='Declined')
+        self.assertEqual(apply_transition(self.ticket.pk, 'restore', self.staff), NOT_OWNER)
+        self.assertEqual(apply_transition(self.ticket.pk, 'restore', self.user), APPLIED)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'InRestoration')
+        self.assertTrue(self.ticket.restore_request)
+
+    def test_django_views(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(f'/tickets/approve-ticket/{self.ticket.pk}/')
+        self.assertRedirects(response, f'/tickets/ticket/{self.ticket.pk}/', fetch_redirect_response=False)
+
+        with self.assertRaises(IsNotActiveOrInRestorationTicketException):
+            self.client.post(f'/tickets/decline-ticket/{self.ticket.pk}/', {'decline_reason': 'Reason'})
+
+        self.client.get(f'/tickets/in-process-ticket/{self.ticket.pk}/')
+        self.client.get(f'/tickets/done-ticket/{self.ticket.pk}/')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, 'Done')
+
+    def test_django_rest_views(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/tickets/api/approve-ticket/{self.ticket.pk}/')
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.post(f'/tickets/api/decline-ticket/{self.ticket.pk}/', {})
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post(f'/tickets/api/decline-ticket/{self.ticket.pk}/', {'decline_reason': 'Reason'})
+        self.assertEqual(response.status_code, 200)
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.status, self.ticket.decline_reason), ('Declined', 'Reason'))
+
+        response = client.get(f'/tickets/api/approve-ticket/{self.ticket.pk}/')
+        self.assertEqual(response.status_code, 400)
+
+        client.force_authenticate(self.user)
+        response = client.get(f'/tickets/api/restore-ticket/{self.ticket.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'InRestoration')
+
+
+class TicketTransitionConcurrencyTests(TransactionTestCase):
+    """
+    Every thread has its own database connection, so the transitions really race each other in the database.
+    """
+    threads = 8
+
+    def setUp(self):
+        self.user = UM.objects.create_user(username='user', password='password')
+
+    def race(self, ticket, names):
+        barrier = threading.Barrier(len(names))
+        outcomes = [None] * len(names)
+
+        def worker(i, name):
+            try:
+                barrier.wait()
+                outcomes[i] = (name, apply_transition(ticket.pk, name))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i, name)) for i, name in enumerate(names)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return outcomes
+
+    def test_exactly_one_of_conflicting_transitions_wins(self):
+        for _ in range(3):
+            ticket = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description')
+            outcomes = self.race(ticket, ['approve', 'decline'] * (self.threads // 2))
+
+            winners = [name for name, outcome in outcomes if outcome == APPLIED]
+            self.assertEqual(len(winners), 1)
+            self.assertEqual([outcome for _, outcome in outcomes].count(WRONG_STATUS), self.threads - 1)
+
+            ticket.refresh_from_db()
+            self.assertEqual(ticket.status, {'approve': 'Approved', 'decline': 'Declined'}[winners[0]])
+
+    def test_exactly_one_of_identical_transitions_wins(self):
+        ticket = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description',
+                                       status='Approved')
+        outcomes = self.race(ticket, ['in_process'] * self.threads)
+        self.assertEqual([outcome for _, outcome in outcomes].count(APPLIED), 1)
+
+
+class TicketBulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def setUp(self):
+        self.active = [Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description')
+                       for _ in range(3)]
+        self.done = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description',
+                                          status='Done')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_bulk_approve_by_ids_reports_skipped_tickets(self):
+        ids = [ticket.pk for ticket in self.active] + [self.done.pk, 999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/tickets/api/bulk-approve-tickets/', {'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(response.data['results'][self.done.pk], {'result': 'skipped', 'status': 'Done'})
+        self.assertEqual(response.data['results'][999], {'result': 'not_found'})
+        # One UPDATE per source status, for all the tickets.
+        self.assertEqual(len(status_updates(queries)), len(TRANSITIONS['approve'].sources))
+        self.assertEqual(Ticket.objects.filter(status='Approved').count(), 3)
+
+    def test_bulk_decline_by_filter_requires_reason(self):
+        response = self.client.post('/tickets/api/bulk-decline-tickets/', {'filter': {'status': 'Active'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/tickets/api/bulk-decline-tickets/',
+                                    {'filter': {'status': 'Active'}, 'decline_reason': 'Duplicate'}, format='json')
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(Ticket.objects.filter(status='Declined', decline_reason='Duplicate').count(), 3)
+
+    def test_bulk_endpoints_are_staff_only(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/tickets/api/bulk-approve-tickets/', {'ids': [self.done.pk]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_action_form(self):
+        self.client = self.client_class()
+        self.client.force_login(self.staff)
+        response = self.client.get('/tickets/active-tickets/')
+        self.assertContains(response, 'name="ids"', count=3)
+
+        response = self.client.post('/tickets/bulk-action-tickets/', {
+            'ids': [self.active[0].pk, self.done.pk], 'action': 'approve', 'next': '/tickets/active-tickets/'})
+        self.assertRedirects(response, '/tickets/active-tickets/', fetch_redirect_response=False)
+        self.active[0].refresh_from_db()
+        self.assertEqual(self.active[0].status, 'Approved')
+
+
+class TicketBulkCreateTests(TestCase):
+    url = '/tickets/rest/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='reporter', password='password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_json_rows_are_created_for_the_token_user(self):
+        rows = [{'topic': f'Alert {i}', 'description': 'Disk full', 'priority': 'High'} for i in range(5)]
+        response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        tickets = Ticket.objects.filter(pk__in=response.data['ids'])
+        self.assertEqual(set(tickets.values_list('ticket_user', 'status', 'priority')),
+                         {(self.user.pk, 'Active', 'High')})
+
+    def test_invalid_rows_are_reported_without_failing_the_batch(self):
+        body = '\n'.join([
+            '{"topic": "Alert", "description": "CPU"}',
+            '{"topic": "Alert", "description": "CPU", "status": "Done"}',
+            'not json',
+            '',
+            '{"topic": "This topic is far too long", "description": "CPU", "priority": "Urgent"}',
+        ])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2, 3])
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'topic', 'priority'})
+        self.assertEqual(Ticket.objects.get().priority, 'Low')
+
+    def test_batch_without_valid_rows(self):
+        response = self.client.post(self.url, [{'topic': ''}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+        response = self.client.post(self.url, {'topic': 'Alert'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TicketExportTests(TestCase):
+    url = '/tickets/rest/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        for i in range(7):
+            ticket = Ticket.objects.create(ticket_user=cls.user if i % 2 else cls.other, topic=f'Topic {i}',
+                                           description='Description', status='InProcess')
+            for j in range(i % 3):
+                Comment.objects.create(ticket=ticket, comment_user=cls.staff, text=f'Comment {j}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_contains_comment_threads(self):
+        lines = self.read(self.client.get(self.url)).splitlines()
+        self.assertEqual(len(lines), 7)
+
+        exported = {row['id']: len(row['comments']) for row in map(json.loads, lines)}
+        expected = {ticket.pk: ticket.comments.count() for ticket in Ticket.objects.all()}
+        self.assertEqual(exported, expected)
+
+    def test_comments_are_loaded_per_chunk(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(list(iter_tickets_with_comments(Ticket.objects.all(), chunk_size=3))), 7)
+        # 1 ticket query, and 1 comment query for each of the 3 chunks.
+        self.assertEqual(len(queries), 4)
+
+    def test_csv_export_has_one_line_per_comment(self):
+        rows = list(csv.reader(io.StringIO(self.read(self.client.get(f'{self.url}?type=csv')))))
+        self.assertEqual(rows[0][0], 'id')
+        tickets_without_comments = Ticket.objects.filter(comments__isnull=True).count()
+        self.assertEqual(len(rows) - 1, Comment.objects.count() + tickets_without_comments)
+
+    def test_export_respects_visibility_and_filters(self):
+        self.client.force_authenticate(self.user)
+        lines = self.read(self.client.get(self.url)).splitlines()
+        self.assertEqual({json.loads(line)['ticket_user_id'] for line in lines}, {self.user.pk})
+
+        self.assertEqual(self.read(self.client.get(f'{self.url}?status=Done')), '')
+        self.assertEqual(self.client.get(f'{self.url}?type=xml').status_code, 400)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_tickets', '--user', 'user', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class TicketSearchTests(TestCase):
+    url = '/tickets/rest/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+        cls.in_topic = Ticket.objects.create(ticket_user=cls.user, topic='Printer jammed',
+                                             description='Paper stuck on the second floor')
+        cls.in_description = Ticket.objects.create(ticket_user=cls.user, topic='Office',
+                                                   description='The printer <b>smells</b> of smoke')
+        cls.in_comment = Ticket.objects.create(ticket_user=cls.user, topic='Laptop', description='Slow boot')
+        Comment.objects.create(ticket=cls.in_comment, comment_user=cls.staff, text='Driver for the printers updated')
+        cls.foreign = Ticket.objects.create(ticket_user=cls.other, topic='Printer', description='Toner empty')
+        Ticket.objects.create(ticket_user=cls.user, topic='Network', description='Wi-Fi drops')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get(self.url, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_matches_topic_description_and_comments_ranked(self):
+        results = self.search('printer')
+        self.assertEqual([ticket['id'] for ticket in results],
+                         [self.in_topic.pk, self.in_description.pk, self.in_comment.pk])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        snippet = self.search('smoke')[0]['snippet']
+        self.assertIn('<mark>smoke</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_index_follows_updates(self):
+        Ticket.objects.filter(pk=self.in_topic.pk).update(topic='Scanner')
+        Comment.objects.filter(ticket=self.in_comment).delete()
+        self.assertEqual([ticket['id'] for ticket in self.search('printer')], [self.in_description.pk])
+
+    def test_search_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('printer" (* ^'), self.search('printer'))
+        self.assertEqual(self.search('"'), [])
+
+    def test_staff_search_and_html_list(self):
+        self.client.force_authenticate(self.staff)
+        self.assertIn(self.foreign.pk, [ticket['id'] for ticket in self.search('printer')])
+
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+        response = self.client.get('/tickets/main/', {'search': 'smoke'})
+        self.assertEqual(list(response.context['tickets']), [self.in_description])
+        self.assertContains(response, '<mark>smoke</mark>')
+
+
+class TicketCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def create(self, **kwargs):
+        return Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description', **kwargs)
+
+    def assertCountersMatchTickets(self):
+        counters = get_counters()
+        counted = {(s, p): counters[s][p] for s, _ in Ticket.STATUS_CHOICES for p, _ in Ticket.PRIORITY_CHOICES}
+        actual = count_tickets()
+        self.assertEqual({key: value for key, value in counted.items() if value},
+                         {key: value for key, value in actual.items() if value})
+
+    def test_every_write_path_keeps_counters_exact(self):
+        tickets = [self.create(priority=priority) for priority in ['Low', 'Low', 'High']]
+        self.assertEqual(get_counters()['Active']['Low'], 2)
+
+        apply_transition(tickets[0].pk, 'approve')
+        apply_transition(tickets[0].pk, 'in_process')
+        apply_transition(tickets[1].pk, 'decline', decline_reason='No')
+        apply_transition(tickets[1].pk, 'restore', self.user)
+        apply_transition(tickets[1].pk, 'approve')
+        self.assertCountersMatchTickets()
+
+        ticket = Ticket.objects.get(pk=tickets[2].pk)
+        ticket.priority = 'Medium'
+        ticket.save()
+        Ticket.objects.only('id', 'topic').get(pk=tickets[2].pk).save()
+        self.assertCountersMatchTickets()
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        client.post('/tickets/rest/bulk/', [{'topic': 'A', 'description': 'B', 'priority': 'High'}] * 3,
+                    format='json')
+        client.post('/tickets/api/bulk-approve-tickets/', {'filter': {'priority': 'High'}}, format='json')
+        self.assertCountersMatchTickets()
+        self.assertEqual(get_counters()['Approved']['High'], 3)
+
+        Ticket.objects.get(pk=tickets[0].pk).delete()
+        self.user.delete()
+        self.assertCountersMatchTickets()
+        # Only the staff user's bulk-created tickets are left.
+        self.assertEqual(get_counters()['total'], 3)
+
+    def test_failed_write_rolls_counters_back(self):
+        ticket = self.create()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                apply_transition(ticket.pk, 'approve')
+                raise ValueError
+        self.assertEqual(get_counters()['Active']['Low'], 1)
+        self.assertEqual(get_counters()['Approved']['Low'], 0)
+
+    def test_endpoint_reads_counters_only(self):
+        self.create(priority='High')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/tickets/api/ticket-counters/').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/tickets/api/ticket-counters/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['Active'], {'Low': 0, 'Medium': 0, 'High': 1, 'total': 1})
+        self.assertEqual(response.data['total'], 1)
+        self.assertFalse([q for q in queries if 'tickets_ticket"' in q['sql']])
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.create()
+        self.create()
+        # Writes outside the ORM paths are not counted.
+        Ticket.objects.filter(status='Active').update(status='Done')
+        TicketCounter.objects.filter(status='InProcess', priority='High').delete()
+
+        output = io.StringIO()
+        call_command('reconcile_ticket_counters', '--dry-run', stdout=output)
+        self.assertIn('Active/Low: counted 2, actual 0 (-2)', output.getvalue())
+        self.assertEqual(get_counters()['Active']['Low'], 2)
+
+        call_command('reconcile_ticket_counters', stdout=io.StringIO())
+        self.assertCountersMatchTickets()
+        output = io.StringIO()
+        call_command('reconcile_ticket_counters', stdout=output)
+        self.assertIn('up to date', output.getvalue())
+
+
+# The query counts of the validators, without the ticket cache (tickets/caching.py) in front of them.
+@override_settings(HELPDESK_TICKET_CACHE=None)
+class TicketConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def setUp(self):
+        self.ticket = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/tickets/rest/{self.ticket.pk}/'
+
+    def test_unchanged_ticket_costs_one_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"ticket-{self.ticket.pk}-v1"')
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"ticket-{self.ticket.pk}-v1"')
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_every_change_makes_a_new_version(self):
+        etags = [self.client.get(self.url)['ETag']]
+
+        self.client.patch(self.url, {'priority': 'High'}, format='json')
+        etags.append(self.client.get(self.url)['ETag'])
+
+        apply_transition(self.ticket.pk, 'approve')
+        apply_transition(self.ticket.pk, 'in_process')
+        etags.append(self.client.get(self.url)['ETag'])
+
+        comment = Comment.objects.create(ticket=self.ticket, comment_user=self.user, text='Text')
+        etags.append(self.client.get(self.url)['ETag'])
+        comment.delete()
+        etags.append(self.client.get(self.url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 6)
+
+    def test_comment_list(self):
+        self.ticket.status = 'InProcess'
+        self.ticket.save()
+        url = f'/comments/{self.ticket.pk}/rest/'
+        etag = self.client.get(url)['ETag']
+
+        # ticket (for the access check and the version), nothing else
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(url, {'text': 'New comment'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_ticket_list(self):
+        etag = self.client.get('/tickets/rest/')['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/tickets/rest/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Tickets of other users are not part of this user's list.
+        Ticket.objects.create(ticket_user=self.staff, topic='Topic', description='Description')
+        self.assertEqual(self.client.get('/tickets/rest/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch(self.url, {'priority': 'High'}, format='json')
+        response = self.client.get('/tickets/rest/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        Ticket.objects.get(pk=self.ticket.pk).delete()
+        self.assertEqual(self.client.get('/tickets/rest/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class TicketOptimisticConcurrencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+
+    def setUp(self):
+        self.ticket = Ticket.objects.create(ticket_user=self.user, topic='Topic', description='Description')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/tickets/rest/{self.ticket.pk}/'
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'priority': 'High'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertFalse([q for q in queries if 'FOR UPDATE' in q['sql']])
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "tickets_ticket" ')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"version" = ', updates[0].split('WHERE')[1])
+
+        # A second edit against the same (now stale) ETag loses.
+        response = self.client.patch(self.url, {'description': 'Lost'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch(self.url, {'description': 'Lost'}, format='json', HTTP_IF_MATCH='"ticket-999-v2"')
+        self.assertEqual(response.status_code, 412)
+
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.priority, self.ticket.description), ('High', 'Description'))
+        self.assertEqual(get_counters()['Active']['High'], 1)
+
+    def test_html_form_rejects_stale_version(self):
+        self.client.force_login(self.user)
+        url = f'/tickets/user-update-ticket/{self.ticket.pk}/'
+        self.assertContains(self.client.get(url), 'name="version" value="1"')
+
+        response = self.client.post(url, {'priority': 'Medium', 'description': 'First', 'version': 1})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(url, {'priority': 'High', 'description': 'Second', 'version': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'changed in the meantime')
+
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.priority, self.ticket.description, self.ticket.version), ('Medium', 'First', 2))
+        self.assertEqual(get_counters()['Active']['Medium'], 1)
+
+
+class TicketAsyncViewTests(TestCase):
+    """
+    The async views answer exactly like the Django REST views they mirror.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.token = Token.objects.create(user=cls.user)
+        for i in range(7):
+            Ticket.objects.create(ticket_user=cls.user, topic=f'Printer {i}', description='Description',
+                                  priority='High' if i % 2 else 'Low', status='InProcess')
+        cls.foreign = Ticket.objects.create(ticket_user=cls.other, topic='Topic', description='Description')
+        cls.ticket = Ticket.objects.filter(ticket_user=cls.user).first()
+        Comment.objects.create(ticket=cls.ticket, comment_user=cls.user, text='First')
+        Comment.objects.create(ticket=cls.ticket, comment_user=cls.other, text='Second')
+
+    def setUp(self):
+        token_cache.clear()
+        self.async_client = AsyncClient()
+        self.rest_client = APIClient(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    async def get(self, url, **headers):
+        # AsyncClient does not send default headers in Django 4.2, only the ones passed per request.
+        return await self.async_client.get(url, headers={'Authorization': f'Token {self.token.key}', **headers})
+
+    async def assertSameAsRest(self, async_url, rest_url):
+        response = await self.get(async_url)
+        self.assertEqual(response.status_code, 200, response.content)
+        expected = await sync_to_async(self.rest_client.get)(rest_url)
+        data = json.loads(response.content)
+        if isinstance(data, dict) and 'results' in data:
+            for link in ['next', 'previous']:
+                data[link] = data[link] and data[link].replace('/tickets/async/', '/tickets/rest/')
+        self.assertEqual(data, json.loads(expected.content))
+        self.assertEqual(response['ETag'], expected['ETag'])
+        return response
+
+    async def test_list_pages_filters_and_search(self):
+        first = await self.assertSameAsRest('/tickets/async/?page_size=3', '/tickets/rest/?page_size=3')
+        next_url = json.loads(first.content)['next']
+        await self.assertSameAsRest(next_url, next_url.replace('/tickets/async/', '/tickets/rest/'))
+        await self.assertSameAsRest('/tickets/async/?priority=High', '/tickets/rest/?priority=High')
+
+        data = json.loads((await self.get('/tickets/async/?search=printer')).content)
+        self.assertEqual(len(data['results']), 7)
+        self.assertIn('snippet', data['results'][0])
+
+        response = await self.get('/tickets/async/?page_size=3', **{'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_detail(self):
+        response = await self.assertSameAsRest(f'/tickets/async/{self.ticket.pk}/', f'/tickets/rest/{self.ticket.pk}/')
+        response = await self.get(f'/tickets/async/{self.ticket.pk}/', **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual((await self.get(f'/tickets/async/{self.foreign.pk}/')).status_code, 404)
+
+    async def test_comment_list(self):
+        await self.assertSameAsRest(f'/comments/{self.ticket.pk}/async/', f'/comments/{self.ticket.pk}/rest/')
+        response = await self.get(f'/comments/{self.foreign.pk}/async/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_authentication_and_methods(self):
+        self.assertEqual((await AsyncClient().get('/tickets/async/')).status_code, 401)
+        self.assertEqual((await self.get('/tickets/async/', Authorization='Token wrong')).status_code, 401)
+        response = await self.async_client.post('/tickets/async/', headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(HELPDESK_EVENTS_POLL_INTERVAL=0.01)
+class TicketEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Topic', description='Description')
+        cls.foreign = Ticket.objects.create(ticket_user=cls.other, topic='Topic', description='Description')
+
+    def setUp(self):
+        token_cache.clear()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def events(self, **filters):
+        return list(TicketEvent.objects.filter(**filters).order_by('id').values_list('ticket_id', 'kind', 'status'))
+
+    def test_changes_write_events(self):
+        self.assertEqual(self.events(), [(self.ticket.pk, 'status', 'Active'), (self.foreign.pk, 'status', 'Active')])
+        first = TicketEvent.objects.order_by('-id').first().pk
+
+        apply_transition(self.ticket.pk, 'approve')
+        apply_bulk_transition('decline', Ticket.objects.filter(pk=self.foreign.pk), decline_reason='Reason')
+        apply_transition(self.ticket.pk, 'approve')  # not applied, no event
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        save_ticket_edit(ticket, ticket.version, description='Only the description')
+        save_ticket_edit(ticket, ticket.version, status='InProcess')
+        comment = Comment.objects.create(ticket=ticket, comment_user=self.staff, text='On it')
+        comment.save()  # an edit, no event
+
+        self.assertEqual(self.events(id__gt=first), [
+            (self.ticket.pk, 'status', 'Approved'),
+            (self.foreign.pk, 'status', 'Declined'),
+            (self.ticket.pk, 'status', 'InProcess'),
+            (self.ticket.pk, 'comment', ''),
+        ])
+        event = TicketEvent.objects.order_by('-id').first()
+        self.assertEqual((event.comment_id, event.ticket_user_id), (comment.pk, self.user.pk))
+
+    async def open(self, client=None, **headers):
+        if client is None:
+            client = AsyncClient()
+            headers.setdefault('Authorization', f'Token {self.token.key}')
+        response = await client.get('/tickets/events/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.stream = response.streaming_content
+        self.assertEqual(await self.read(response), 'retry: 1000\n\n')
+        return response
+
+    async def read(self, response):
+        return (await asyncio.wait_for(anext(response.stream), 5)).decode()
+
+    async def close(self, response):
+        # What the server does when the client goes away, without closing the test database connection.
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+        await asyncio.sleep(0)
+
+    async def test_stream_pushes_the_visible_events_from_one_poller(self):
+        stream = await self.open()
+        staff_client = AsyncClient()
+        await sync_to_async(staff_client.force_login)(self.staff)
+        staff_stream = await self.open(staff_client)
+        self.assertEqual(len(broadcaster.subscribers), 2)
+
+        await sync_to_async(apply_transition)(self.foreign.pk, 'approve')
+        await sync_to_async(apply_transition)(self.ticket.pk, 'decline', decline_reason='Reason')
+
+        event = await self.read(stream)
+        self.assertIn('event: status\n', event)
+        self.assertIn(f'data: {{"ticket": {self.ticket.pk}, "status": "Declined"}}', event)
+        self.assertIn(f'"ticket": {self.foreign.pk}', await self.read(staff_stream))
+        self.assertIn(f'"ticket": {self.ticket.pk}', await self.read(staff_stream))
+
+        await self.close(stream)
+        self.assertEqual(len(broadcaster.subscribers), 1)
+        await self.close(staff_stream)
+        self.assertIsNone(broadcaster.task)
+
+    async def test_resume_after_last_event_id(self):
+        first = await TicketEvent.objects.order_by('-id').values_list('id', flat=True).afirst()
+        await sync_to_async(apply_transition)(self.ticket.pk, 'approve')
+        await sync_to_async(apply_transition)(self.foreign.pk, 'approve')
+        await sync_to_async(apply_transition)(self.ticket.pk, 'in_process')
+
+        stream = await self.open(**{'Last-Event-ID': str(first)})
+        self.assertIn('"status": "Approved"', await self.read(stream))
+        self.assertIn('"status": "InProcess"', await self.read(stream))
+
+        # Nothing else was missed, the next message is the next change.
+        await sync_to_async(apply_transition)(self.ticket.pk, 'done')
+        self.assertIn('"status": "Done"', await self.read(stream))
+        await self.close(stream)
+
+    async def test_authentication(self):
+        self.assertEqual((await AsyncClient().get('/tickets/events/')).status_code, 401)
+        response = await AsyncClient().get('/tickets/events/', headers={'Authorization': 'Token wrong'})
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get('/tickets/events/', headers={
+            'Authorization': f'Token {self.token.key}', 'Last-Event-ID': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    """
+    Stand-in for an endpoint: records the requests and answers with the server's next status (200 by default).
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.client_address, dict(self.headers), json.loads(body), body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookDeliveryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Topic', description='Description')
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        self.server.received, self.server.statuses = [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.enterContext(self.settings(HELPDESK_WEBHOOKS={
+            'crm': {'url': f'http://127.0.0.1:{self.server.server_port}/hooks/helpdesk', 'secret': 's3cret'},
+        }, HELPDESK_WEBHOOK_MAX_ATTEMPTS=2))
+        self.worker = WebhookWorker(concurrency=1, batch_size=10)
+        self.addCleanup(self.worker.close)
+
+    def test_changes_queue_messages_in_their_transaction(self):
+        with transaction.atomic():
+            apply_transition(self.ticket.pk, 'approve')
+            transaction.set_rollback(True)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+        apply_transition(self.ticket.pk, 'approve')
+        Comment.objects.create(ticket=self.ticket, comment_user=self.staff, text='Approved')
+        self.assertEqual(list(OutboxMessage.objects.order_by('id').values_list('endpoint', 'event', 'status')), [
+            ('crm', 'ticket.approved', 'pending'),
+            ('crm', 'comment.created', 'pending'),
+        ])
+
+        with self.settings(HELPDESK_WEBHOOKS={}):
+            apply_transition(self.ticket.pk, 'in_process')
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_delivers_signed_messages_over_one_connection(self):
+        apply_transition(self.ticket.pk, 'approve')
+        Comment.objects.create(ticket=self.ticket, comment_user=self.staff, text='Approved')
+
+        self.assertEqual(self.worker.drain_batch(), (2, 0))
+        self.assertEqual(self.worker.drain_batch(), (0, 0))
+        self.assertEqual(OutboxMessage.objects.filter(status='sent', attempts=1, sent_at__isnull=False).count(), 2)
+
+        self.assertEqual([payload['event'] for _, _, payload, _ in self.server.received],
+                         ['ticket.approved', 'comment.created'])
+        self.assertEqual(len({address for address, _, _, _ in self.server.received}), 1)
+        _, headers, payload, body = self.server.received[0]
+        self.assertEqual((payload['ticket'], payload['status']), (self.ticket.pk, 'Approved'))
+        self.assertEqual(headers['X-Helpdesk-Event'], 'ticket.approved')
+        timestamp, signature = [part.split('=', 1)[1] for part in headers['X-Helpdesk-Signature'].split(',')]
+        expected = hmac.new(b's3cret', f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+        self.assertEqual(signature, expected)
+
+    def test_retries_then_dead_letters(self):
+        apply_transition(self.ticket.pk, 'approve')
+        self.server.statuses = [503, 503]
+
+        self.assertEqual(self.worker.drain_batch(), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, 'HTTP 503'))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertEqual(self.worker.drain_batch(), (0, 0))  # not due yet
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.worker.drain_batch(), (0, 1))
+        self.assertEqual(OutboxMessage.objects.get().status, 'dead')
+
+        call_command('deliver_webhooks', '--requeue-dead', stdout=io.StringIO())
+        self.assertEqual(self.worker.drain_batch(), (1, 0))
+        self.assertEqual(OutboxMessage.objects.get().status, 'sent')
+
+    def test_rejected_and_unknown_endpoints_are_dead_at_once(self):
+        apply_transition(self.ticket.pk, 'approve')
+        OutboxMessage.objects.create(endpoint='removed', event='ticket.done', payload={})
+        self.server.statuses = [400]
+
+        self.assertEqual(self.worker.drain_batch(), (0, 2))
+        self.assertEqual(list(OutboxMessage.objects.order_by('id').values_list('status', 'last_error')), [
+            ('dead', 'HTTP 400'),
+            ('dead', "Unknown endpoint 'removed'."),
+        ])
+
+
+@skipUnless('replica' in settings.DATABASES, "needs the 'replica' database of HELPDESK_DB=sqlite")
+@override_settings(HELPDESK_READ_REPLICAS=['replica'], HELPDESK_TICKET_CACHE=None)
+class ReplicaRoutingTests(TestCase):
+    """
+    'replica' does not replicate: its rows are written directly, so every response shows where it read from.
+    """
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Primary', description='Description')
+        UM.objects.using('replica').bulk_create([UM(pk=cls.user.pk, username='user', password='!')])
+        Ticket.objects.using('replica').bulk_create([
+            Ticket(pk=cls.ticket.pk, ticket_user_id=cls.user.pk, topic='Replica', description='Description'),
+        ])
+
+    def setUp(self):
+        token_cache.clear()
+        cache.clear()
+        replica_health.reset()
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+        cache.clear()
+        replica_health.reset()
+
+    def topics(self, url='/tickets/rest/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [ticket['topic'] for ticket in response.json()['results']]
+
+    def test_lists_read_from_the_replica(self):
+        self.assertEqual(self.topics(), ['Replica'])
+        self.assertEqual(self.client.get(f'/tickets/rest/{self.ticket.pk}/').json()['topic'], 'Replica')
+        # Views without 'read_from_replica' read from the primary.
+        self.assertEqual(self.client.get(f'/tickets/async/{self.ticket.pk}/').json()['topic'], 'Primary')
+
+        with self.settings(HELPDESK_READ_REPLICAS=[]):
+            self.assertEqual(self.topics(), ['Primary'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post('/tickets/rest/', {'topic': 'New', 'description': 'Description'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.topics(), ['New', 'Primary'])
+
+        # Another client is not pinned.
+        other = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=other).key}')
+        self.assertEqual(self.topics(), ['Replica'])
+
+        with self.settings(HELPDESK_REPLICA_PIN=0):
+            cache.clear()
+            self.assertEqual(self.topics(), ['Replica'])
+
+    def test_lagging_or_broken_replica_is_out_of_rotation(self):
+        call_command('replica_heartbeat', '--once')
+        beat = ReplicaHeartbeat.objects.get().beat
+        self.assertLess(timezone.now() - beat, timedelta(seconds=5))
+        ReplicaHeartbeat.objects.using('replica').update(beat=beat - timedelta(seconds=60))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.topics(), ['Primary'])
+        self.assertEqual(replica_health.lags['replica'], 60)
+        # The check only reads the beat, the requests do not write it.
+        self.assertFalse([query for query in queries if 'UPDATE' in query['sql'] and 'heartbeat' in query['sql']])
+        self.assertEqual(ReplicaHeartbeat.objects.get().beat, beat)
+
+        # Caught up: back in rotation at the next check.
+        ReplicaHeartbeat.objects.using('replica').update(beat=timezone.now() + timedelta(seconds=60))
+        with self.settings(HELPDESK_REPLICA_CHECK_INTERVAL=0):
+            self.assertEqual(self.topics(), ['Replica'])
+
+            ReplicaHeartbeat.objects.using('replica').all().delete()
+            self.assertEqual(self.topics(), ['Primary'])
+
+    async def test_async_handler_reads_from_the_replica_and_pins_writers(self):
+        client, headers = AsyncClient(), {'Authorization': f'Token {self.token.key}'}
+
+        async def topics():
+            response = await client.get('/tickets/rest/', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            return [ticket['topic'] for ticket in response.json()['results']]
+
+        self.assertEqual(await topics(), ['Replica'])
+        self.assertIsNone(read_alias.get())
+        response = await client.post('/tickets/rest/', {'topic': 'New', 'description': 'Description'},
+                                     content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await topics(), ['New', 'Primary'])
+
+
+@override_settings(HELPDESK_TICKET_CACHE=None)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Topic', description='Description')
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.staff_client = APIClient()
+        self.staff_client.force_authenticate(self.staff)
+
+    def scrape(self):
+        response = self.staff_client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+                for line in response.content.decode().splitlines() if not line.startswith('#')}
+
+    def test_records_requests_per_route(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/tickets/rest/').status_code, 200)
+        self.assertEqual(self.client.get(f'/tickets/rest/{self.ticket.pk}/').status_code, 200)
+        self.assertEqual(self.client.get('/tickets/rest/999999/').status_code, 404)
+        self.client.get('/no-such-page/')
+
+        samples = self.scrape()
+        route = 'route="ticket-list",method="GET"'
+        self.assertEqual(samples[f'helpdesk_http_requests_total{{{route},status="200"}}'], 2)
+        self.assertEqual(samples['helpdesk_http_requests_total{route="ticket-detail",method="GET",status="200"}'], 1)
+        self.assertEqual(samples['helpdesk_http_requests_total{route="ticket-detail",method="GET",status="404"}'], 1)
+        self.assertEqual(samples['helpdesk_http_requests_total{route="<unmatched>",method="GET",status="404"}'], 1)
+
+        self.assertEqual(samples[f'helpdesk_http_request_duration_seconds_count{{{route}}}'], 2)
+        self.assertEqual(samples[f'helpdesk_http_request_duration_seconds_bucket{{{route},le="+Inf"}}'], 2)
+        self.assertGreater(samples[f'helpdesk_db_queries_per_request_sum{{{route}}}'], 0)
+        self.assertEqual(samples[f'helpdesk_db_queries_per_request_bucket{{{route},le="0"}}'], 0)
+        self.assertGreater(samples[f'helpdesk_db_query_seconds_total{{{route}}}'], 0)
+        self.assertGreater(samples[f'helpdesk_http_response_size_bytes_sum{{{route}}}'], 0)
+
+    def test_middleware_keeps_the_asgi_chain_async(self):
+        # A sync-only middleware would run the whole chain, async views included, in a worker thread.
+        self.assertTrue(iscoroutinefunction(ASGIHandler()._middleware_chain))
+
+    async def test_records_async_requests(self):
+        token = await Token.objects.acreate(user=self.user)
+        response = await AsyncClient().get('/tickets/async/', headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+        samples = await sync_to_async(self.scrape)()
+        route = 'route="ticket_list_async",method="GET"'
+        self.assertEqual(samples[f'helpdesk_http_requests_total{{{route},status="200"}}'], 1)
+        self.assertGreater(samples[f'helpdesk_db_queries_per_request_sum{{{route}}}'], 0)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(APIClient().get('/metrics/').status_code, 401)
+
+    def test_adds_up_the_processes(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with self.settings(HELPDESK_METRICS_DIR=directory):
+            self.client.get('/tickets/rest/')
+            registry.maybe_flush(force=True)
+            # Another worker process that served the same route three times.
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as file:
+                json.dump({'routes': [[route, method, {**metrics, 'statuses': {'200': 3}}]
+                                      for route, method, metrics in registry.snapshot()],
+                           'caches': {'ticket-list': {'hit': 2, 'miss': 1}}}, file)
+
+            samples = self.scrape()
+        self.assertEqual(samples['helpdesk_http_requests_total{route="ticket-list",method="GET",status="200"}'], 4)
+        self.assertEqual(samples['helpdesk_cache_requests_total{cache="ticket-list",result="hit"}'], 2)
+
+
+class EndpointBenchmarkTests(TestCase):
+    # The latencies depend on the machine, the tests only hold the views to their query budgets.
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_endpoints_within_query_budgets(self):
+        self.addCleanup(registry.reset)
+        results = run_benchmarks(users=3, tickets=60, comments=2, repeat=3)
+
+        self.assertEqual([result.endpoint for result in results], ENDPOINTS)
+        violations = [f'{result.endpoint.name}: {violation}'
+                      for result in results for violation in result.violations(check_latency=False)]
+        self.assertEqual(violations, [])
+        self.assertTrue(all(result.p95_ms >= result.p50_ms > 0 and result.peak_memory > 0 for result in results))
+
+    def test_seed_data(self):
+        call_command('seed_data', users=3, staff=1, tickets=40, comments=2, random_seed=1, stdout=io.StringIO())
+
+        self.assertEqual(UM.objects.count(), 4)
+        self.assertEqual(Ticket.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(get_counters()['total'], 40)
+
+
+class TicketArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+        def create(status, user=cls.user, age=60):
+            ticket = Ticket.objects.create(ticket_user=user, topic=f'{status} {age}', description='Description',
+                                           status=status, decline_reason='No' if status == 'Declined' else '')
+            Ticket.objects.filter(pk=ticket.pk).update(updated_at=timezone.now() - timedelta(days=age))
+            return ticket
+
+        cls.active = create('Active')
+        cls.done = create('Done')
+        cls.declined = create('Declined')
+        cls.recent = create('Done', age=1)
+        cls.others = create('Done', user=cls.other)
+        for text in ['First', 'Second']:
+            Comment.objects.create(ticket=cls.done, comment_user=cls.user, text=text)
+        Ticket.objects.filter(pk=cls.done.pk).update(updated_at=timezone.now() - timedelta(days=60))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def archive(self):
+        self.assertEqual(archive_tickets(days=30, batch_size=2), 3)
+
+    def test_moves_old_finished_tickets_with_their_comments(self):
+        counters = get_counters()
+        version = Ticket.objects.get(pk=self.done.pk).version
+        self.archive()
+
+        self.assertEqual(set(Ticket.objects.values_list('id', flat=True)), {self.active.pk, self.recent.pk})
+        self.assertEqual(set(ArchivedTicket.objects.values_list('id', flat=True)),
+                         {self.done.pk, self.declined.pk, self.others.pk})
+        self.assertEqual(list(ArchivedComment.objects.filter(ticket=self.done.pk).order_by('id')
+                              .values_list('text', flat=True)), ['First', 'Second'])
+        self.assertFalse(Comment.objects.filter(ticket=self.done.pk).exists())
+        self.assertFalse(TicketEvent.objects.filter(ticket=self.done.pk).exists())
+        self.assertEqual(ArchivedTicket.objects.get(pk=self.done.pk).version, version + 1)
+
+        # Archived tickets stay counted.
+        self.assertEqual(get_counters(), counters)
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+        self.assertEqual(archive_tickets(days=30), 0)
+
+        self.other.delete()
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+
+    def test_archived_tickets_stay_readable_and_read_only(self):
+        self.archive()
+
+        response = self.client.get(f'/tickets/rest/{self.done.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['status'], response.data['archived']),
+                         (self.done.pk, 'Done', True))
+        self.assertEqual(self.client.get(f'/tickets/rest/{self.others.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/tickets/rest/{self.done.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+                         .status_code, 304)
+        self.assertEqual(self.client.patch(f'/tickets/rest/{self.done.pk}/', {'description': 'New'}).status_code, 404)
+        self.assertEqual(apply_transition(self.declined.pk, 'restore', self.user), NOT_FOUND)
+
+        self.client.force_login(self.user)
+        response = self.client.get(f'/tickets/ticket/{self.done.pk}/')
+        self.assertContains(response, 'archived on')
+        self.assertContains(response, 'Second')
+        self.assertNotContains(response, 'Restore ticket')
+
+    def test_lists_include_archived_tickets_on_request(self):
+        self.archive()
+
+        def ids(url):
+            found = []
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                found += [ticket['id'] for ticket in response.data['results']]
+                url = response.data['next']
+            return found
+
+        newest_first = [self.recent.pk, self.declined.pk, self.done.pk, self.active.pk]
+        self.assertEqual(ids('/tickets/rest/'), [self.recent.pk, self.active.pk])
+        self.assertEqual(ids('/tickets/rest/?include_archived=true'), newest_first)
+        self.assertEqual(ids('/tickets/rest/?include_archived=true&page_size=1'), newest_first)
+        self.assertEqual(ids('/tickets/rest/?include_archived=true&status=Done'), [self.recent.pk, self.done.pk])
+
+        # Backwards from the last page.
+        response = self.client.get('/tickets/rest/?include_archived=true&page_size=3')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([ticket['id'] for ticket in self.client.get(response.data['previous']).data['results']],
+                         newest_first[:3])
+
+        self.client.force_login(self.user)
+        response = self.client.get('/tickets/main/?include_archived=true')
+        self.assertEqual([ticket.pk for ticket in response.context['tickets']], newest_first)
+        self.assertContains(response, 'can no longer be changed')
+
+    async def test_async_views_read_the_archive_like_the_rest_views(self):
+        await sync_to_async(self.archive)()
+        token = await Token.objects.acreate(user=self.user)
+        self.addCleanup(token_cache.clear)
+        headers = {'Authorization': f'Token {token.key}'}
+
+        for url in [f'{self.done.pk}/', f'{self.done.pk}/?fields=id,archived', '?include_archived=true&page_size=3',
+                    '?include_archived=true&status=Done']:
+            response = await AsyncClient().get(f'/tickets/async/{url}', headers=headers)
+            expected = await sync_to_async(self.client.get)(f'/tickets/rest/{url}')
+            self.assertEqual(response.status_code, 200, url)
+            data = json.loads(response.content)
+            if 'next' in data:
+                data['next'] = data['next'] and data['next'].replace('/tickets/async/', '/tickets/rest/')
+            self.assertEqual(data, json.loads(expected.content), url)
+            self.assertEqual(response['ETag'], expected['ETag'], url)
+
+        etag = (await AsyncClient().get(f'/tickets/async/{self.done.pk}/', headers=headers))['ETag']
+        response = await AsyncClient().get(f'/tickets/async/{self.done.pk}/',
+                                           headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = await AsyncClient().get(f'/tickets/async/{self.others.pk}/', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(HELPDESK_DELETE_CHUNK_SIZE=2)
+class TicketDeletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+
+        cls.tickets = [Ticket.objects.create(ticket_user=cls.user, topic=f'Printer {i}', description='Jammed')
+                       for i in range(3)]
+        for ticket in cls.tickets:
+            for i in range(5):
+                Comment.objects.create(ticket=ticket, comment_user=cls.staff if i % 2 else cls.user, text=f'Toner {i}')
+        cls.foreign = Ticket.objects.create(ticket_user=cls.other, topic='Laptop', description='Slow boot')
+        Comment.objects.create(ticket=cls.foreign, comment_user=cls.user, text='Same toner here')
+        Comment.objects.create(ticket=cls.foreign, comment_user=cls.staff, text='Driver updated')
+
+    def test_rest_and_html_delete_tickets_with_their_comments(self):
+        first, second, kept = self.tickets
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.delete(f'/tickets/rest/{first.pk}/').status_code, 204)
+        client.force_login(self.staff)
+        self.assertEqual(client.post(f'/tickets/admin-delete-ticket/{second.pk}/').status_code, 302)
+
+        for ticket in [first, second]:
+            self.assertFalse(Ticket.objects.filter(pk=ticket.pk).exists())
+            self.assertFalse(Comment.objects.filter(ticket=ticket.pk).exists())
+            self.assertFalse(TicketEvent.objects.filter(ticket=ticket.pk).exists())
+        self.assertEqual(Comment.objects.filter(ticket=kept).count(), 5)
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+
+        response = client.get('/tickets/rest/', {'search': 'toner'})
+        self.assertEqual([ticket['id'] for ticket in response.data['results']], [kept.pk, self.foreign.pk])
+
+    def test_delete_user_with_comments_elsewhere_and_archived_tickets(self):
+        archived = Ticket.objects.create(ticket_user=self.user, topic='Old', description='Done', status='Done')
+        Comment.objects.create(ticket=archived, comment_user=self.staff, text='Fixed')
+        Ticket.objects.filter(pk=archived.pk).update(updated_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(archive_tickets(days=30), 1)
+        version = Ticket.objects.get(pk=self.foreign.pk).version
+
+        deleted = delete_user(self.user)
+        self.assertEqual((deleted['tickets.Ticket'], deleted['comments.Comment'], deleted['tickets.ArchivedTicket'],
+                          deleted['comments.ArchivedComment'], deleted[UM._meta.label]), (3, 16, 1, 1, 1))
+
+        self.assertEqual(list(Ticket.objects.values_list('id', flat=True)), [self.foreign.pk])
+        self.assertEqual(list(Comment.objects.values_list('text', flat=True)), ['Driver updated'])
+        self.assertEqual(Ticket.objects.get(pk=self.foreign.pk).version, version + 1)
+        self.assertFalse(ArchivedTicket.objects.exists())
+        self.assertEqual(reconcile_counters(dry_run=True), [])
+        self.assertEqual(get_counters()['total'], 1)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.tickets = [Ticket.objects.create(ticket_user=cls.user, topic=f'Printer {i}', description=f'Jammed {i}',
+                                             status=status)
+                       for i, status in enumerate(['Active', 'InProcess', 'Done'])]
+        for text in ['Toner ordered', 'Line\u2028separator, ünïcode']:
+            Comment.objects.create(ticket=cls.tickets[1], comment_user=cls.user, text=text)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_lists_match_the_serializers(self):
+        response = self.client.get('/tickets/rest/')
+        expected = TicketSerializer(Ticket.objects.order_by('-created_date', '-id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(
+            {'next': None, 'previous': None, 'results': expected}))
+
+        response = self.client.get(f'/comments/{self.tickets[1].pk}/rest/')
+        expected = CommentSerializer(Comment.objects.order_by('created_date', 'id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        self.assertIn(b'\\u2028', response.content)
+
+    def test_fields_narrow_the_response_and_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/tickets/rest/', {'fields': 'id,topic'})
+        self.assertEqual([list(ticket) for ticket in response.data['results']], [['id', 'topic']] * 3)
+        self.assertFalse(any('description' in query['sql'] for query in queries.captured_queries))
+
+        ticket = self.tickets[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/tickets/rest/{ticket.pk}/', {'fields': 'status'})
+        self.assertEqual(response.data, {'status': 'Active'})
+        self.assertEqual(response['ETag'], f'"ticket-{ticket.pk}-v{ticket.version}"')
+        self.assertFalse(any('description' in query['sql'] for query in queries.captured_queries))
+
+        response = self.client.get(f'/comments/{self.tickets[1].pk}/rest/', {'fields': 'text'})
+        self.assertEqual(response.data, [{'text': 'Toner ordered'}, {'text': 'Line\u2028separator, ünïcode'}])
+
+        response = self.client.get('/tickets/rest/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data['detail'])
+
+    def test_archived_rows_keep_their_marker(self):
+        Ticket.objects.filter(pk=self.tickets[2].pk).update(updated_at=timezone.now() - timedelta(days=60))
+        archive_tickets(days=30)
+        response = self.client.get('/tickets/rest/', {'include_archived': 'true', 'fields': 'id,archived'})
+        self.assertEqual(response.data['results'], [{'id': self.tickets[2].pk, 'archived': True},
+                                                    {'id': self.tickets[1].pk}, {'id': self.tickets[0].pk}])
+
+    def test_fast_renderer_writes_the_same_json(self):
+        data = {'when': timezone.now(), 'amount': Decimal('1.50'), 'text': 'ü\u2028\u2029', 'nested': [{1: None}],
+                'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+class TicketCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.other = UM.objects.create_user(username='other', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.ticket = Ticket.objects.create(ticket_user=cls.user, topic='Printer', description='Jammed')
+        Ticket.objects.create(ticket_user=cls.other, topic='Monitor', description='Flickers')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.client, self.other_client, self.staff_client = APIClient(), APIClient(), APIClient()
+        self.client.force_authenticate(self.user)
+        self.other_client.force_authenticate(self.other)
+        self.staff_client.force_authenticate(self.staff)
+
+    def topics(self, client):
+        return [ticket['topic'] for ticket in client.get('/tickets/rest/').data['results']]
+
+    def test_list_is_cached_until_a_ticket_or_comment_changes(self):
+        self.assertEqual(self.topics(self.client), ['Printer'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.topics(self.client), ['Printer'])
+
+        pk = self.ticket.pk
+        writes = [
+            lambda: self.client.post('/tickets/rest/', {'topic': 'Keyboard', 'description': 'Sticky'}, format='json'),
+            lambda: self.staff_client.get(f'/tickets/api/approve-ticket/{pk}/'),
+            lambda: self.client.patch(f'/tickets/rest/{pk}/', {'priority': 'High'}),
+            lambda: self.staff_client.get(f'/tickets/api/in-process-ticket/{pk}/'),
+            lambda: self.client.post(f'/comments/{pk}/rest/', {'text': 'Any news?'}),
+            lambda: self.staff_client.delete(f'/tickets/rest/{pk}/'),
+        ]
+        for write in writes:
+            before = self.client.get('/tickets/rest/').content
+            self.assertLess(write().status_code, 300)
+            self.assertNotEqual(self.client.get('/tickets/rest/').content, before)
+        self.assertEqual(self.topics(self.client), ['Keyboard'])
+
+    def test_a_change_leaves_the_owner_and_staff_behind(self):
+        for client in [self.client, self.other_client, self.staff_client]:
+            client.get('/tickets/rest/')
+        self.assertTrue(save_ticket_edit(self.ticket, self.ticket.version, topic='Scanner'))
+
+        registry.reset()
+        self.assertEqual(self.topics(self.client), ['Scanner'])
+        self.assertEqual(self.topics(self.other_client), ['Monitor'])
+        self.assertEqual(self.topics(self.staff_client), ['Monitor', 'Scanner'])
+        self.assertEqual(registry.cache_snapshot(), {'ticket-list': {'hit': 1, 'miss': 2}})
+
+    def test_ticket_detail_and_html_list(self):
+        path = f'/tickets/rest/{self.ticket.pk}/'
+        etag = self.client.get(path)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.other_client.get(path).status_code, 404)
+
+        self.client.force_login(self.user)
+        self.client.get('/tickets/main/')
+        self.assertContains(self.client.get('/tickets/main/'), 'Printer')
+        apply_transition(self.ticket.pk, 'decline', decline_reason='Out of scope')
+        self.assertContains(self.client.get('/tickets/main/'), 'Declined')
+        self.assertEqual(self.client.get(path).data['status'], 'Declined')
+        counts = registry.cache_snapshot()
+        self.assertEqual(counts['ticket-detail'], {'hit': 1, 'miss': 3})
+        self.assertEqual(counts['main_view'], {'hit': 1, 'miss': 2})
+
+    def test_file_based_cache(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        with self.settings(CACHES={'default': backend}):
+            self.assertEqual(self.topics(self.client), ['Printer'])
+            with self.assertNumQueries(0):
+                self.assertEqual(self.topics(self.client), ['Printer'])
+            self.assertTrue(save_ticket_edit(self.ticket, self.ticket.version, topic='Scanner'))
+            self.assertEqual(self.topics(self.client), ['Scanner'])
+
+    def test_entries_stored_before_the_commit_are_left_behind(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(save_ticket_edit(self.ticket, self.ticket.version, topic='Scanner'))
+            # A reader that read the list before the commit stores it under the generations of the first move.
+            TicketCacheEntry('ticket-list', self.user, 'http://testserver/tickets/rest/').set(({}, '"stale"'))
+        self.assertEqual(self.topics(self.client), ['Scanner'])
+
+    def test_replica_reads_right_after_a_change_are_not_stored(self):
+        tickets_changed(self.user.pk)
+        entry = TicketCacheEntry('ticket-list', self.user, 'http://testserver/tickets/rest/')
+        token = read_alias.set('replica')
+        try:
+            entry.set('value')
+        finally:
+            read_alias.reset(token)
+        self.assertIsNone(entry.get())
+        entry.set('value')
+        self.assertEqual(entry.get(), 'value')
+
+
+class TicketCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.tickets = [Ticket.objects.create(ticket_user=cls.user, topic=f'Printer {i}', description='Jammed')
+                       for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def page(self, user, path='/tickets/main/'):
+        self.client.force_login(user)
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_cards_are_cached_per_version_and_role(self):
+        ticket = self.tickets[0]
+        staff_page = self.page(self.staff)
+        self.assertEqual(staff_page.count('class="ticket-card"'), 3)
+        self.assertIn('tickets/tickets.css', staff_page)
+        self.assertNotIn('style=', staff_page.split('class="ticket-grid"')[1])
+        self.assertIn(f'href="/tickets/admin-delete-ticket/{ticket.pk}/"', staff_page)
+
+        user_page = self.page(self.user)
+        self.assertIn('You can edit the request while it is “Active”', user_page)
+        self.assertNotIn('admin-delete-ticket', user_page)
+
+        # The cards, the page around them carries a new CSRF token every time.
+        grid = staff_page.split('class="ticket-grid"')[1]
+        self.assertEqual(self.page(self.staff).split('class="ticket-grid"')[1], grid)
+        apply_transition(ticket.pk, 'approve')
+        self.assertIn('Status: Approved', self.page(self.staff))
+        self.assertEqual(registry.cache_snapshot()['ticket_card'], {'hit': 5, 'miss': 7})
+
+    def test_bulk_checkboxes_and_search_snippets(self):
+        self.assertEqual(self.page(self.staff, '/tickets/active-tickets/').count('name="ids"'), 3)
+        self.assertNotIn('name="ids"', self.page(self.staff))
+        self.assertIn('<mark>Printer</mark>', self.page(self.staff, '/tickets/main/?search=printer'))
+
+
+class TicketListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        Ticket.objects.bulk_create([Ticket(ticket_user=cls.user, topic=f'Printer {i}', description='Jammed')
+                                    for i in range(7)])
+        cls.newest_first = list(Ticket.objects.order_by('-created_date', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def test_pages_follow_the_cursors_without_counting(self):
+        path, seen = '/tickets/active-tickets/?page_size=3', []
+        while path:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+            tickets = response.context['tickets']
+            self.assertLessEqual(len(tickets), 3)
+            self.assertIn('description', tickets[0].get_deferred_fields())
+            seen.extend(ticket.pk for ticket in tickets)
+            path = response.context['next_url']
+        self.assertEqual(seen, self.newest_first)
+        self.assertIn('page_size=3', response.context['previous_url'])
+        self.assertContains(response, 'Newer requests')
+        self.assertNotContains(response, 'Older requests')
+
+        response = self.client.get(response.context['previous_url'])
+        self.assertEqual([ticket.pk for ticket in response.context['tickets']], self.newest_first[3:6])
+
+    def test_page_size_and_invalid_cursor(self):
+        response = self.client.get('/tickets/main/')
+        self.assertEqual(len(response.context['tickets']), 7)
+        self.assertIsNone(response.context['next_url'])
+        self.assertEqual(len(self.client.get('/tickets/main/?page_size=2').context['tickets']), 2)
+        self.assertEqual(self.client.get('/tickets/restore-tickets/?cursor=broken').status_code, 404)
+
+
+class TicketClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UM.objects.create_user(username='user', password='password')
+        cls.staff = UM.objects.create_user(username='staff', password='password', is_staff=True)
+        cls.other_staff = UM.objects.create_user(username='other-staff', password='password', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.tickets = {}
+        for name, priority, status, days in [('low', 'Low', 'Active', 9), ('medium', 'Medium', 'InRestoration', 8),
+                                             ('high', 'High', 'Active', 1), ('older-high', 'High', 'Active', 2),
+                                             ('done', 'High', 'Done', 10)]:
+            ticket = Ticket.objects.create(ticket_user=self.user, topic=name, description='Description',
+                                           priority=priority, status=status)
+            Ticket.objects.filter(pk=ticket.pk).update(created_date=now - timedelta(days=days))
+            self.tickets[name] = ticket
+
+    def test_claims_by_priority_then_age(self):
+        claimed = [claim_next_ticket(staff) for staff in [self.staff, self.other_staff, self.staff, self.staff]]
+        self.assertEqual([ticket.topic for ticket in claimed], ['older-high', 'high', 'medium', 'low'])
+        self.assertIsNone(claim_next_ticket(self.other_staff))
+
+        ticket = claimed[0]
+        self.assertEqual(ticket.assignee, self.staff)
+        self.assertEqual(ticket.version, 2)
+        self.assertGreater(ticket.claimed_until, timezone.now())
+
+    def test_lapsed_and_released_claims_go_back_to_the_queue(self):
+        first = claim_next_ticket(self.staff, lease=60)
+        Ticket.objects.filter(pk=first.pk).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_next_ticket(self.other_staff).pk, first.pk)
+
+        self.assertFalse(release_ticket(first.pk, self.staff))
+        self.assertTrue(release_ticket(first.pk, self.other_staff))
+        self.assertEqual(claim_next_ticket(self.staff).pk, first.pk)
+
+    def test_claims_past_the_claimed_tickets_of_a_priority(self):
+        Ticket.objects.bulk_create([Ticket(ticket_user=self.user, topic=f'claimed-{i}', description='Description',
+                                           priority='High') for i in range(7)])
+        for _ in range(8):
+            self.assertEqual(claim_next_ticket(self.other_staff).priority, 'High')
+        self.assertEqual(claim_next_ticket(self.staff).priority, 'High')
+        self.assertEqual(claim_next_ticket(self.staff).priority, 'Medium')
+
+    def test_rest_and_html_claims(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/tickets/api/claim-next-ticket/').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.post('/tickets/api/claim-next-ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['topic'], response.data['assignee']), ('older-high', self.staff.pk))
+        self.assertEqual(client.post(f'/tickets/api/release-ticket/{response.data["id"]}/').status_code, 200)
+        self.assertEqual(client.post(f'/tickets/api/release-ticket/{response.data["id"]}/').status_code, 400)
+
+        self.client.force_login(self.staff)
+        response = self.client.post('/tickets/claim-next-ticket/')
+        self.assertRedirects(response, f'/tickets/ticket/{self.tickets["older-high"].pk}/')
+        self.assertContains(self.client.get(response.url), 'Claimed by:')
+
+        Ticket.objects.filter(status__in=['Active', 'InRestoration']).update(status='Approved')
+        response = self.client.post('/tickets/claim-next-ticket/', {'next': '/tickets/restore-tickets/'}, follow=True)
+        self.assertRedirects(response, '/tickets/restore-tickets/')
+        self.assertContains(response, 'No requests are waiting')
+
+
+class TicketClaimConcurrencyTests(TransactionTestCase):
+    """
+    Agents in threads with their own database connections claim until the queue is empty.
+    """
+    agents = 8
+
+    def test_every_ticket_is_claimed_once(self):
+        user = UM.objects.create_user(username='user', password='password')
+        staff = [UM.objects.create_user(username=f'staff-{i}', password='password', is_staff=True)
+                 for i in range(self.agents)]
+        Ticket.objects.bulk_create([Ticket(ticket_user=user, topic=f'Topic {i}', description='Description',
+                                           priority=['Low', 'Medium', 'High'][i % 3]) for i in range(40)])
+        barrier = threading.Barrier(self.agents)
+        claimed = [[] for _ in range(self.agents)]
+
+        def agent(i):
+            try:
+                barrier.wait()
+                while (ticket := claim_next_ticket(staff[i])) is not None:
+                    claimed[i].append(ticket.pk)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=agent, args=(i,)) for i in range(self.agents)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        all_claimed = [pk for pks in claimed for pk in pks]
+        self.assertEqual(len(all_claimed), 40)
+        self.assertEqual(set(all_claimed), set(Ticket.objects.values_list('pk', flat=True)))
+        for i, pks in enumerate(claimed):
+            self.assertEqual(Ticket.objects.filter(pk__in=pks).exclude(assignee=staff[i]).count(), 0)
@@ -0,0 +1,145 @@
+"""
+Ticket state machine shared by the Django and the Django REST views. A transition is a conditional
+"UPDATE ... WHERE id = %s AND status = <source>", the number of rows it changed is the outcome.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.http import Http404
+
+from .exceptions import IsNotActiveOrInRestorationTicketException, IsNotDeclinedTicketException, \
+    IsNotCreatorOfTicketException, IsNotApprovedTicketException, IsNotInProcessTicketException
+from .caching import tickets_changed
+from .counters import change_counters, move_counters
+from .events import record_status_events
+from .models import Ticket
+
+# Outcomes of 'apply_transition'.
+APPLIED = 'applied'
+NOT_FOUND = 'not_found'
+NOT_OWNER = 'not_owner'
+WRONG_STATUS = 'wrong_status'
+SKIPPED = 'skipped'
+
+# Staff transitions that can be applied to many tickets at once, and how many at most.
+BULK_TRANSITIONS = ['approve', 'decline', 'in_process', 'done']
+BULK_TRANSITION_LIMIT = 1000
+
+
+class Transition:
+    def __init__(self, sources, target, values=None, owner_only=False, exception=Exception, message=''):
+        self.sources = sources
+        self.target = target
+        self.values = values or {}
+        # True -> only the creator of the ticket can apply it.
+        self.owner_only = owner_only
+        self.exception = exception
+        self.message = message
+
+
+TRANSITIONS = {
+    'approve': Transition(
+        sources=['Active', 'InRestoration'], target='Approved', values={'restore_request': False},
+        exception=IsNotActiveOrInRestorationTicketException, message='You cannot approve a request in this status.',
+    ),
+    'decline': Transition(
+        sources=['Active', 'InRestoration'], target='Declined', values={'restore_request': False},
+        exception=IsNotActiveOrInRestorationTicketException, message='You cannot decline a request in this status.',
+    ),
+    'restore': Transition(
+        sources=['Declined'], target='InRestoration', values={'restore_request': True}, owner_only=True,
+        exception=IsNotDeclinedTicketException, message='You cannot restore a request in this status.',
+    ),
+    'in_process': Transition(
+        sources=['Approved'], target='InProcess',
+        exception=IsNotApprovedTicketException, message='You cannot move to InProcess a request in this status.',
+    ),
+    'done': Transition(
+        sources=['InProcess'], target='Done',
+        exception=IsNotInProcessTicketException, message='You cannot move to Done a request in this status.',
+    ),
+}
+
+
+def apply_transition(pk, name, user=None, **values):
+    """
+    Moves ticket 'pk' through transition 'name', 'values' are extra columns to write (e.g. decline_reason).
+    Returns one of APPLIED, NOT_FOUND, NOT_OWNER, WRONG_STATUS.
+    """
+    transition = TRANSITIONS[name]
+
+    queryset = Ticket.objects.filter(pk=pk)
+    if transition.owner_only:
+        queryset = queryset.filter(ticket_user=user)
+
+    with transaction.atomic():
+        # The counters need the status the ticket leaves, and RETURNING only sees the new row: one UPDATE per
+        # source status, the most common one first, until one changes the ticket.
+        for source in transition.sources:
+            rows = queryset.filter(status=source).bump_returning(
+                'priority', 'ticket_user_id', status=transition.target, **transition.values, **values)
+            if rows:
+                (priority, ticket_user_id), = rows
+                move_counters((source, priority), (transition.target, priority))
+                record_status_events([(pk, ticket_user_id, transition.target)])
+                tickets_changed(ticket_user_id)
+                return APPLIED
+
+    # Only a failed transition pays for a second query, to tell the caller why it failed.
+    ticket = Ticket.objects.filter(pk=pk).values('ticket_user_id').first()
+    if ticket is None:
+        return NOT_FOUND
+    if transition.owner_only and ticket['ticket_user_id'] != user.pk:
+        return NOT_OWNER
+    return WRONG_STATUS
+
+
+def apply_transition_or_raise(pk, name, user=None, **values):
+    """
+    'apply_transition' for the Django views: failures raise the same exceptions the views used to raise.
+    """
+    outcome = apply_transition(pk, name, user, **values)
+    transition = TRANSITIONS[name]
+
+    if outcome == NOT_FOUND:
+        raise Http404('The ticket you are trying to find does not exist.')
+    if outcome == NOT_OWNER:
+        raise IsNotCreatorOfTicketException('You cannot restore request that you are not the creator of.')
+    if outcome == WRONG_STATUS:
+        raise transition.exception(transition.message)
+
+
+def apply_bulk_transition(name, queryset, **values):
+    """
+    Applies transition 'name' to the tickets of 'queryset' with one UPDATE per source status for all of them.
+    Returns {id: {'result': APPLIED}} or {id: {'result': SKIPPED, 'status': <current status>}} for every ticket.
+    """
+    transition = TRANSITIONS[name]
+
+    ids = list(queryset.values_list('id', flat=True))
+    results = {}
+    with transaction.atomic():
+        deltas = Counter()
+        events = []
+        for source in transition.sources:
+            if len(results) == len(ids):
+                break
+            rows = Ticket.objects.filter(pk__in=ids, status=source).bump_returning(
+                'id', 'priority', 'ticket_user_id', status=transition.target, **transition.values, **values)
+            for pk, priority, ticket_user_id in rows:
+                results[pk] = {'result': APPLIED}
+                deltas[(source, priority)] -= 1
+                deltas[(transition.target, priority)] += 1
+                events.append((pk, ticket_user_id, transition.target))
+        if events:
+            change_counters(deltas)
+            record_status_events(events)
+            tickets_changed(*{ticket_user_id for _, ticket_user_id, _ in events})
+
+    # Only the tickets the UPDATEs left alone are read again, for the status that made them skip.
+    skipped = [pk for pk in ids if pk not in results]
+    if skipped:
+        for pk, status in Ticket.objects.filter(pk__in=skipped).values_list('id', 'status'):
+            results[pk] = {'result': SKIPPED, 'status': status}
+    return {pk: results[pk] for pk in ids if pk in results}
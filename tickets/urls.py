@@ -3,6 +3,7 @@ from rest_framework import routers
 
 from .django_views import *
 from .django_rest_views import *
+from .async_views import ticket_list_async_view, ticket_detail_async_view, ticket_events_view
 from comments.django_views import CommentsListView
 
 router = routers.SimpleRouter()
@@ -17,6 +18,26 @@ django_rest_urlpatterns = [
     path('api/restore-ticket/<int:pk>/', ticket_restore_view, name='ticket_restore_api'),
     path('api/in-process-ticket/<int:pk>/', ticket_in_process_view, name='ticket_in_process_api'),
     path('api/done-ticket/<int:pk>/', ticket_done_view, name='ticket_done_api'),
+
+    path('api/bulk-approve-tickets/', ticket_bulk_transition_view, {'name': 'approve'},
+         name='tickets_bulk_approve_api'),
+    path('api/bulk-decline-tickets/', ticket_bulk_transition_view, {'name': 'decline'},
+         name='tickets_bulk_decline_api'),
+    path('api/bulk-in-process-tickets/', ticket_bulk_transition_view, {'name': 'in_process'},
+         name='tickets_bulk_in_process_api'),
+    path('api/bulk-done-tickets/', ticket_bulk_transition_view, {'name': 'done'},
+         name='tickets_bulk_done_api'),
+
+    path('api/claim-next-ticket/', ticket_claim_next_view, name='ticket_claim_next_api'),
+    path('api/release-ticket/<int:pk>/', ticket_release_view, name='ticket_release_api'),
+
+    path('api/ticket-counters/', ticket_counters_view, name='ticket_counters_api'),
+
+    # Async versions of the list and detail above, for ASGI (tickets/async_views.py).
+    path('async/', ticket_list_async_view, name='ticket_list_async'),
+    path('async/<int:pk>/', ticket_detail_async_view, name='ticket_detail_async'),
+    # Server-Sent Events of status changes and new comments (tickets/events.py).
+    path('events/', ticket_events_view, name='ticket_events'),
 ]
 
 django_urlpatterns = [
@@ -35,6 +56,8 @@ django_urlpatterns = [
 
     path('in-process-ticket/<int:pk>/', TicketInProcessView.as_view(), name='ticket_in_process_view'),
     path('done-ticket/<int:pk>/', TicketDoneView.as_view(), name='ticket_done_view'),
+    path('bulk-action-tickets/', TicketBulkActionView.as_view(), name='tickets_bulk_action_view'),
+    path('claim-next-ticket/', TicketClaimNextView.as_view(), name='ticket_claim_next_view'),
 
     path('<int:pk>/', CommentsListView.as_view(), name='comments_list_view'),
 ]
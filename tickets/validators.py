@@ -0,0 +1,50 @@
+"""
+Per-row validation for bulk ticket ingestion, with the constraints of 'TicketSerializer'.
+"""
+
+from .models import Ticket
+from .parsers import InvalidRow
+
+BULK_CREATE_FIELDS = ['priority', 'topic', 'description']
+# Rows accepted per request, and rows per INSERT statement.
+BULK_CREATE_LIMIT = 10000
+BULK_CREATE_BATCH_SIZE = 500
+
+PRIORITIES = {value for value, _ in Ticket.PRIORITY_CHOICES}
+TOPIC_MAX_LENGTH = Ticket._meta.get_field('topic').max_length
+DESCRIPTION_MAX_LENGTH = Ticket._meta.get_field('description').max_length
+
+
+def _validate_text(row, field, max_length, errors):
+    value = row.get(field)
+    if not isinstance(value, str) or not value.strip():
+        errors[field] = ['This field is required.']
+    elif len(value) > max_length:
+        errors[field] = [f'Ensure this field has no more than {max_length} characters.']
+    return value
+
+
+def validate_ticket_row(row):
+    """
+    Returns (cleaned_data, None) for a valid row and (None, errors) otherwise.
+    """
+    if isinstance(row, InvalidRow):
+        return None, {'non_field_errors': [row.message]}
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+
+    errors = {}
+    unknown = [field for field in row if field not in BULK_CREATE_FIELDS]
+    if unknown:
+        errors['non_field_errors'] = [f'Unknown field(s): {", ".join(sorted(unknown))}.']
+
+    topic = _validate_text(row, 'topic', TOPIC_MAX_LENGTH, errors)
+    description = _validate_text(row, 'description', DESCRIPTION_MAX_LENGTH, errors)
+
+    priority = row.get('priority', 'Low')
+    if not isinstance(priority, str) or priority not in PRIORITIES:
+        errors['priority'] = [f'"{priority}" is not a valid choice.']
+
+    if errors:
+        return None, errors
+    return {'priority': priority, 'topic': topic, 'description': description}, None
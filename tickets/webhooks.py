@@ -0,0 +1,247 @@
+"""
+Webhooks for ticket changes through a transactional outbox, sent by 'manage.py deliver_webhooks'.
+Delivery is at least once and not ordered. X-Helpdesk-Signature is
+"t=<unix time>,v1=<hex HMAC-SHA256 of '<t>.<body>' with the endpoint's secret>".
+"""
+
+import hashlib
+import hmac
+import http.client
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage, TicketEvent
+
+WEBHOOK_TIMEOUT = 5
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE = 30
+WEBHOOK_RETRY_MAX = 60 * 60
+WEBHOOK_ENDPOINT_CONCURRENCY = 4
+
+# A claimed message is due again after this long, in case the worker that claimed it died.
+CLAIM_LEASE = timedelta(minutes=5)
+
+# Statuses worth retrying, every other 4xx means the endpoint will not take the message.
+RETRY_STATUSES = {408, 425, 429}
+
+STATUS_EVENTS = {
+    'Active': 'ticket.opened',
+    'Approved': 'ticket.approved',
+    'Declined': 'ticket.declined',
+    'InRestoration': 'ticket.restore_requested',
+    'InProcess': 'ticket.in_process',
+    'Done': 'ticket.done',
+}
+COMMENT_EVENT = 'comment.created'
+
+
+def get_endpoints():
+    return getattr(settings, 'HELPDESK_WEBHOOKS', {})
+
+
+def queue_webhooks(events):
+    """
+    Writes the OutboxMessages for 'events' (saved TicketEvents), in the caller's transaction.
+    """
+    endpoints = get_endpoints()
+    if not endpoints:
+        return
+
+    messages = []
+    for event in events:
+        payload = {'event_id': event.pk, 'ticket': event.ticket_id, 'created': event.created.isoformat()}
+        if event.kind == TicketEvent.STATUS:
+            name = STATUS_EVENTS[event.status]
+            payload['status'] = event.status
+        else:
+            name = COMMENT_EVENT
+            payload['comment'] = event.comment_id
+        payload['event'] = name
+        messages.extend(OutboxMessage(endpoint=endpoint, event=name, payload=payload) for endpoint in endpoints)
+    OutboxMessage.objects.bulk_create(messages)
+
+
+def sign(secret, timestamp, body):
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def retry_delay(attempts):
+    """
+    Seconds before the next attempt of a message that has failed 'attempts' times.
+    """
+    base = getattr(settings, 'HELPDESK_WEBHOOK_RETRY_BASE', WEBHOOK_RETRY_BASE)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'HELPDESK_WEBHOOK_RETRY_MAX', WEBHOOK_RETRY_MAX))
+    # Spread the retries, so an endpoint that comes back is not hit by the whole backlog at once.
+    return delay * random.uniform(0.5, 1)
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections, reused per (scheme, host, port). Thread-safe, a connection is used by one
+    thread at a time.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def post(self, url, body, headers):
+        """
+        Returns the status of the response to POST 'body' to 'url'.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+
+        while True:
+            connection, reused = self.get(key)
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                # The server closed an idle connection while it sat in the pool, try a new one.
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                with self.lock:
+                    self.idle[key].append(connection)
+            return response.status
+
+    def get(self, key):
+        with self.lock:
+            if self.idle[key]:
+                return self.idle[key].pop(), True
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+class WebhookWorker:
+    """
+    Drains the outbox: due messages are POSTed from a thread pool, failures retried later. 'concurrency' requests
+    are in flight at most, and at most the endpoint's 'concurrency' to any one endpoint.
+    The database is only used from the calling thread.
+    """
+
+    def __init__(self, concurrency=8, batch_size=100):
+        self.batch_size = batch_size
+        self.pool = ConnectionPool(getattr(settings, 'HELPDESK_WEBHOOK_TIMEOUT', WEBHOOK_TIMEOUT))
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook')
+        self.endpoint_slots = {}
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
+
+    def claim(self):
+        """
+        Claims a batch of due messages: they are not due again before CLAIM_LEASE has passed.
+        On PostgreSQL concurrent workers skip each other's rows instead of waiting for them.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(OutboxMessage.objects.due(now).order_by('next_attempt_at', 'id')
+                       .select_for_update(skip_locked=True).values_list('id', flat=True)[:self.batch_size])
+            OutboxMessage.objects.filter(id__in=ids).update(next_attempt_at=now + CLAIM_LEASE)
+        return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+    def send(self, message):
+        """
+        POSTs 'message' to its endpoint (in a thread of the pool), raises DeliveryError if that failed.
+        """
+        endpoint = get_endpoints().get(message.endpoint)
+        if endpoint is None:
+            raise DeliveryError(f'Unknown endpoint {message.endpoint!r}.', retry=False)
+
+        body = json.dumps(message.payload).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'Helpdesk-Webhooks',
+            'X-Helpdesk-Event': message.event,
+            'X-Helpdesk-Delivery': str(message.pk),
+            'X-Helpdesk-Signature': sign(endpoint['secret'], int(time.time()), body),
+        }
+        with self.endpoint_slots[message.endpoint]:
+            try:
+                status = self.pool.post(endpoint['url'], body, headers)
+            except (OSError, http.client.HTTPException) as error:
+                raise DeliveryError(f'{type(error).__name__}: {error}')
+
+        if not 200 <= status < 300:
+            raise DeliveryError(f'HTTP {status}', retry=status >= 500 or status in RETRY_STATUSES)
+
+    def drain_batch(self):
+        """
+        Claims, sends and records one batch. Returns (sent, failed), 0 and 0 once nothing is due.
+        """
+        messages = self.claim()
+        for message in messages:
+            if message.endpoint not in self.endpoint_slots:
+                endpoint = get_endpoints().get(message.endpoint, {})
+                concurrency = endpoint.get('concurrency', WEBHOOK_ENDPOINT_CONCURRENCY)
+                self.endpoint_slots[message.endpoint] = threading.BoundedSemaphore(concurrency)
+
+        futures = [(message, self.executor.submit(self.send, message)) for message in messages]
+        sent, failed = [], []
+        for message, future in futures:
+            try:
+                future.result()
+            except DeliveryError as error:
+                failed.append((message, error))
+            else:
+                sent.append(message)
+
+        self.record(sent, failed)
+        return len(sent), len(failed)
+
+    def record(self, sent, failed):
+        now = timezone.now()
+        max_attempts = getattr(settings, 'HELPDESK_WEBHOOK_MAX_ATTEMPTS', WEBHOOK_MAX_ATTEMPTS)
+        with transaction.atomic():
+            OutboxMessage.objects.filter(id__in=[message.pk for message in sent]).update(
+                status=OutboxMessage.SENT, sent_at=now, attempts=F('attempts') + 1, last_error='')
+            for message, error in failed:
+                attempts = message.attempts + 1
+                values = {'attempts': attempts, 'last_error': str(error)}
+                if error.retry and attempts < max_attempts:
+                    values['next_attempt_at'] = now + timedelta(seconds=retry_delay(attempts))
+                else:
+                    values['status'] = OutboxMessage.DEAD
+                OutboxMessage.objects.filter(pk=message.pk).update(**values)
@@ -1,7 +1,138 @@
-from rest_framework.authentication import TokenAuthentication
+"""
+Token authentication with an inactivity timeout and a per-process cache of tokens.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
 from rest_framework import exceptions
 from django.utils import timezone
 
+TOKEN_INACTIVITY = 60
+TOKEN_TOUCH_GRANULARITY = 10
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 5
+
+# Key of the revocation generation in the default cache, shared by all processes.
+TOKEN_REVOCATIONS_KEY = 'helpdesk-token-revocations'
+
+
+def _row(instance):
+    return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def _from_row(model, db, values):
+    return model.from_db(db, [field.attname for field in model._meta.concrete_fields], values)
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of token key -> the rows of the token and of its user, each entry living at most TTL seconds.
+    Every 'get' builds new instances from the rows, so concurrent requests never share a Token or a user.
+    Entries carry the revocation generation they were loaded under: 'revoke' moves it in the shared cache, and
+    every process drops its entries at their next use.
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'HELPDESK_TOKEN_CACHE_SIZE', TOKEN_CACHE_SIZE)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'HELPDESK_TOKEN_CACHE_TTL', TOKEN_CACHE_TTL)
+
+    def generation(self):
+        """
+        The current revocation generation, read before the token so a revocation in between is not missed.
+        """
+        return cache.get(TOKEN_REVOCATIONS_KEY)
+
+    async def ageneration(self):
+        return await cache.aget(TOKEN_REVOCATIONS_KEY)
+
+    def revoke(self):
+        self.clear()
+        cache.set(TOKEN_REVOCATIONS_KEY, uuid.uuid4().hex, None)
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[-1] <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def _build(self, key, entry, generation):
+        token_model, token_row, user_model, user_row, db, cached_generation, _ = entry
+        if cached_generation != generation:
+            self.delete(key)
+            return None
+        token = _from_row(token_model, db, token_row)
+        token.user = _from_row(user_model, db, user_row)
+        return token
+
+    def get(self, key):
+        entry = self._entry(key)
+        return self._build(key, entry, self.generation()) if entry is not None else None
+
+    async def aget(self, key):
+        entry = self._entry(key)
+        return self._build(key, entry, await self.ageneration()) if entry is not None else None
+
+    def set(self, key, token, generation):
+        if self.max_size <= 0:
+            return
+
+        user = token.user
+        entry = (type(token), _row(token), type(user), _row(user), token._state.db, generation,
+                 time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, key, token):
+        """
+        Stores the changed row of 'token' in its entry, which keeps its generation and expiry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], _row(token), *entry[2:])
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
 
 class HelpdeskTokenAuthentication(TokenAuthentication):
     def get_model(self):
@@ -10,25 +141,181 @@ class HelpdeskTokenAuthentication(TokenAuthentication):
         from rest_framework.authtoken.models import Token
         return Token
 
-    def authenticate_credentials(self, key):
+    def get_token(self, key):
         model = self.get_model()
         try:
-            token = model.objects.get(key=key)
+            # One query for the token and its user instead of a second lazy 'token.user' fetch.
+            return model.objects.select_related('user').get(key=key)
         except model.DoesNotExist:
+            token_cache.delete(key)
             raise exceptions.AuthenticationFailed('Token does not exist.')
 
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        cached = token is not None
+        if not cached:
+            generation = token_cache.generation()
+            token = self.get_token(key)
+            token_cache.set(key, token, generation)
+
         user = token.user
+        self.check_user(user)
+
+        if not user.is_superuser:
+            now = timezone.now()
+            if cached and self.is_expired(token, now):
+                # Another process may have touched the token since it was cached.
+                generation = token_cache.generation()
+                token = self.get_token(key)
+                token_cache.set(key, token, generation)
+
+            if self.is_expired(token, now):
+                token_cache.delete(key)
+                token.delete()
+                raise self.expired_error()
+
+            if self.touch(token, now):
+                token_cache.update(key, token)
+
+        return user, token
+
+    def check_user(self, user):
         if not user.is_authenticated:
             raise exceptions.AuthenticationFailed('User is not authenticated.')
 
         if not user.is_active:
             raise exceptions.AuthenticationFailed('User is not active.')
 
+    def get_inactivity(self):
+        return getattr(settings, 'HELPDESK_TOKEN_INACTIVITY', TOKEN_INACTIVITY)
+
+    def is_expired(self, token, now):
+        return (now - token.created).total_seconds() > self.get_inactivity()
+
+    def expired_error(self):
+        return exceptions.AuthenticationFailed(
+            f'Token was deleted after {self.get_inactivity()} seconds of inactivity.')
+
+    def touch(self, token, now):
+        """
+        Moves the token's last-use timestamp to 'now' if it is older than the touch granularity,
+        with a single-column UPDATE. The same condition in the WHERE clause lets concurrent requests
+        from other processes skip the write as well. Returns True if it wrote.
+        """
+        queryset = self.get_touch_queryset(token, now)
+        if queryset is None:
+            return False
+        queryset.update(created=now)
+        token.created = now
+        return True
+
+    def get_touch_queryset(self, token, now):
+        granularity = timedelta(seconds=getattr(settings, 'HELPDESK_TOKEN_TOUCH_GRANULARITY', TOKEN_TOUCH_GRANULARITY))
+        if now - token.created < granularity:
+            return None
+        return self.get_model().objects.filter(pk=token.pk, created__lt=now - granularity)
+
+    # Async views (tickets/async_views.py) authenticate with the same rules through the async ORM,
+    # so a request does not hold a thread while it waits for the token query.
+
+    async def aauthenticate(self, request):
+        """
+        'authenticate' for a plain Django HttpRequest in an async view.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                'Invalid token header. Token string should not contain invalid characters.')
+        return await self.aauthenticate_credentials(key)
+
+    async def aget_token(self, key):
+        model = self.get_model()
+        try:
+            return await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            token_cache.delete(key)
+            raise exceptions.AuthenticationFailed('Token does not exist.')
+
+    async def aauthenticate_credentials(self, key):
+        token = await token_cache.aget(key)
+        cached = token is not None
+        if not cached:
+            generation = await token_cache.ageneration()
+            token = await self.aget_token(key)
+            token_cache.set(key, token, generation)
+
+        user = token.user
+        self.check_user(user)
+
         if not user.is_superuser:
-            if (timezone.now() - token.created).total_seconds() > 60:
-                token.delete()
-                raise exceptions.AuthenticationFailed('Token was deleted after 1 min of inactivity.')
-            token.created = timezone.now()
-            token.save()
+            now = timezone.now()
+            if cached and self.is_expired(token, now):
+                generation = await token_cache.ageneration()
+                token = await self.aget_token(key)
+                token_cache.set(key, token, generation)
+
+            if self.is_expired(token, now):
+                token_cache.delete(key)
+                await token.adelete()
+                raise self.expired_error()
+
+            queryset = self.get_touch_queryset(token, now)
+            if queryset is not None:
+                await queryset.aupdate(created=now)
+                token.created = now
+                token_cache.update(key, token)
 
         return user, token
+
+
+def async_token_required(view):
+    """
+    Decorator for async views: authenticates the 'Authorization: Token <key>' header like the Django REST views do
+    and answers 401 otherwise. Sets 'request.user' and 'request.auth'.
+    """
+    authentication = HelpdeskTokenAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authentication.aauthenticate(request)
+        except exceptions.AuthenticationFailed as error:
+            result, detail = None, error.detail
+        else:
+            detail = 'Authentication credentials were not provided.'
+
+        if result is None:
+            response = JsonResponse({'detail': detail}, status=401)
+            response['WWW-Authenticate'] = authentication.authenticate_header(request)
+            return response
+
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_login_required(view):
+    """
+    'async_token_required' that also accepts the session of a user logged in to the Django views,
+    for clients that cannot send headers (EventSource in the browser).
+    """
+    token_view = async_token_required(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if 'HTTP_AUTHORIZATION' not in request.META:
+            user = await sync_to_async(get_user)(request)
+            if user.is_authenticated:
+                request.user, request.auth = user, None
+                return await view(request, *args, **kwargs)
+        return await token_view(request, *args, **kwargs)
+
+    return wrapper
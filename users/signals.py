@@ -0,0 +1,29 @@
+"""
+Revokes the cached tokens (users/authentication.py) when a token is deleted or its user changes or logs out.
+"""
+
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .models import UM
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token(sender, instance, **kwargs):
+    token_cache.revoke()
+
+
+@receiver(post_save, sender=UM)
+def revoke_changed_user(sender, instance, created, update_fields=None, **kwargs):
+    # A new user has no tokens yet, a login only moves 'last_login'.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    token_cache.revoke()
+
+
+@receiver(user_logged_out)
+def revoke_on_logout(sender, request, user, **kwargs):
+    token_cache.revoke()
@@ -1,3 +1,149 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from .authentication import HelpdeskTokenAuthentication, token_cache, TOKEN_REVOCATIONS_KEY
+from .models import UM
+
+
+class HelpdeskTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = UM.objects.create_user(username='user', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = HelpdeskTokenAuthentication()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def set_last_use(self, seconds_ago):
+        created = timezone.now() - timedelta(seconds=seconds_ago)
+        Token.objects.filter(pk=self.token.pk).update(created=created)
+        cached = token_cache.get(self.token.key)
+        if cached is not None:
+            cached.created = created
+            token_cache.update(self.token.key, cached)
+
+    def test_first_request_loads_token_and_user_in_one_query(self):
+        with self.assertNumQueries(1):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_repeated_requests_within_granularity_do_not_touch_the_database(self):
+        self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.auth.authenticate_credentials(self.token.key)
+
+    def test_touch_is_a_single_column_update(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.set_last_use(30)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertNotIn('user_id', sql.split('WHERE')[0])
+        self.token.refresh_from_db()
+        self.assertLess((timezone.now() - self.token.created).total_seconds(), 5)
+
+    def test_inactive_token_is_deleted(self):
+        self.set_last_use(61)
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'after 60 seconds of inactivity'):
+            self.auth.authenticate_credentials(self.token.key)
+        self.assertFalse(Token.objects.filter(pk=self.token.pk).exists())
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_stale_cached_token_is_rechecked_before_deletion(self):
+        self.auth.authenticate_credentials(self.token.key)
+        # Cached copy looks expired, but another process has touched the row.
+        cached = token_cache.get(self.token.key)
+        cached.created = timezone.now() - timedelta(seconds=120)
+        token_cache.update(self.token.key, cached)
+
+        user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertTrue(Token.objects.filter(pk=self.token.pk).exists())
+
+    def test_superuser_token_is_never_touched(self):
+        admin = UM.objects.create_superuser(username='admin', password='password')
+        token = Token.objects.create(user=admin)
+        Token.objects.filter(pk=token.pk).update(created=timezone.now() - timedelta(days=1))
+
+        with self.assertNumQueries(1):
+            user, _ = self.auth.authenticate_credentials(token.key)
+        self.assertEqual(user, admin)
+
+    def test_every_request_gets_its_own_instances(self):
+        _, first = self.auth.authenticate_credentials(self.token.key)
+        first.created = timezone.now() - timedelta(days=1)
+        first.user.is_active = False
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertIsNot(token, first)
+        self.assertIsNot(user, first.user)
+        self.assertTrue(user.is_active)
+
+    def test_deleted_token_and_deactivated_user_are_revoked(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'User is not active.'):
+            self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = True
+        self.user.save()
+        self.auth.authenticate_credentials(self.token.key)
+        Token.objects.get(pk=self.token.pk).delete()
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'Token does not exist.'):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_revocation_in_another_process_drops_the_cached_token(self):
+        self.auth.authenticate_credentials(self.token.key)
+        cache.set(TOKEN_REVOCATIONS_KEY, 'another-process')
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_logout_drops_the_cached_tokens(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.client.force_login(self.user)
+        self.client.get('/users/logout/')
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+
+    @override_settings(HELPDESK_TOKEN_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        keys = [self.token.key] + [
+            Token.objects.create(user=UM.objects.create_user(username=f'user{i}')).key for i in range(2)]
+        for key in keys:
+            self.auth.authenticate_credentials(key)
+
+        self.assertEqual(len(token_cache), 2)
+        self.assertIsNone(token_cache.get(keys[0]))
+
+    @override_settings(HELPDESK_TOKEN_CACHE_TTL=0)
+    def test_expired_cache_entry_is_reloaded(self):
+        self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+
+    async def test_async_authentication_follows_the_same_rules(self):
+        user, token = await self.auth.aauthenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+
+        await Token.objects.filter(pk=self.token.pk).aupdate(created=timezone.now() - timedelta(seconds=61))
+        token_cache.clear()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            await self.auth.aauthenticate_credentials(self.token.key)
+        self.assertFalse(await Token.objects.filter(pk=self.token.pk).aexists())